@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import struct
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from rng import BLOCK, WordEngine
+from router import ArgError
+from weighted import WeightedList, parse_weighted
+
+VERSION = 1              # меняется вместе с выводом ключа или алгоритмами розыгрыша
+SEED_BYTES = 32
+REFILL_BLOCKS = 64       # блоков HMAC за одно пополнение буфера (на результат не влияет)
+MAX_PENDING = 10000      # чатов с неиспользованным коммитом; самые давние забываются
+TAIL_BYTES = 1 << 16     # хватает на последнюю строку журнала при открытии
+GENESIS = "0" * 64
+KINDS = ("choose", "shuffle", "sample", "permute")
+
+
+def commitment(seed: bytes) -> str:
+    return hashlib.sha256(seed).hexdigest()
+
+
+def derive_key(seed: bytes, kind: str, salt: str, text: str, k=None) -> bytes:
+    # Ключ потока связан со всем, что определяет розыгрыш: зерном, солью,
+    # видом, k и исходным списком — подменить что-то одно нельзя.
+    msg = json.dumps([VERSION, kind, k, salt, text], ensure_ascii=False, separators=(",", ":"))
+    return hmac.digest(seed, msg.encode(), "sha256")
+
+
+class DrawStream(WordEngine):
+    # Детерминированный поток для розыгрышей: HMAC-SHA512 в режиме счётчика,
+    # блок i = HMAC(key, i) даёт 8 слов по 64 бита (little-endian). Буфер
+    # пополняется сразу на REFILL_BLOCKS блоков; остальное (randbelow,
+    # sample, выбор по весам) — общий код генераторов из rng.py и weighted.py.
+    name = "audit"
+
+    def __init__(self, key: bytes, blocks=REFILL_BLOCKS):
+        self.key = key
+        self._blocks = blocks
+        self._counter = 0
+        self._words = ()
+        self._pos = 0
+
+    def _refill(self):
+        key, c = self.key, self._counter
+        buf = b"".join([hmac.digest(key, i.to_bytes(8, "big"), "sha512") for i in range(c, c + self._blocks)])
+        self._counter = c + self._blocks
+        self._words = struct.unpack(f"<{8 * self._blocks}Q", buf)
+        self._pos = 0
+
+    def _word(self) -> int:
+        if self._pos >= len(self._words):
+            self._refill()
+        w = self._words[self._pos]
+        self._pos += 1
+        return w
+
+    def shuffle(self, items: list) -> None:
+        items[:] = [items[i - 1] for i in self.iter_permutation(len(items))]
+
+    def iter_permutation(self, n: int, block: int = BLOCK):
+        # Прямой Фишер–Йейтс: после i-го обмена позиция i окончательна, поэтому
+        # результат выдаётся блоками по ходу перемешивания. В памяти — один
+        # массив по 4 байта на элемент.
+        arr = array("I" if n < 1 << 32 else "Q", range(1, n + 1))
+        words, pos = self._words, self._pos
+        top = 1 << 64
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            for i in range(start, min(stop, n - 1)):
+                m = n - i
+                limit = top - top % m
+                while True:
+                    if pos >= len(words):
+                        self._refill()
+                        words, pos = self._words, 0
+                    w = words[pos]
+                    pos += 1
+                    if w < limit:
+                        break
+                j = i + w % m
+                arr[i], arr[j] = arr[j], arr[i]
+            self._pos = pos
+            yield from arr[start:stop]
+            words, pos = self._words, self._pos
+
+
+def draw(kind: str, stream: DrawStream, text: str, k=None):
+    # Результат розыгрыша — поток строк. Этим же кодом пользуется проверка
+    # журнала. Ошибки в списке (ArgError) возникают сразу, до первой строки.
+    if kind == "permute":
+        return map(str, stream.iter_permutation(int(text)))
+    items, weights = parse_weighted(text)
+    if not items:
+        raise ArgError("Список пуст.")
+    if kind == "choose":
+        return iter([WeightedList(items, weights).choice(stream)])
+    if kind == "shuffle":
+        return (items[i - 1] for i in stream.iter_permutation(len(items)))
+    if kind == "sample":
+        if not 0 <= k <= len(items):
+            raise ArgError("k должно быть в диапазоне 0..len(items)")
+        return iter(WeightedList(items, weights).sample(stream, k))
+    raise ValueError(f"неизвестный вид розыгрыша: {kind}")
+
+
+def hashed(pieces, h, block=BLOCK):
+    # Пропускает строки дальше, добавляя их в h (через "\n") — хэш результата
+    # считается по ходу отправки, без второго прохода. В h строки уходят
+    # пачками по block.
+    buf = []
+    sep = ""
+    for piece in pieces:
+        buf.append(piece)
+        if len(buf) >= block:
+            h.update((sep + "\n".join(buf)).encode())
+            buf, sep = [], "\n"
+        yield piece
+    if buf:
+        h.update((sep + "\n".join(buf)).encode())
+
+
+def result_digest(pieces) -> str:
+    h = hashlib.sha256()
+    for _ in hashed(pieces, h):
+        pass
+    return h.hexdigest()
+
+
+class AuditLog:
+    # Журнал только на дописывание: строка JSON на событие, в каждой —
+    # номер и sha256 предыдущей строки, так что правка или удаление записи
+    # задним числом видны при проверке. Запись идёт через один поток, а цикл
+    # событий не ждёт диска; append выполняются по очереди под замком.
+    def __init__(self, path: str):
+        self.path = path
+        self._prev = GENESIS
+        self._seq = 0
+        self._lock = asyncio.Lock()
+        self._executor = None
+        self._file = None
+
+    def _tail(self):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(max(0, f.seek(0, os.SEEK_END) - TAIL_BYTES))
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+        if lines and lines[-1]:
+            self._prev = hashlib.sha256(lines[-1]).hexdigest()
+            self._seq = json.loads(lines[-1])["n"]
+
+    async def open(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="randomlab-audit")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._tail)
+        self._file = await loop.run_in_executor(self._executor, lambda: open(self.path, "ab", buffering=0))
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, data: bytes):
+        # Файл без буфера: при ошибке недописанная строка обрезается и не
+        # уходит в файл позже вместе со следующей.
+        start = self._file.seek(0, os.SEEK_END)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[self._file.write(view):]
+            os.fsync(self._file.fileno())
+        except BaseException:
+            try:
+                self._file.truncate(start)
+            except OSError:
+                pass
+            raise
+
+    async def append(self, **fields) -> dict:
+        # Номер и ссылка на предыдущую строку сдвигаются только после
+        # успешной записи: неудачный append не рвёт цепочку для следующих.
+        async with self._lock:
+            seq = self._seq + 1
+            entry = {"n": seq, "t": int(time.time()), "prev": self._prev, **fields}
+            line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode()
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write, line + b"\n")
+            self._seq, self._prev = seq, hashlib.sha256(line).hexdigest()
+        return entry
+
+
+class Auditor:
+    # Розыгрыши с проверкой (commit-reveal): /commit записывает в журнал и
+    # публикует sha256 секретного зерна, розыгрыш смешивает зерно с солью
+    # участников и раскрывает его. Зерно одноразовое и живёт только в памяти:
+    # после перезапуска нужен новый /commit.
+    def __init__(self, path: str):
+        self.log = AuditLog(path)
+        self._seeds = OrderedDict()   # chat_id → зерно последнего коммита
+
+    async def open(self):
+        await self.log.open()
+
+    async def close(self):
+        await self.log.close()
+
+    async def commit(self, chat_id) -> dict:
+        seed = os.urandom(SEED_BYTES)
+        entry = await self.log.append(kind="commit", chat=chat_id, commit=commitment(seed))
+        self._seeds[chat_id] = seed
+        self._seeds.move_to_end(chat_id)
+        if len(self._seeds) > MAX_PENDING:
+            self._seeds.popitem(last=False)
+        return entry
+
+    def pending(self, chat_id):
+        return self._seeds.get(chat_id)
+
+    async def record(self, chat_id, seed: bytes, kind: str, salt: str, text: str, k, out: str) -> dict:
+        # Зерно снимается сразу (второй розыгрыш на нём уже не начнётся), но
+        # раскрывать его можно только после записи: если запись не удалась,
+        # коммит остаётся в силе.
+        if self._seeds.get(chat_id) != seed:
+            raise ArgError("Это зерно уже использовано — нужен новый /commit")
+        del self._seeds[chat_id]
+        try:
+            return await self.log.append(kind=kind, chat=chat_id, commit=commitment(seed), seed=seed.hex(),
+                                         salt=salt, input=text, k=k, out=out)
+        except BaseException:
+            self._seeds.setdefault(chat_id, seed)
+            raise
+
+
+def verify(lines):
+    # Проверка журнала без бота и без сети: цепочка хэшей, нумерация, зерно
+    # против коммита (коммит должен быть раньше и использоваться один раз)
+    # и повторный розыгрыш с совпадением хэша результата.
+    # Выдаёт (запись, [проблемы]) по каждой строке.
+    prev, seq = GENESIS, 0
+    commits = set()
+    for raw in lines:
+        line = raw.rstrip(b"\r\n") if isinstance(raw, bytes) else raw.rstrip("\r\n").encode()
+        if not line:
+            continue
+        entry = json.loads(line)
+        problems = []
+        seq += 1
+        if entry.get("n") != seq:
+            problems.append(f"номер {entry.get('n')} вместо {seq}")
+        if entry.get("prev") != prev:
+            problems.append("цепочка хэшей нарушена")
+        prev = hashlib.sha256(line).hexdigest()
+        kind = entry.get("kind")
+        if kind == "commit":
+            commits.add((entry["chat"], entry["commit"]))
+        elif kind in KINDS:
+            seed = bytes.fromhex(entry["seed"])
+            if commitment(seed) != entry["commit"]:
+                problems.append("зерно не совпадает с коммитом")
+            key = (entry["chat"], entry["commit"])
+            if key not in commits:
+                problems.append("коммита нет раньше в журнале или он уже использован")
+            commits.discard(key)
+            try:
+                stream = DrawStream(derive_key(seed, kind, entry["salt"], entry["input"], entry["k"]))
+                out = result_digest(draw(kind, stream, entry["input"], entry["k"]))
+            except (ArgError, ValueError) as e:
+                problems.append(f"розыгрыш не повторяется: {e}")
+            else:
+                if out != entry["out"]:
+                    problems.append("результат не совпадает")
+        else:
+            problems.append(f"неизвестная запись: {kind}")
+        yield entry, problems
+
+
+def replay(entry: dict):
+    # Результат записанного розыгрыша заново — для показа при проверке.
+    stream = DrawStream(derive_key(bytes.fromhex(entry["seed"]), entry["kind"], entry["salt"],
+                                   entry["input"], entry["k"]))
+    return draw(entry["kind"], stream, entry["input"], entry["k"])
@@ -0,0 +1,47 @@
+import argparse
+import hashlib
+import time
+from audit import DrawStream, derive_key, hashed
+from rng import make_engine
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость розыгрышей с проверкой: перестановка n элементов с хэшем результата")
+    parser.add_argument("--n", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    key = derive_key(b"\0" * 32, "permute", "bench", str(args.n))
+
+    def audited():
+        h = hashlib.sha256()
+        for _ in hashed(map(str, DrawStream(key).iter_permutation(args.n)), h):
+            pass
+        return h.hexdigest()
+
+    def words():
+        s = DrawStream(key)
+        for _ in range(args.n):
+            s._word()
+
+    rows = [("поток HMAC-SHA512, слов", timed(words)[0])]
+    elapsed, digest = timed(audited)
+    rows.append(("перестановка + sha256", elapsed))
+    for kind in ("python", "numpy"):
+        try:
+            engine = make_engine(1, kind)
+            rows.append((f"перестановка {kind} (без проверки)", timed(lambda: list(engine.iter_permutation(args.n)))[0]))
+        except RuntimeError:
+            pass
+    print(f"n={args.n}, sha256 результата {digest[:16]}…")
+    for name, elapsed in rows:
+        print(f"{name:<36} {elapsed * 1000:8.0f} мс  {args.n / elapsed / 1e6:6.2f} млн/с")
+
+
+if __name__ == "__main__":
+    main()
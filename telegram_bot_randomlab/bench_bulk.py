@@ -0,0 +1,46 @@
+import argparse
+import time
+import tracemalloc
+import uuid
+from unittest.mock import patch
+import bulk
+from entropy import EntropyPool
+
+
+def measure(fn):
+    # (секунды, пик памяти в байтах); время — без tracemalloc, он замедляет циклы
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость массовой генерации: по одному значению против bulk.py")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--length", type=int, default=16, help="длина пароля")
+    args = parser.parse_args()
+    n, length = args.count, args.length
+    pool = EntropyPool(prefetch=0)
+
+    cases = [
+        ("uuid: uuid.uuid4() в цикле", lambda: "\n".join(str(uuid.uuid4()) for _ in range(n)).encode()),
+        ("uuid: bulk.uuids", lambda: bulk.uuids(n)),
+        ("password: по одному", lambda: "\n".join(pool.password(length) for _ in range(n)).encode()),
+        ("password: bulk.passwords", lambda: bulk.passwords(pool, length, n)),
+        ("color: по одному", lambda: "\n".join(f"#{int.from_bytes(pool.take(3), 'big'):06X}" for _ in range(n)).encode()),
+        ("color: bulk.colors", lambda: bulk.colors(n)),
+    ]
+    # меряется скорость, а не лимит запроса: на время прогона он снят
+    with patch.object(bulk, "MAX_BYTES", n * (max(length, 36) + 2)):
+        print(f"{'способ':<30} {'мс':>8} {'млн/с':>8} {'пик, МиБ':>9}")
+        for name, fn in cases:
+            elapsed, peak = measure(fn)
+            print(f"{name:<30} {elapsed * 1000:8.1f} {n / elapsed / 1e6:8.2f} {peak / (1 << 20):9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import random
+import timeit
+from dice import _compile, compile_roll, evaluate, run
+from rng import make_engine
+
+EXPRESSIONS = ["3d6", "4d6kh3+2", "2d20adv", "3d6!", "d%", "6x 4d6kh3", "(1d8+2)*3 - 1d4"]
+
+
+def per_die(n: int, m: int, k: int, r: random.Random) -> int:
+    # Наивная схема для сравнения: цикл Python по каждому кубику.
+    rolls = [r.randint(1, m) for _ in range(n)]
+    return sum(sorted(rolls, reverse=True)[:k])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность движка выражений /roll")
+    parser.add_argument("--count", type=int, default=20000, help="сколько раз вычислять каждое выражение")
+    parser.add_argument("--pool", type=int, default=100000, help="размер большой пачки кубиков (Nd6kh3)")
+    parser.add_argument("--rng", default=None, help="генератор: numpy или python")
+    args = parser.parse_args()
+    rng = make_engine(1, args.rng)
+
+    print(f"{'выражение':20s} {'разбор без кэша':>16s} {'с кэшем':>12s} {'вычисление':>12s}")
+    for text in EXPRESSIONS:
+        cold = min(timeit.repeat(lambda: (_compile.cache_clear(), compile_roll(text)), number=args.count, repeat=3))
+        warm = min(timeit.repeat(lambda: compile_roll(text), number=args.count, repeat=3))
+        program = compile_roll(text)
+        ev = min(timeit.repeat(lambda: run(program, rng), number=args.count, repeat=3))
+        print(f"{text:20s} {args.count / cold:12,.0f} /с {args.count / warm:9,.0f} /с {args.count / ev:9,.0f} /с")
+
+    big = compile_roll(f"{args.pool}d6kh3")
+    r = random.Random(1)
+    bulk = min(timeit.repeat(lambda: evaluate(big.expr, rng, detail=False), number=5, repeat=3)) / 5
+    loop = min(timeit.repeat(lambda: per_die(args.pool, 6, 3, r), number=1, repeat=3))
+    print(f"\n{args.pool}d6kh3: пачкой {bulk * 1000:.1f} мс, по кубику {loop * 1000:.1f} мс (x{loop / bulk:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import argparse
+import secrets
+import timeit
+from entropy import PASSWORD_ALPHABET, EntropyPool
+
+
+def per_char(length: int) -> str:
+    return "".join(secrets.choice(PASSWORD_ALPHABET) for _ in range(length))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение генерации паролей: secrets.choice vs EntropyPool")
+    parser.add_argument("--length", type=int, default=16)
+    parser.add_argument("--count", type=int, default=20000)
+    args = parser.parse_args()
+    pool = EntropyPool()
+    pool.password(args.length)  # запуск фонового потока
+
+    cases = [
+        ("secrets.choice по символу", lambda: [per_char(args.length) for _ in range(args.count)]),
+        ("EntropyPool.password", lambda: [pool.password(args.length) for _ in range(args.count)]),
+        ("EntropyPool.passwords (пачкой)", lambda: pool.passwords(args.length, args.count)),
+    ]
+    base = None
+    for name, fn in cases:
+        t = min(timeit.repeat(fn, number=1, repeat=3))
+        base = base or t
+        print(f"{name:32s} {args.count / t:12,.0f} паролей/с  x{base / t:.1f}")
+
+
+if __name__ == "__main__":
+    main()
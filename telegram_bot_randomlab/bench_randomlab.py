@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+import bot_randomlab as br
+from fake_telegram import StubRequest, make_update
+from metrics import Histogram
+from rng import make_engine
+
+# Типичные вызовы каждой команды для синтетического потока
+COMMANDS = {
+    "start": "/start", "help": "/help", "roll": "/roll 3d6", "coin": "/coin",
+    "rand": "/rand 1 1000", "choose": "/choose red|green|blue|yellow",
+    "shuffle": "/shuffle a|b|c|d|e|f|g|h", "password": "/password 16", "uuid": "/uuid",
+    "color": "/color", "eightball": "/eightball", "lorem": "/lorem 30",
+    "sample": "/sample 3 a|b|c|d|e|f|g", "permute": "/permute 10",
+}
+
+
+class TimingProcessor(BaseUpdateProcessor):
+    # Отмечает момент завершения обработки каждого апдейта.
+    def __init__(self, max_concurrent_updates, done, expected):
+        super().__init__(max_concurrent_updates)
+        self.done = done
+        self.expected = expected
+        self.finished = asyncio.Event()
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+        self.done[update.update_id] = time.perf_counter()
+        if len(self.done) >= self.expected:
+            self.finished.set()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+def parse_mix(spec: str) -> dict:
+    # "roll=3,coin=1" → веса команд; пустая строка — все команды поровну.
+    if not spec:
+        return {name: 1.0 for name in COMMANDS}
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in COMMANDS:
+            raise SystemExit(f"неизвестная команда в --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def make_stream(mix: dict, updates: int, chats: int, seed: int):
+    rnd = random.Random(seed)
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    picks = rnd.choices(names, weights, k=updates)
+    return [(i + 1, picks[i], make_update(i + 1, 1000 + rnd.randrange(chats), COMMANDS[picks[i]]))
+            for i in range(updates)]
+
+
+def schedule(shape: str, updates: int, rate: float, burst: int, pause: float, seed: int):
+    # Моменты отправки апдейтов (секунды от старта) для выбранной формы нагрузки.
+    rnd = random.Random(seed)
+    if shape == "flood" or (shape == "steady" and not rate):
+        return [0.0] * updates
+    if shape == "steady":
+        return [i / rate for i in range(updates)]
+    if shape == "poisson":
+        t, out = 0.0, []
+        for _ in range(updates):
+            t += rnd.expovariate(rate)
+            out.append(t)
+        return out
+    if shape == "burst":
+        return [(i // burst) * pause for i in range(updates)]
+    raise SystemExit(f"неизвестная форма нагрузки: {shape}")
+
+
+async def run_stream(stream, times, workers: int):
+    done = {}
+    processor = TimingProcessor(workers, done, len(stream))
+    app = br.build_application("123:bench", webhook=True, request=StubRequest(),
+                               concurrent_updates=processor, rng=make_engine(0))
+    started = {}
+    async with app:
+        await app.start()
+        t0 = time.perf_counter()
+        for (uid, _, data), at in zip(stream, times):
+            delay = t0 + at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            started[uid] = time.perf_counter()
+            await app.update_queue.put(Update.de_json(data, app.bot))
+            await asyncio.sleep(0)  # как у настоящего входа: приём чередуется с обработкой
+        await processor.finished.wait()
+        await app.stop()
+    elapsed = max(done.values()) - t0
+    per_cmd = {}
+    total = Histogram()
+    for uid, name, _ in stream:
+        micros = int((done[uid] - started[uid]) * 1e6)
+        total.record(micros)
+        per_cmd.setdefault(name, Histogram()).record(micros)
+    return len(stream) / elapsed, total, per_cmd
+
+
+async def measure_alloc(names, repeats: int) -> dict:
+    # Пиковый объём временных выделений памяти на один апдейт (tracemalloc).
+    app = br.build_application("123:bench", request=StubRequest(), rng=make_engine(0))
+    out = {}
+    async with app:
+        for name in names:
+            updates = [Update.de_json(make_update(i, 1000, COMMANDS[name]), app.bot) for i in range(repeats + 1)]
+            await app.process_update(updates[0])  # прогрев
+            gc.collect()
+            tracemalloc.start()
+            peak = 0
+            for upd in updates[1:]:
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                await app.process_update(upd)
+                peak += tracemalloc.get_traced_memory()[1] - base
+            tracemalloc.stop()
+            out[name] = peak / repeats
+    return out
+
+
+STREAM_PARAMS = ("updates", "chats", "mix", "shape", "rate", "burst", "pause", "workers", "seed")
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list:
+    problems = []
+    old_params = baseline.get("params", {})
+    differ = [k for k in STREAM_PARAMS if old_params.get(k) != result["params"].get(k)]
+    if differ:
+        print("внимание: параметры потока отличаются от базовой линии:", ", ".join(differ))
+    if result["updates_per_sec"] < baseline["updates_per_sec"] * (1 - threshold):
+        problems.append(f"пропускная способность: {result['updates_per_sec']:.0f} < {baseline['updates_per_sec']:.0f}")
+    if result["p99_us"] > baseline["p99_us"] * (1 + threshold):
+        problems.append(f"общий p99: {result['p99_us']} мкс > {baseline['p99_us']} мкс")
+    # по командам сравниваем медиану: на сотнях замеров p99 слишком шумный
+    for name, cur in result["commands"].items():
+        old = baseline.get("commands", {}).get(name)
+        if old and cur["p50_us"] > old["p50_us"] * (1 + threshold) and cur["p50_us"] - old["p50_us"] > 50:
+            problems.append(f"{name}: p50 {cur['p50_us']} мкс > {old['p50_us']} мкс")
+        if old and cur["alloc_bytes"] > old["alloc_bytes"] * (1 + threshold) and cur["alloc_bytes"] - old["alloc_bytes"] > 1024:
+            problems.append(f"{name}: память {cur['alloc_bytes']:.0f} Б > {old['alloc_bytes']:.0f} Б")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-нагрузка на весь конвейер Application с заглушкой Bot API")
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--mix", default="", help="веса команд, например roll=3,coin=1 (по умолчанию все поровну)")
+    parser.add_argument("--shape", default="flood", choices=["flood", "steady", "poisson", "burst"])
+    parser.add_argument("--rate", type=float, default=0, help="апдейтов в секунду для steady/poisson")
+    parser.add_argument("--burst", type=int, default=500, help="размер пачки для burst")
+    parser.add_argument("--pause", type=float, default=0.05, help="пауза между пачками, с")
+    parser.add_argument("--workers", type=int, default=64, help="concurrent_updates")
+    parser.add_argument("--alloc-repeats", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="сохранить результат как базовую линию (JSON)")
+    parser.add_argument("--compare", help="сравнить с базовой линией (JSON)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="допустимая деградация (доля)")
+    parser.add_argument("--repeat", type=int, default=3, help="прогонов потока; берётся лучший")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    stream = make_stream(mix, args.updates, args.chats, args.seed)
+    times = schedule(args.shape, args.updates, args.rate, args.burst, args.pause, args.seed)
+    rate, total, per_cmd = max((asyncio.run(run_stream(stream, times, args.workers)) for _ in range(args.repeat)),
+                               key=lambda r: r[0])
+    alloc = asyncio.run(measure_alloc(sorted(mix), args.alloc_repeats))
+
+    result = {"updates_per_sec": rate, "p50_us": total.percentile(0.5), "p99_us": total.percentile(0.99),
+              "params": {k: v for k, v in vars(args).items() if k not in ("save", "compare", "threshold")},
+              "commands": {name: {"count": h.count, "p50_us": h.percentile(0.5), "p99_us": h.percentile(0.99),
+                                  "alloc_bytes": alloc[name]} for name, h in sorted(per_cmd.items())}}
+    print(f"апдейтов: {args.updates}, чатов: {args.chats}, форма: {args.shape}, воркеров: {args.workers}")
+    print(f"пропускная способность: {rate:,.0f} upd/s, p50={result['p50_us']} мкс, p99={result['p99_us']} мкс")
+    print(f"{'команда':10s} {'кол-во':>7s} {'p50, мкс':>9s} {'p99, мкс':>9s} {'память/апд, КиБ':>16s}")
+    for name, c in result["commands"].items():
+        print(f"{name:10s} {c['count']:7d} {c['p50_us']:9d} {c['p99_us']:9d} {c['alloc_bytes'] / 1024:16.1f}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            problems = compare(result, json.load(f), args.threshold)
+        for p in problems:
+            print("РЕГРЕССИЯ:", p)
+        if problems:
+            sys.exit(1)
+        print("регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
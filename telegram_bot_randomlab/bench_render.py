@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from render import Renderer, dice, histogram
+
+
+async def lag_probe(stop: asyncio.Event, interval: float, samples: list):
+    # Насколько позже срока просыпается цикл событий.
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - t - interval)
+
+
+async def run(workers: int, jobs: list, interval: float):
+    renderer = Renderer(workers=workers)
+    await renderer.open()
+    if workers:
+        await renderer.png("warmup", dice, [1], 6)  # запуск процессов не считаем
+    stop = asyncio.Event()
+    samples = []
+    probe = asyncio.create_task(lag_probe(stop, interval, samples))
+    start = time.perf_counter()
+    for i, (fn, args) in enumerate(jobs):
+        await renderer.png(i, fn, *args)
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    hits = time.perf_counter()
+    for i, (fn, args) in enumerate(jobs):
+        await renderer.png(i, fn, *args)
+    hits = time.perf_counter() - hits
+    await renderer.close()
+    return elapsed, samples, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка цикла событий при кодировании PNG: в цикле и в пуле процессов")
+    parser.add_argument("--count", type=int, default=200, help="сколько картинок нарисовать")
+    parser.add_argument("--workers", type=int, default=2, help="процессов в пуле")
+    parser.add_argument("--interval", type=float, default=0.005, help="период пробы цикла, с")
+    args = parser.parse_args()
+    r = random.Random(1)
+    jobs = []
+    for i in range(args.count):
+        if i % 2:
+            jobs.append((dice, ([r.randint(1, 6) for _ in range(12)], 6)))
+        else:
+            jobs.append((histogram, ([r.randint(0, 1000) for _ in range(800)],)))
+
+    print(f"{'режим':22s} {'картинок/с':>10s} {'лаг p50':>9s} {'лаг p99':>9s} {'лаг max':>9s} {'из кэша':>12s}")
+    for name, workers in (("в цикле событий", 0), (f"пул, {args.workers} проц.", args.workers)):
+        elapsed, samples, hits = asyncio.run(run(workers, jobs, args.interval))
+        samples.sort()
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] if samples else 0.0
+        p50 = statistics.median(samples) if samples else 0.0
+        mx = samples[-1] if samples else 0.0
+        print(f"{name:22s} {args.count / elapsed:10,.0f} {p50 * 1000:7.2f}мс {p99 * 1000:7.2f}мс "
+              f"{mx * 1000:7.2f}мс {args.count / hits:10,.0f}/с")
+
+
+if __name__ == "__main__":
+    main()
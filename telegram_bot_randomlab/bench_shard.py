@@ -0,0 +1,53 @@
+import argparse
+import asyncio
+import os
+import time
+from fake_telegram import FakeTelegram, make_update, post_updates
+from shard import ShardSupervisor
+from webhook import WebhookServer
+
+COMMANDS = ["/roll 2d6", "/coin", "/rand 1 100", "/choose a|b|c", "/password 16",
+            "/uuid", "/color", "/eightball", "/lorem 10", "/permute 8"]
+
+
+async def bench_one(workers: int, updates: int, chats: int, concurrency: int) -> float:
+    api = FakeTelegram()
+    await api.start()
+    os.environ.update(TELEGRAM_BOT_TOKEN="123:bench", TELEGRAM_BASE_URL=api.base_url, OUTBOX_ENABLED="0",
+                      RATE_LIMIT_ENABLED="0", RENDER_ENABLED="0")
+    supervisor = ShardSupervisor(workers)
+    await supervisor.start()
+    server = WebhookServer(None, "127.0.0.1", 0, "telegram", sink=supervisor.route)
+    await server.start()
+    url = f"http://127.0.0.1:{server.port}/telegram"
+    # прогрев: ждём, пока все воркеры поднимутся и ответят
+    await post_updates(url, [make_update(i, i, "/coin") for i in range(workers)], workers)
+    await api.wait_for_messages(workers, timeout=60)
+    payload = [make_update(i, 1000 + i % chats, COMMANDS[i % len(COMMANDS)]) for i in range(updates)]
+    t0 = time.perf_counter()
+    await post_updates(url, payload, concurrency)
+    await api.wait_for_messages(workers + updates, timeout=300)
+    elapsed = time.perf_counter() - t0
+    await server.stop()
+    await supervisor.stop()
+    await api.stop()
+    return updates / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Масштабирование многопроцессного режима по числу воркеров")
+    parser.add_argument("--workers", default="1,2,4", help="список количеств воркеров через запятую")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    print(f"ядер: {os.cpu_count()}, апдейтов: {args.updates}, чатов: {args.chats}")
+    base = None
+    for n in map(int, args.workers.split(",")):
+        rate = asyncio.run(bench_one(n, args.updates, args.chats, args.concurrency))
+        base = base or rate
+        print(f"воркеров={n:3d}  {rate:10,.0f} upd/s  x{rate / base:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import multiprocessing
+import time
+from lazy import importtime
+from shard import PRELOAD
+
+
+def ready(conn):
+    # То, что делает воркер до первого апдейта: импорт бота и сборка Application.
+    import bot_randomlab as br
+    br.build_application("123:bench")
+    conn.send(True)
+    conn.close()
+
+
+def start_times(method: str, count: int) -> list:
+    ctx = multiprocessing.get_context(method)
+    if method == "forkserver":
+        ctx.set_forkserver_preload(list(PRELOAD))
+    times = []
+    for _ in range(count):
+        parent, child = ctx.Pipe()
+        t = time.perf_counter()
+        proc = ctx.Process(target=ready, args=(child,))
+        proc.start()
+        parent.recv()
+        times.append(time.perf_counter() - t)
+        proc.join()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время запуска: разбор -X importtime и старт воркеров spawn/forkserver")
+    parser.add_argument("--module", default="bot_randomlab", help="какой модуль импортировать")
+    parser.add_argument("--top", type=int, default=20, help="сколько самых долгих импортов показать")
+    parser.add_argument("--depth", type=int, default=2, help="максимальная вложенность в выводе")
+    parser.add_argument("--workers", type=int, default=3, help="сколько воркеров запустить каждым способом")
+    args = parser.parse_args()
+
+    rows = importtime(args.module)
+    total = next(cum for name, _, cum, depth in reversed(rows) if name == args.module and depth == 0)
+    print(f"import {args.module}: {total / 1000:.1f} мс, модулей: {len(rows)}")
+    print(f"{'модуль':40s} {'своё':>9s} {'всего':>9s}")
+    shown = sorted((r for r in rows if r[3] <= args.depth), key=lambda r: r[2], reverse=True)[:args.top]
+    for name, own, cum, depth in shown:
+        print(f"{'  ' * depth + name:40s} {own / 1000:7.1f}мс {cum / 1000:7.1f}мс")
+
+    print(f"\nстарт воркера до готовности (импорт + Application), {args.workers} раза:")
+    for method in ("spawn", "forkserver"):
+        times = start_times(method, args.workers)
+        print(f"{method:12s} " + ", ".join(f"{t * 1000:.0f} мс" for t in times))
+
+
+if __name__ == "__main__":
+    main()
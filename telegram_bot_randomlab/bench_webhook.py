@@ -0,0 +1,50 @@
+import argparse
+import asyncio
+import time
+import bot_randomlab as br
+from fake_telegram import FakeTelegram, make_update, post_updates
+from webhook import WebhookServer
+
+COMMANDS = ["/roll 2d6", "/coin", "/rand 1 100", "/choose a|b|c", "/password 16",
+            "/uuid", "/color", "/eightball", "/lorem 10", "/permute 8"]
+
+
+async def bench(updates: int, chats: int, concurrency: int, workers: int, secret: str):
+    api = FakeTelegram()
+    await api.start()
+    app = br.build_application("123:bench", base_url=api.base_url, webhook=True,
+                               concurrent_updates=workers)
+    server = WebhookServer(app, "127.0.0.1", 0, "telegram", secret)
+    payload = [make_update(i, 1000 + i % chats, COMMANDS[i % len(COMMANDS)])
+               for i in range(1, updates + 1)]
+    async with app:
+        await app.start()
+        await server.start()
+        url = f"http://127.0.0.1:{server.port}/telegram"
+        t0 = time.perf_counter()
+        statuses = await post_updates(url, payload, concurrency, secret)
+        t_ingress = time.perf_counter() - t0
+        await api.wait_for_messages(updates, timeout=120)
+        t_total = time.perf_counter() - t0
+        await server.stop()
+        await app.stop()
+    await api.stop()
+    bad = sum(1 for s in statuses if s != 200)
+    print(f"updates={updates} chats={chats} http_concurrency={concurrency} workers={workers}")
+    print(f"ingress: {updates / t_ingress:,.0f} upd/s ({t_ingress:.2f} s), отклонено: {bad}")
+    print(f"end-to-end: {updates / t_total:,.0f} upd/s ({t_total:.2f} s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк webhook-режима на локальном фейковом Telegram")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--secret", default="bench-secret")
+    args = parser.parse_args()
+    asyncio.run(bench(args.updates, args.chats, args.concurrency, args.workers, args.secret))
+
+
+if __name__ == "__main__":
+    main()
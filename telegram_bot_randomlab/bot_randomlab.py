@@ -1,13 +1,34 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
 import os
-import random
-import secrets
-import string
 import uuid
-from dotenv import load_dotenv
-from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+import bulk
+from dice import compile_roll, format_results, run
+from entropy import EntropyPool
+from inline import InlineRouter
+from lazy import lazy_import
+from metrics import Metrics, MetricsServer
+from rng import make_engine
+from router import ArgError, CommandRouter, int_arg, list_arg, parse_list, reply
+from store import LIST, SETTING, ChatStore
+from streaming import prepare, send_prepared, send_stream
+from weighted import ListCache, parse_weighted
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
 
-load_dotenv()
+# Тяжёлое загружается при первой надобности: telegram.ext (Application,
+# очередь, ограничитель) — в build_application, numpy — при первом броске,
+# эти модули — при первой команде, которой они нужны.
+audit = lazy_import("audit")
+odds = lazy_import("odds")
+render = lazy_import("render")
+scheduler = lazy_import("scheduler")
 
 WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consetetur",
          "adipiscing", "elit", "sed", "do", "eiusmod", "tempor",
@@ -25,179 +46,686 @@ EIGHTBALL = [
     "По моим данным — нет", "Перспективы не очень хорошие", "Весьма сомнительно"
 ]
 
-def _parse_list_arg(arg: str):
-    return [x for x in (s.strip() for s in arg.split("|")) if x]
+# Большие результаты отправляются потоком (streaming.py): несколько
+# сообщений по 4096 символов или один файл; собираются они в отдельном
+# потоке на своём генераторе (RNG.fork()).
+LOREM_MAX = 100_000
+PERMUTE_MAX = 1_000_000
+ROLL_MAX_DICE = 100_000        # с выводом всех бросков
+ROLL_MAX_SUM = 10_000_000      # /roll NdM sum — только сумма
+ROLL_INLINE = 20               # до стольких бросков — прежний формат одной строкой
+
+_ENTROPY = EntropyPool()
+RNG = make_engine()
 
+ROUTER = CommandRouter()
+_parse_list_arg = parse_list
+LISTS = ListCache()  # разобранные списки /choose и /sample (с таблицами весов) по чатам
+STORE = None         # store.ChatStore: сохранённые списки и настройки чатов; None — выключено
+RENDERER = None      # render.Renderer: картинки для /color и /roll ... img; None — только текст
+AUDIT = None         # audit.Auditor: розыгрыши с проверкой (/commit); None — выключено
+SCHEDULER = None     # scheduler.Scheduler: команды по расписанию (/schedule); None — выключено
+ROLL_IMAGE_DICE = 12 # /roll NdM img: до стольких кубиков — грани, больше — гистограмма
+MAX_SAVED_LISTS = 50
+MAX_LIST_TEXT = 4000
+
+@ROUTER.command("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await context.bot.send_message(chat_id=update.effective_chat.id,
-                                   text="Привет! Я RandomLab — набор простых рандом‑инструментов. Набери /help.")
+    await reply(update, context, "Привет! Я RandomLab — набор простых рандом‑инструментов. Набери /help.")
+
+HELP_TEXT = (
+    "/start — приветствие\n"
+    "/help — справка\n"
+    "/roll [выражение] [sum|img] — кубики: 2d6, 4d6kh3+2, 2d20adv, 3d6!, d%, 6x 4d6kh3 (sum — только сумма, img — картинка)\n"
+    "/odds <выражение> [>= N] — точные вероятности: 3d6, 4d6kh3 >= 15\n"
+    "/coin — орёл/решка\n"
+    "/rand <a> <b> — случайное целое [a, b]\n"
+    "/choose a|b|c — выбрать один из списка (веса: a:5|b:1)\n"
+    "/shuffle a|b|c — перемешать список\n"
+    "/password [len] [xN] [csv] — пароль длины 8..64 (xN — N паролей файлом)\n"
+    "/uuid [N] [csv] — UUID v4 (N штук — файлом)\n"
+    "/color [N] [csv] — случайный цвет #RRGGBB (с образцом; N штук — файлом)\n"
+    "/eightball — магический шар\n"
+    "/lorem <n> — n слов lorem (n≤100000)\n"
+    "/sample <k> a|b|c — выбрать k без повторов (веса: a:2|b)\n"
+    "/permute <n> — перестановка 1..n (n≤1000000)\n"
+    "/save <имя> a|b|c — сохранить список (потом /choose @имя)\n"
+    "/commit — розыгрыш с проверкой: хэш зерна сейчас, потом /choose !<соль> a|b|c (и /shuffle, /sample, /permute)\n"
+    "/schedule in 10m|at 18:00|every 1h|daily 18:00|cron … /команда — по расписанию (UTC)\n"
+    "/schedules — задания чата, /unschedule <id> — удалить\n"
+    "/lists — сохранённые списки, /forget <имя> — удалить\n"
+    "/set dice 3d6 | /set password 20 — значения по умолчанию"
+)
 
+@ROUTER.command("help")
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    text = (
-        "/start — приветствие\n"
-        "/help — справка\n"
-        "/roll <NdM> — бросить N кубиков с M гранями (напр. 2d6)\n"
-        "/coin — орёл/решка\n"
-        "/rand <a> <b> — случайное целое [a, b]\n"
-        "/choose a|b|c — выбрать один из списка\n"
-        "/shuffle a|b|c — перемешать список\n"
-        "/password <len> — пароль длины 8..64\n"
-        "/uuid — UUID v4\n"
-        "/color — случайный цвет #RRGGBB\n"
-        "/eightball — магический шар\n"
-        "/lorem <n> — n слов lorem\n"
-        "/sample <k> a|b|c — выбрать k без повторов\n"
-        "/permute <n> — перестановка 1..n (n≤10)"
-    )
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=text)
-
-async def roll(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not context.args or "d" not in context.args[0]:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Использование: /roll NdM (например, 2d6)")
+    await reply(update, context, HELP_TEXT)
+
+_ROLL_USAGE = "Использование: /roll <выражение> [sum|img] (например, 2d6, 4d6kh3+2, 2d20adv, 6x 4d6kh3)"
+_ROLL_MODES = ("sum", "img")
+
+def _roll_expr(text: str):
+    # «выражение [sum|img]» → (скомпилированное выражение из dice.py, режим или None)
+    words = text.split()
+    mode = None
+    if len(words) > 1 and words[-1].lower() in _ROLL_MODES:
+        mode = words.pop().lower()
+    return compile_roll(" ".join(words), ROLL_MAX_SUM), mode
+
+async def _default(update, context, key, conv, usage):
+    # Значение аргумента из /set; без него — подсказка по использованию.
+    value = None
+    if STORE is not None:
+        value = await STORE.get(update.effective_chat.id, SETTING, key)
+    if value is None:
+        await reply(update, context, usage)
+        return None
+    return conv(value)
+
+def _roll_text(rolls):
+    return f"Броски: {rolls} | сумма={sum(rolls)}"
+
+@ROUTER.command("roll", rest=_roll_expr, rest_optional=True, usage=_ROLL_USAGE)
+async def roll(update: Update, context: ContextTypes.DEFAULT_TYPE, parsed=None):
+    if parsed is None:
+        parsed = await _default(update, context, "dice", _roll_expr, _ROLL_USAGE)
+        if parsed is None:
+            return
+    program, mode = parsed
+    if not program.plain:
+        await _roll_expression(update, context, program, mode == "sum")
         return
-    try:
-        n_str, m_str = context.args[0].lower().split("d", 1)
-        n = int(n_str); m = int(m_str)
-        if n <= 0 or m <= 1 or n > 20 or m > 1000:
-            raise ValueError
-    except Exception:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Неверный формат. Пример: 3d6 (1≤n≤20, 2≤m≤1000)")
+    n, m = program.expr.n, program.expr.m
+    if mode == "sum":
+        await reply(update, context, f"{n}d{m}: сумма={RNG.sum_randints(1, m, n)}")
+        return
+    if n > ROLL_MAX_DICE:
+        await reply(update, context, f"Больше {ROLL_MAX_DICE} бросков — только сумма: /roll {n}d{m} sum")
+        return
+    if mode == "img" and RENDERER is not None:
+        await _roll_image(update, context, n, m)
+        return
+    if n <= ROLL_INLINE:
+        await reply(update, context, _roll_text(RNG.randints(1, m, n)))
         return
-    rolls = [random.randint(1, m) for _ in range(n)]
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=f"Броски: {rolls} | сумма={sum(rolls)}")
 
-async def coin(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=random.choice(["Орёл", "Решка"]))
+    def pieces(rng):
+        total = 0
+        yield "Броски:"
+        for x in rng.iter_randints(1, m, n):
+            total += x
+            yield str(x)
+        yield f"| сумма={total}"
+    await send_stream(update, context, pieces(RNG.fork()), filename=f"roll_{n}d{m}.txt", offload=True)
 
-async def rand_int(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if len(context.args) != 2:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Использование: /rand <a> <b>")
-        return
-    try:
-        a = int(context.args[0]); b = int(context.args[1])
-    except ValueError:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="a и b должны быть целыми числами")
+async def _roll_image(update, context, n, m):
+    # До ROLL_IMAGE_DICE кубиков — картинка с гранями, больше — гистограмма выпавших граней.
+    if n <= ROLL_IMAGE_DICE:
+        rolls = RNG.randints(1, m, n)
+        await RENDERER.send(update, context, ("dice", m, tuple(rolls)), render.dice, rolls, m,
+                            caption=_roll_text(rolls))
         return
+    counts = [0] * m
+    for x in RNG.iter_randints(1, m, n):
+        counts[x - 1] += 1
+    total = sum(v * c for v, c in enumerate(counts, 1))
+    await RENDERER.send(update, context, ("hist", tuple(counts)), render.histogram, counts,
+                        caption=f"{n}d{m}: сумма={total}")
+
+async def _roll_expression(update, context, program, only_sum):
+    if program.dice * program.repeat > ROLL_MAX_DICE:
+        raise ArgError(f"В выражении больше {ROLL_MAX_DICE} кубиков")
+    results = run(program, RNG, detail=False if only_sum else None)
+    await send_stream(update, context, format_results(program, results).split("\n"), sep="\n",
+                      filename="roll.txt")
+
+_ODDS_USAGE = "Использование: /odds <выражение> [>= N] (например, 3d6, 4d6kh3 >= 15, 2d20adv > 10)"
+
+@ROUTER.command("odds", rest=lambda text: odds.parse_odds(text), usage=_ODDS_USAGE)
+async def odds_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE, parsed):
+    program, cmp = parsed
+    dist = await odds.solve_async(program)
+    await reply(update, context, odds.format_odds(program, cmp, dist))
+
+@ROUTER.command("coin")
+async def coin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await reply(update, context, RNG.choice(["Орёл", "Решка"]))
+
+_ab = int_arg(type_error="a и b должны быть целыми числами")
+
+@ROUTER.command("rand", _ab, _ab, usage="Использование: /rand <a> <b>")
+async def rand_int(update: Update, context: ContextTypes.DEFAULT_TYPE, a, b):
     if a > b:
         a, b = b, a
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=str(random.randint(a, b)))
+    await reply(update, context, str(RNG.randint(a, b)))
+
+async def _list_text(update, context, text):
+    # «@имя» — список, сохранённый через /save, иначе сам текст списка.
+    if not text.startswith("@"):
+        return text
+    name = text[1:].lower()
+    saved = None
+    if STORE is not None:
+        saved = await STORE.get(update.effective_chat.id, LIST, name)
+    if saved is None:
+        await reply(update, context, f"Нет сохранённого списка «{name}». Сохранить: /save {name} a|b|c")
+    return saved
 
-async def choose(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not context.args:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Использование: /choose a|b|c")
+async def _weighted_list(update, context, text):
+    text = await _list_text(update, context, text)
+    if text is None:
+        return None
+    return LISTS.get(update.effective_chat.id, text)
+
+@ROUTER.command("choose", rest=str.strip, usage="Использование: /choose a|b|c")
+async def choose(update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+    if _salted(text):
+        await _audited(update, context, "choose", text)
         return
-    items = _parse_list_arg(" ".join(context.args))
-    if not items:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Список пуст.")
+    wl = await _weighted_list(update, context, text)
+    if wl is None:
+        return
+    if not wl.items:
+        await reply(update, context, "Список пуст.")
         return
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=random.choice(items))
+    await reply(update, context, wl.choice(RNG))
 
-async def shuffle_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not context.args:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Использование: /shuffle a|b|c")
+@ROUTER.command("shuffle", rest=str.strip, usage="Использование: /shuffle a|b|c")
+async def shuffle_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+    if _salted(text):
+        await _audited(update, context, "shuffle", text)
         return
-    items = _parse_list_arg(" ".join(context.args))
-    if not items:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Список пуст.")
+    wl = await _weighted_list(update, context, text)
+    if wl is None:
         return
-    random.shuffle(items)
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=" | ".join(items))
-
-async def password(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if len(context.args) != 1:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Использование: /password <len> (8..64)")
+    if not wl.items:
+        await reply(update, context, "Список пуст.")
         return
-    try:
-        length = int(context.args[0])
-    except ValueError:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Длина должна быть целым числом")
+    items = list(wl.items)
+    RNG.shuffle(items)
+    await reply(update, context, " | ".join(items))
+
+_pw_len = int_arg(8, 64, type_error="Длина должна быть целым числом",
+                  range_error="Длина должна быть от 8 до 64 символов")
+
+_PW_USAGE = "Использование: /password <len> [xN] [csv|txt] (len 8..64)"
+_UUID_USAGE = f"Использование: /uuid [N] [csv|txt] (N≤{bulk.MAX_COUNT})"
+_COLOR_USAGE = f"Использование: /color [N] [csv|txt] (N≤{bulk.MAX_COUNT})"
+_bulk_count = int_arg(1, bulk.MAX_COUNT, type_error="Количество должно быть целым",
+                      range_error=f"Количество должно быть 1..{bulk.MAX_COUNT}")
+
+def _bulk_args(usage, value=None):
+    # Хвост массовой команды: «xN» — количество, «csv»/«txt» — файл этого
+    # формата, одно оставшееся слово — value (без него — количество).
+    # → (value или None, количество, формат или None)
+    def parse(text: str):
+        found, count, fmt = None, None, None
+        for word in text.split():
+            low = word.lower()
+            if low in bulk.FORMATS:
+                fmt = low
+            elif low[:1] == "x" and low[1:].isdigit():
+                count = _bulk_count(low[1:])
+            elif found is None:
+                found = word
+            else:
+                raise ArgError(usage)
+        if found is not None and value is None:
+            if count is not None:
+                raise ArgError(usage)
+            found, count = None, _bulk_count(found)
+        return (value(found) if found is not None else None), count or 1, fmt
+    return parse
+
+@ROUTER.command("password", rest=_bulk_args(_PW_USAGE, _pw_len), rest_optional=True, usage=_PW_USAGE)
+async def password(update: Update, context: ContextTypes.DEFAULT_TYPE, parsed=None):
+    length, count, fmt = parsed or (None, 1, None)
+    if length is None:
+        length = await _default(update, context, "password", _pw_len, _PW_USAGE)
+        if length is None:
+            return
+    if count == 1 and fmt is None:
+        await reply(update, context, _ENTROPY.password(length))
         return
-    if not (8 <= length <= 64):
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Длина должна быть от 8 до 64 символов")
+    header = b"password\n" if fmt == "csv" else b""
+    await _send_bulk(update, context, lambda: bulk.passwords(_ENTROPY, length, count, header),
+                     count, fmt, f"passwords_{length}x{count}")
+
+@ROUTER.command("uuid", rest=_bulk_args(_UUID_USAGE), rest_optional=True, usage=_UUID_USAGE)
+async def uuid_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE, parsed=None):
+    _, count, fmt = parsed or (None, 1, None)
+    if count == 1 and fmt is None:
+        await reply(update, context, str(uuid.uuid4()))
         return
-    alphabet = string.ascii_letters + string.digits
-    pwd = "".join(secrets.choice(alphabet) for _ in range(length))
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=pwd)
+    header = b"uuid\n" if fmt == "csv" else b""
+    await _send_bulk(update, context, lambda: bulk.uuids(count, header), count, fmt, f"uuid_{count}")
 
-async def uuid_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=str(uuid.uuid4()))
+@ROUTER.command("color", rest=_bulk_args(_COLOR_USAGE), rest_optional=True, usage=_COLOR_USAGE)
+async def color(update: Update, context: ContextTypes.DEFAULT_TYPE, parsed=None):
+    _, count, fmt = parsed or (None, 1, None)
+    if count > 1 or fmt is not None:
+        header = b"color\n" if fmt == "csv" else b""
+        await _send_bulk(update, context, lambda: bulk.colors(count, header), count, fmt, f"colors_{count}")
+        return
+    val = RNG.randint(0, 0xFFFFFF)
+    if RENDERER is not None:
+        await RENDERER.send(update, context, ("color", val), render.swatch, val, caption=f"#{val:06X}")
+        return
+    await reply(update, context, f"#{val:06X}")
 
-async def color(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    val = random.randint(0, 0xFFFFFF)
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=f"#{val:06X}")
+async def _send_bulk(update, context, build, count, fmt, filename):
+    # build() собирает весь файл в памяти (размер ограничен bulk.MAX_BYTES).
+    await bulk.send(update, context, build(), count, fmt, filename)
 
+@ROUTER.command("eightball")
 async def eightball(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=random.choice(EIGHTBALL))
+    await reply(update, context, RNG.choice(EIGHTBALL))
 
-async def lorem(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if len(context.args) != 1:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Использование: /lorem <n>")
+@ROUTER.command("lorem",
+                int_arg(1, LOREM_MAX, type_error="n должно быть целым",
+                        range_error=f"n должно быть в диапазоне 1..{LOREM_MAX}"),
+                usage="Использование: /lorem <n>")
+async def lorem(update: Update, context: ContextTypes.DEFAULT_TYPE, n):
+    await send_stream(update, context, RNG.fork().iter_choices(WORDS, n), filename="lorem.txt", offload=True)
+
+@ROUTER.command("sample", int_arg(type_error="k должно быть целым"), rest=str.strip,
+                usage="Использование: /sample <k> a|b|c")
+async def sample(update: Update, context: ContextTypes.DEFAULT_TYPE, k, text):
+    if _salted(text):
+        await _audited(update, context, "sample", text, k)
         return
-    try:
-        n = int(context.args[0])
-    except ValueError:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="n должно быть целым")
+    wl = await _weighted_list(update, context, text)
+    if wl is None:
         return
-    if not (1 <= n <= 50):
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="n должно быть в диапазоне 1..50")
+    if k < 0 or k > len(wl.items):
+        raise ArgError("k должно быть в диапазоне 0..len(items)")
+    await reply(update, context, " | ".join(wl.sample(RNG, k)))
+
+@ROUTER.command("permute",
+                int_arg(1, PERMUTE_MAX, type_error="n должно быть целым",
+                        range_error=f"n должно быть 1..{PERMUTE_MAX}"),
+                rest=str.strip, rest_optional=True,
+                usage=f"Использование: /permute <n> [!соль] (n≤{PERMUTE_MAX})")
+async def permute(update: Update, context: ContextTypes.DEFAULT_TYPE, n, salt=None):
+    if salt is not None:
+        if not _salted(salt) or " " in salt:
+            await reply(update, context, _AUDIT_USAGE)
+            return
+        await _audited(update, context, "permute", f"{salt} {n}")
+        return
+    await send_stream(update, context, map(str, RNG.fork().iter_permutation(n)), filename=f"permute_{n}.txt",
+                      offload=True)
+
+# ---- Розыгрыши с проверкой (audit.py) ----
+
+_AUDIT_OFF = "Розыгрыши с проверкой выключены: задайте AUDIT_LOG в .env"
+_AUDIT_USAGE = "Соль — одно слово после «!», о котором договорились участники: /choose !<соль> a|b|c"
+MAX_SALT = 64
+
+def _salted(text: str) -> bool:
+    # «!соль остальное» — розыгрыш с проверкой; «!» внутри списка (a|!b) — обычный список.
+    return text.startswith("!") and "|" not in text.split(None, 1)[0]
+
+@ROUTER.command("commit")
+async def commit_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if AUDIT is None:
+        await reply(update, context, _AUDIT_OFF)
         return
-    words = [random.choice(WORDS) for _ in range(n)]
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=" ".join(words))
+    entry = await AUDIT.commit(update.effective_chat.id)
+    await reply(update, context,
+                f"Коммит #{entry['n']}: sha256(зерна) = {entry['commit']}\n"
+                "Договоритесь о соли и запустите розыгрыш: /choose !<соль> a|b|c "
+                "(или /shuffle, /sample <k>, /permute <n> с !<соль>). Зерно раскроется вместе с результатом.")
 
-async def sample(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if len(context.args) < 2:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Использование: /sample <k> a|b|c")
+async def _audited(update, context, kind, text, k=None):
+    # Розыгрыш на зерне последнего /commit чата, смешанном с солью. Результат
+    # генерируется один раз в отдельном потоке: тем же проходом пишется файл
+    # (или куски) для отправки и считается его sha256 для журнала.
+    # Запись содержит всё, чтобы повторить розыгрыш без бота (verify_audit.py).
+    if AUDIT is None:
+        await reply(update, context, _AUDIT_OFF)
         return
+    salt, _, text = text[1:].partition(" ")
+    text = text.strip()
+    if not salt or len(salt) > MAX_SALT:
+        await reply(update, context, _AUDIT_USAGE)
+        return
+    if kind != "permute":
+        text = await _list_text(update, context, text)
+        if text is None:
+            return
+    chat_id = update.effective_chat.id
+    seed = AUDIT.pending(chat_id)
+    if seed is None:
+        await reply(update, context, "Сначала /commit: хэш зерна публикуется до того, как известна соль.")
+        return
+    key = audit.derive_key(seed, kind, salt, text, k)
+    h = hashlib.sha256()
+    sep = " " if kind == "permute" else " | "
+    prepared = await prepare(audit.hashed(audit.draw(kind, audit.DrawStream(key), text, k), h), sep)
     try:
-        k = int(context.args[0])
-    except ValueError:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="k должно быть целым")
+        # журнал пишется до того, как зерно или результат уходят в чат
+        entry = await AUDIT.record(chat_id, seed, kind, salt, text, k, h.hexdigest())
+        await send_prepared(update, context, prepared, filename=f"{kind}.txt")
+    finally:
+        prepared.close()
+    await reply(update, context,
+                f"Розыгрыш #{entry['n']}, коммит {entry['commit']}\n"
+                f"зерно: {entry['seed']}\nсоль: {salt}\nsha256 результата: {entry['out']}")
+
+# ---- Команды по расписанию (scheduler.py) ----
+
+_SCHEDULE_OFF = "Расписание выключено: SCHEDULE_ENABLED=0 в .env"
+
+def _when(ts: float) -> str:
+    try:
+        return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    except (OverflowError, OSError, ValueError):   # задания, сохранённые до ограничения срока
+        return f"{ts:.0f} (unix)"
+
+def _job_line(job) -> str:
+    repeat = f", каждые {job.every} с" if job.every else (f", cron «{job.cron}»" if job.cron else "")
+    return f"{job.id}: {job.cmd} — {_when(job.due)}{repeat}"
+
+@ROUTER.command("schedule", rest=str.strip, rest_optional=True)
+async def schedule_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE, text=None):
+    if SCHEDULER is None:
+        await reply(update, context, _SCHEDULE_OFF)
         return
-    items = _parse_list_arg(" ".join(context.args[1:]))
-    if k < 0 or k > len(items):
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="k должно быть в диапазоне 0..len(items)")
+    chat = update.effective_chat
+    due, every, cron, cmd = scheduler.parse_schedule(text or "", SCHEDULER.clock())
+    job = SCHEDULER.add(chat.id, due, cmd, update.effective_user.id, chat.type, every, cron)
+    note = "" if SCHEDULER.store is not None else "\nХранилище выключено: после перезапуска задание пропадёт."
+    await reply(update, context, f"Задание {_job_line(job)}{note}")
+
+@ROUTER.command("schedules")
+async def schedules_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if SCHEDULER is None:
+        await reply(update, context, _SCHEDULE_OFF)
+        return
+    jobs = SCHEDULER.jobs(update.effective_chat.id)
+    if not jobs:
+        await reply(update, context, "Заданий нет. Добавить: /schedule in 10m /coin")
         return
-    out = random.sample(items, k)
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=" | ".join(out))
+    await reply(update, context, "\n".join(map(_job_line, jobs)))
 
-async def permute(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if len(context.args) != 1:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="Использование: /permute <n> (n≤10)")
+@ROUTER.command("unschedule", str.lower, usage="Использование: /unschedule <id>")
+async def unschedule_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE, job_id):
+    if SCHEDULER is None:
+        await reply(update, context, _SCHEDULE_OFF)
         return
-    try:
-        n = int(context.args[0])
-    except ValueError:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="n должно быть целым")
+    if SCHEDULER.cancel(update.effective_chat.id, job_id):
+        await reply(update, context, f"Задание {job_id} удалено.")
+    else:
+        await reply(update, context, f"Нет задания {job_id}. Список: /schedules")
+
+async def _fire_job(job, context):
+    # Задание выполняется как сообщение с его командой от автора задания:
+    # тот же разбор аргументов, те же ответы в чат.
+    from telegram import Chat, Message, Update, User
+    chat = Chat(id=job.chat_id, type=job.chat_type)
+    user = User(id=job.user_id, first_name="schedule", is_bot=False)
+    msg = Message(message_id=0, date=datetime.now(timezone.utc), chat=chat, text=job.cmd, from_user=user)
+    await ROUTER.dispatch(Update(update_id=0, message=msg), context)
+
+# ---- Сохранённые списки и настройки (store.py) ----
+
+_STORE_OFF = "Хранилище выключено: задайте STORE_PATH в .env"
+SETTINGS = {"dice": _roll_expr, "password": _pw_len}
+
+def _list_name(s: str) -> str:
+    name = s.lower().lstrip("@")
+    if not name or len(name) > 32 or not all(c.isalnum() or c in "-_" for c in name):
+        raise ArgError("Имя списка: до 32 букв, цифр, «-» или «_»")
+    return name
+
+@ROUTER.command("save", _list_name, rest=str.strip, usage="Использование: /save <имя> a|b|c")
+async def save(update: Update, context: ContextTypes.DEFAULT_TYPE, name, text):
+    if STORE is None:
+        await reply(update, context, _STORE_OFF)
         return
-    if not (1 <= n <= 10):
-        await context.bot.send_message(chat_id=update.effective_chat.id, text="n должно быть 1..10")
+    chat_id = update.effective_chat.id
+    if len(text) > MAX_LIST_TEXT:
+        raise ArgError(f"Список длиннее {MAX_LIST_TEXT} символов")
+    items, _ = parse_weighted(text)
+    if not items:
+        await reply(update, context, "Список пуст.")
         return
-    arr = list(range(1, n+1))
-    random.shuffle(arr)
-    await context.bot.send_message(chat_id=update.effective_chat.id, text=" ".join(map(str, arr)))
+    saved = await STORE.names(chat_id, LIST)
+    if name not in saved and len(saved) >= MAX_SAVED_LISTS:
+        await reply(update, context, f"Не больше {MAX_SAVED_LISTS} списков на чат, удалите лишние: /forget <имя>")
+        return
+    STORE.put(chat_id, LIST, name, text)
+    await reply(update, context, f"Список «{name}» сохранён ({len(items)} эл.). Используйте: /choose @{name}")
 
-def main():
+@ROUTER.command("lists")
+async def lists_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if STORE is None:
+        await reply(update, context, _STORE_OFF)
+        return
+    saved = await STORE.names(update.effective_chat.id, LIST)
+    if not saved:
+        await reply(update, context, "Сохранённых списков нет. Сохранить: /save <имя> a|b|c")
+        return
+    await reply(update, context, "\n".join(f"@{name} — {len(parse_list(text))} эл."
+                                           for name, text in sorted(saved.items())))
+
+@ROUTER.command("forget", _list_name, usage="Использование: /forget <имя>")
+async def forget(update: Update, context: ContextTypes.DEFAULT_TYPE, name):
+    if STORE is None:
+        await reply(update, context, _STORE_OFF)
+        return
+    chat_id = update.effective_chat.id
+    if await STORE.get(chat_id, LIST, name) is None:
+        await reply(update, context, f"Нет сохранённого списка «{name}»")
+        return
+    STORE.delete(chat_id, LIST, name)
+    await reply(update, context, f"Список «{name}» удалён")
+
+@ROUTER.command("set", opt=(str.lower, str), usage="Использование: /set dice 3d6 | /set password 20 (- — сбросить)")
+async def set_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE, key=None, value=None):
+    if STORE is None:
+        await reply(update, context, _STORE_OFF)
+        return
+    chat_id = update.effective_chat.id
+    if key is None:
+        current = await STORE.names(chat_id, SETTING)
+        text = "\n".join(f"{k} = {v}" for k, v in sorted(current.items()))
+        await reply(update, context, text or "Настроек нет. Пример: /set dice 3d6")
+        return
+    conv = SETTINGS.get(key)
+    if conv is None or value is None:
+        await reply(update, context, "Использование: /set dice 3d6 | /set password 20 (- — сбросить)")
+        return
+    if value == "-":
+        STORE.delete(chat_id, SETTING, key)
+        await reply(update, context, f"{key}: сброшено")
+        return
+    conv(value)
+    STORE.put(chat_id, SETTING, key, value.lower())
+    await reply(update, context, f"{key} = {value.lower()}")
+
+# Inline-режим: те же генераторы и конвертеры аргументов, значения — из пулов
+INLINE = InlineRouter()
+INLINE.help = ("Справка RandomLab", HELP_TEXT)
+
+def _roll_batch(program, count):
+    if program.plain:
+        n, m = program.expr.n, program.expr.m
+        flat = RNG.randints(1, m, n * count)
+        return [_roll_text(flat[i:i + n]) for i in range(0, len(flat), n)]
+    return [format_results(program, run(program, RNG)) for _ in range(count)]
+
+INLINE.add(("roll", "r"), _roll_batch, lambda program, text: (program.text, text),
+           rest=lambda s: compile_roll(s, ROLL_INLINE), usage="Пример: 2d6", default=True)
+INLINE.add(("pw", "password"), _ENTROPY.passwords, lambda length, pw: (f"Пароль ({length})", pw),
+           _pw_len, usage="Пример: pw 16")
+INLINE.add(("uuid",), lambda count: [str(uuid.uuid4()) for _ in range(count)], lambda v: ("UUID v4", v))
+INLINE.add(("coin",), lambda count: RNG.choices(["Орёл", "Решка"], count), lambda v: ("Орёл/решка", v))
+INLINE.add(("color",), lambda count: RNG.randints(0, 0xFFFFFF, count), lambda v: ("Цвет", f"#{v:06X}"))
+INLINE.add(("8ball", "eightball"), lambda count: RNG.choices(EIGHTBALL, count), lambda v: ("Магический шар", v))
+INLINE.add(("rand",), lambda a, b, count: RNG.randints(min(a, b), max(a, b), count),
+           lambda a, b, v: (f"Случайное из [{min(a, b)}, {max(a, b)}]", str(v)),
+           _ab, _ab, usage="Пример: rand 1 100")
+INLINE.add(("choose",), lambda items, count: RNG.choices(items, count), lambda items, v: ("Выбор", v),
+           rest=list_arg("Список пуст."), usage="Пример: choose a|b|c")
+
+def build_application(token: str, base_url=None, webhook=False, concurrent_updates=64, rng=None, outbox=None,
+                      metrics=None, metrics_port=None, request=None, store=None, renderer=None,
+                      guard=None, auditor=None, schedule=None):
+    from telegram.ext import Application, CallbackContext
+    global RNG, STORE, RENDERER, AUDIT, SCHEDULER
+    if rng is not None:
+        RNG = rng
+    STORE = store
+    RENDERER = renderer
+    AUDIT = auditor
+    SCHEDULER = schedule
+    builder = Application.builder().token(token)
+    if base_url:
+        builder = builder.base_url(base_url)
+    if outbox is not None:
+        builder = builder.rate_limiter(outbox)
+    if request is not None:
+        builder = builder.request(request)
+    if webhook:
+        # апдейты приходят через webhook.py, поэтому Updater (getUpdates) не нужен
+        builder = builder.updater(None).concurrent_updates(concurrent_updates)
+    startup, cleanup = [], []
+    if metrics is not None and metrics_port is not None:
+        server = MetricsServer(metrics, port=metrics_port)
+        startup.append(server.start)
+        cleanup.append(server.stop)
+    if store is not None:
+        startup.append(store.open)
+        cleanup.append(store.close)  # последний сброс несохранённых изменений
+    if renderer is not None:
+        startup.append(renderer.open)
+        cleanup.append(renderer.close)
+    if auditor is not None:
+        startup.append(auditor.open)
+        cleanup.append(auditor.close)
+    if schedule is not None:
+        startup.append(schedule.open)   # после store.open: задания загружаются из хранилища
+        cleanup.append(schedule.close)
+    if startup:
+        async def post_init(app):
+            for fn in startup:
+                await fn()
+
+        async def post_shutdown(app):
+            for fn in reversed(cleanup):
+                await fn()
+        builder = builder.post_init(post_init).post_shutdown(post_shutdown)
+    app = builder.build()
+    if schedule is not None:
+        schedule.fire = lambda job: _fire_job(job, CallbackContext(app))
+
+    ROUTER.metrics = metrics
+    if metrics is not None:
+        metrics.gauge("randomlab_update_queue_depth", app.update_queue.qsize)
+        if outbox is not None:
+            outbox.api_metrics = metrics
+            metrics.gauge("randomlab_outbox_queue_depth", lambda: outbox.stats["queued"])
+            metrics.counter("randomlab_outbox_coalesced_total", lambda: outbox.stats["coalesced"])
+            metrics.counter("randomlab_outbox_retry_after_total", lambda: outbox.stats["retry_after"])
+        if guard is not None:
+            metrics.counter("randomlab_guard_limited_total", lambda: guard.stats["limited"])
+            metrics.counter("randomlab_guard_deduped_total", lambda: guard.stats["deduped"])
+        if schedule is not None:
+            metrics.gauge("randomlab_schedule_pending", lambda: len(schedule))
+            metrics.counter("randomlab_schedule_fired_total", lambda: schedule.stats["fired"])
+    if guard is not None:
+        app.add_handler(guard.handler(), group=-1)  # раньше всех обработчиков
+    app.add_handler(ROUTER.handler())
+    app.add_handler(INLINE.handler())
+    return app
+
+def app_from_env(webhook=False, shards=1, concurrent_updates=None, shard_index=0):
+    # Собирает Application по настройкам из .env. При запуске нескольких
+    # процессов (shards) глобальный лимит исходящих делится между ними.
+    from outbox import OutboundDispatcher
+    from ratelimit import RequestGuard
+    load_env()
     token = os.getenv("TELEGRAM_BOT_TOKEN")
     if not token:
         raise ValueError("Нет TELEGRAM_BOT_TOKEN в .env")
-    app = Application.builder().token(token).build()
-
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("help", help_command))
-    app.add_handler(CommandHandler("roll", roll))
-    app.add_handler(CommandHandler("coin", coin))
-    app.add_handler(CommandHandler("rand", rand_int))
-    app.add_handler(CommandHandler("choose", choose))
-    app.add_handler(CommandHandler("shuffle", shuffle_cmd))
-    app.add_handler(CommandHandler("password", password))
-    app.add_handler(CommandHandler("uuid", uuid_cmd))
-    app.add_handler(CommandHandler("color", color))
-    app.add_handler(CommandHandler("eightball", eightball))
-    app.add_handler(CommandHandler("lorem", lorem))
-    app.add_handler(CommandHandler("sample", sample))
-    app.add_handler(CommandHandler("permute", permute))
-
-    app.run_polling()
+    seed = os.getenv("RANDOMLAB_SEED")
+    seed = int(seed) if seed else None
+    outbox = None
+    if os.getenv("OUTBOX_ENABLED", "1") == "1":
+        outbox = OutboundDispatcher(global_rate=float(os.getenv("OUTBOX_GLOBAL_RATE", "30")) / shards,
+                                    chat_rate=float(os.getenv("OUTBOX_CHAT_RATE", "1")),
+                                    max_queue=int(os.getenv("OUTBOX_MAX_QUEUE", "1000")))
+    metrics = metrics_port = None
+    if os.getenv("METRICS_ENABLED", "0") == "1":
+        metrics = Metrics()
+        port = os.getenv("METRICS_PORT")
+        # у каждого воркера многопроцессного режима свой порт: METRICS_PORT + номер
+        metrics_port = int(port) + shard_index if port else None
+    store = None
+    if os.getenv("STORE_PATH"):
+        # в многопроцессном режиме воркеры делят один файл: WAL допускает
+        # параллельное чтение, а чаты у воркеров не пересекаются
+        store = ChatStore(os.getenv("STORE_PATH"), flush_interval=float(os.getenv("STORE_FLUSH_INTERVAL", "1")))
+    guard = None
+    if os.getenv("RATE_LIMIT_ENABLED", "1") == "1":
+        guard = RequestGuard(user_limit=int(os.getenv("RATE_USER_LIMIT", "10")),
+                             chat_limit=int(os.getenv("RATE_CHAT_LIMIT", "30")),
+                             window=float(os.getenv("RATE_WINDOW", "10")),
+                             dedup_window=float(os.getenv("RATE_DEDUP_WINDOW", "2")),
+                             inline_limit=int(os.getenv("RATE_INLINE_LIMIT", "60")))
+    renderer = None
+    if os.getenv("RENDER_ENABLED", "1") == "1":
+        renderer = render.Renderer(workers=int(os.getenv("RENDER_WORKERS", "1")))
+    auditor = None
+    if os.getenv("AUDIT_LOG"):
+        # у каждого воркера свой журнал (чат всегда попадает к одному воркеру),
+        # иначе цепочки хэшей перемешались бы в одном файле
+        path = os.getenv("AUDIT_LOG")
+        auditor = audit.Auditor(f"{path}.{shard_index}" if shards > 1 else path)
+    schedule = None
+    if os.getenv("SCHEDULE_ENABLED", "1") == "1":
+        # воркер загружает из общего хранилища только задания своих чатов
+        owns = (lambda chat_id: chat_id % shards == shard_index) if shards > 1 else None
+        schedule = scheduler.Scheduler(store=store, owns=owns, batch=int(os.getenv("SCHEDULE_BATCH", "500")))
+    return build_application(token,
+                             base_url=os.getenv("TELEGRAM_BASE_URL") or None,
+                             webhook=webhook,
+                             concurrent_updates=concurrent_updates or int(os.getenv("CONCURRENT_UPDATES", "64")),
+                             rng=make_engine(seed, os.getenv("RANDOMLAB_RNG") or None),
+                             outbox=outbox,
+                             metrics=metrics,
+                             metrics_port=metrics_port,
+                             store=store,
+                             renderer=renderer,
+                             guard=guard,
+                             auditor=auditor,
+                             schedule=schedule)
+
+def load_env():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+def main():
+    load_env()
+    mode = os.getenv("RANDOMLAB_MODE", "polling")
+    webhook_kwargs = dict(listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+                          port=int(os.getenv("WEBHOOK_PORT", "8443")),
+                          url_path=os.getenv("WEBHOOK_PATH", "telegram"),
+                          secret_token=os.getenv("WEBHOOK_SECRET") or None,
+                          webhook_url=os.getenv("WEBHOOK_URL") or None,
+                          drain_timeout=float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "10")))
+    if mode == "sharded":
+        import shard
+        shard.run(workers=int(os.getenv("SHARD_WORKERS", "0")) or os.cpu_count(), **webhook_kwargs)
+        return
+    app = app_from_env(webhook=mode == "webhook")
+    if mode == "webhook":
+        import webhook
+        webhook.run(app, **webhook_kwargs)
+    else:
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
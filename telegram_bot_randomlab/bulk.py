@@ -0,0 +1,77 @@
+import binascii
+import os
+from telegram import InputFile
+from router import ArgError, reply
+
+MAX_COUNT = 100_000      # значений в одном запросе
+MAX_BYTES = 4 << 20      # готовый файл целиком в памяти — не больше стольких байт
+INLINE_MAX = 20          # до стольких значений (и без формата) — обычным сообщением
+FORMATS = ("csv", "txt")
+
+_VERSION = bytes((b & 0x0F) | 0x40 for b in range(256))   # байт 6 UUID: версия 4
+_VARIANT = bytes((b & 0x3F) | 0x80 for b in range(256))   # байт 8 UUID: вариант RFC 4122
+UUID_GROUPS = (8, 4, 4, 4, 12)
+
+
+def row_size(groups, prefix=b"") -> int:
+    return len(prefix) + sum(groups) + len(groups)   # разделители и перевод строки
+
+
+def check(count: int, size: int):
+    # Ограничение на запрос: размер файла известен заранее, до чтения энтропии.
+    if count * size > MAX_BYTES:
+        raise ArgError(f"Слишком большой файл: не больше {MAX_BYTES >> 20} МиБ "
+                       f"(до {MAX_BYTES // size} значений такой длины)")
+
+
+def rows(blob: bytes, groups, count: int, header=b"", prefix=b"", sep=b"-") -> bytearray:
+    # blob — count записей по sum(groups) символов подряд. Результат —
+    # строки «prefix группа-группа…\n» в заранее выделенном буфере: каждый
+    # столбец символов копируется одним срезом с шагом, без цикла по записям.
+    width = sum(groups)
+    size = row_size(groups, prefix)
+    out = bytearray(len(header) + size * count)
+    out[:len(header)] = header
+    pos = len(header)
+    for ch in prefix:
+        out[pos::size] = bytes([ch]) * count
+        pos += 1
+    col = 0
+    for i, group in enumerate(groups):
+        for _ in range(group):
+            out[pos::size] = blob[col::width]
+            col += 1
+            pos += 1
+        out[pos::size] = (sep if i < len(groups) - 1 else b"\n") * count
+        pos += 1
+    return out
+
+
+def uuids(count: int, header=b"", urandom=os.urandom) -> bytearray:
+    # UUID v4 из одного чтения os.urandom: биты версии и варианта
+    # проставляются таблицей сразу во всех записях.
+    check(count, row_size(UUID_GROUPS))
+    raw = bytearray(urandom(16 * count))
+    raw[6::16] = raw[6::16].translate(_VERSION)
+    raw[8::16] = raw[8::16].translate(_VARIANT)
+    return rows(binascii.hexlify(raw), UUID_GROUPS, count, header)
+
+
+def passwords(pool, length: int, count: int, header=b"") -> bytearray:
+    # Все пароли — один отрезок EntropyPool.ascii, разрезанный на строки.
+    check(count, row_size((length,)))
+    return rows(pool.ascii(length * count), (length,), count, header)
+
+
+def colors(count: int, header=b"", urandom=os.urandom) -> bytearray:
+    check(count, row_size((6,), b"#"))
+    return rows(binascii.hexlify(urandom(3 * count)).upper(), (6,), count, header, prefix=b"#")
+
+
+async def send(update, context, data: bytearray, count: int, fmt, filename: str):
+    # Немного значений без формата — сообщением, иначе — файлом из памяти.
+    if fmt is None and count <= INLINE_MAX:
+        await reply(update, context, data.decode("ascii").rstrip("\n"))
+        return
+    await context.bot.send_document(chat_id=update.effective_chat.id,
+                                    document=InputFile(bytes(data), filename=f"{filename}.{fmt or 'txt'}"))
@@ -0,0 +1,299 @@
+import heapq
+import re
+from functools import lru_cache
+from typing import NamedTuple
+from router import ArgError
+
+MAX_SIDES = 1000
+MAX_NUMBER = 10 ** 9
+MAX_REPEAT = 100
+EXPLODE_DEPTH = 100     # сколько раз подряд может «взорваться» одна пачка
+SHOW_DICE = 100         # больше кубиков — в ответе только суммы
+MAX_DEPTH = 32          # вложенность скобок и унарных минусов
+MAX_OPS = 100           # операций + - * / в выражении (глубина дерева при вычислении)
+EXAMPLE = "Пример: 3d6, 4d6kh3+2, 2d20adv, 3d6!, d%, 6x 4d6kh3"
+
+_TOKEN = re.compile(r"\s*(?:(\d+)|(kh|kl|dh|dl|adv|dis)|(d%|d)|([-+*/()!x]))")
+
+
+class Num(NamedTuple):
+    value: int
+
+
+class Dice(NamedTuple):
+    n: int
+    m: int
+    keep: str = None      # kh | kl | dh | dl
+    count: int = 0        # сколько оставить/отбросить
+    explode: bool = False
+
+    @property
+    def plain(self) -> bool:
+        return self.keep is None and not self.explode
+
+
+class Neg(NamedTuple):
+    x: tuple
+
+
+class BinOp(NamedTuple):
+    op: str
+    left: tuple
+    right: tuple
+
+
+class Group(NamedTuple):
+    x: tuple
+
+
+class Program(NamedTuple):
+    # Скомпилированное выражение: repeat раз вычислить expr; dice — число кубиков за один раз.
+    repeat: int
+    expr: tuple
+    dice: int
+    text: str
+
+    @property
+    def plain(self):
+        # «Голый» NdM без модификаторов — для него есть быстрые пути в /roll
+        e = self.expr
+        return self.repeat == 1 and isinstance(e, Dice) and e.plain
+
+
+def _error(reason: str):
+    return ArgError(f"Неверный формат: {reason}. {EXAMPLE}")
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    pos = 0
+    text = text.lower()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None or m.end() == pos:
+            if text[pos:].strip() == "":
+                break
+            raise _error(f"непонятный символ «{text[pos:].strip()[0]}»")
+        num, mod, die, op = m.groups()
+        if num is not None:
+            tokens.append(("num", int(num)))
+        else:
+            tokens.append((mod or die or op, None))
+        pos = m.end()
+    return tokens
+
+
+class _Parser:
+    # roll := [N 'x'] expr;  expr := term (('+'|'-') term)*;  term := unary (('*'|'/') unary)*
+    # unary := '-' unary | atom;  atom := N | dice | '(' expr ')';  dice := [N] 'd' (M | '%') mod*
+    def __init__(self, tokens, max_dice):
+        self.tokens = tokens
+        self.pos = 0
+        self.max_dice = max_dice
+        self.dice = 0
+        self.depth = 0
+        self.ops = 0
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i][0] if i < len(self.tokens) else None
+
+    def take(self):
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def number(self) -> int:
+        if self.peek() != "num":
+            raise _error("ожидалось число")
+        v = self.take()[1]
+        if v > MAX_NUMBER:
+            raise _error(f"число больше {MAX_NUMBER}")
+        return v
+
+    def nest(self):
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise _error(f"вложенность больше {MAX_DEPTH}")
+
+    def op(self):
+        self.ops += 1
+        if self.ops > MAX_OPS:
+            raise _error(f"больше {MAX_OPS} операций")
+        return self.take()[0]
+
+    def program(self, text):
+        repeat = 1
+        if self.peek() == "num" and self.peek(1) == "x":
+            repeat = self.number()
+            self.take()
+            if not 1 <= repeat <= MAX_REPEAT:
+                raise _error(f"повторов должно быть 1..{MAX_REPEAT}")
+        expr = self.expr()
+        if self.pos != len(self.tokens):
+            raise _error("лишние символы в конце")
+        if self.dice * repeat > self.max_dice:
+            raise _error(f"больше {self.max_dice} кубиков")
+        return Program(repeat, expr, self.dice, text)
+
+    def expr(self):
+        node = self.term()
+        while self.peek() in ("+", "-"):
+            op = self.op()
+            node = BinOp(op, node, self.term())
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.peek() in ("*", "/"):
+            op = self.op()
+            node = BinOp(op, node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek() == "-":
+            self.take()
+            self.nest()
+            node = Neg(self.unary())
+            self.depth -= 1
+            return node
+        return self.atom()
+
+    def atom(self):
+        tok = self.peek()
+        if tok == "(":
+            self.take()
+            self.nest()
+            node = self.expr()
+            if self.peek() != ")":
+                raise _error("нет закрывающей скобки")
+            self.take()
+            self.depth -= 1
+            return Group(node)
+        if tok in ("d", "d%"):
+            return self.dice_term(1)
+        if tok == "num":
+            v = self.number()
+            if self.peek() in ("d", "d%"):
+                return self.dice_term(v)
+            return Num(v)
+        raise _error("ожидалось число, кубик или скобка")
+
+    def dice_term(self, n):
+        if self.take()[0] == "d%":
+            m = 100
+        else:
+            m = self.number()
+        if n < 1:
+            raise _error("кубиков должно быть хотя бы 1")
+        if not 2 <= m <= MAX_SIDES:
+            raise _error(f"граней должно быть 2..{MAX_SIDES}")
+        keep, count, explode = None, 0, False
+        while self.peek() in ("kh", "kl", "dh", "dl", "adv", "dis", "!"):
+            mod = self.take()[0]
+            if mod == "!":
+                explode = True
+            elif mod in ("adv", "dis"):
+                # преимущество/помеха: лучший (худший) из двух, для NdM — из N
+                n = max(n, 2)
+                keep, count = ("kh" if mod == "adv" else "kl"), 1
+            else:
+                keep = mod
+                count = self.number() if self.peek() == "num" else 1
+        if keep in ("kh", "kl") and count < 1:
+            raise _error("оставить можно хотя бы 1 кубик")
+        self.dice += n
+        return Dice(n, m, keep, min(count, n), explode)
+
+
+@lru_cache(maxsize=2048)
+def _compile(text: str, max_dice: int) -> Program:
+    tokens = tokenize(text)
+    if not tokens:
+        raise _error("пустое выражение")
+    return _Parser(tokens, max_dice).program(text)
+
+
+def compile_roll(text: str, max_dice: int = 100_000) -> Program:
+    # Разбор выражения кэшируется по нормализованному тексту.
+    return _compile(" ".join(text.lower().split()), max_dice)
+
+
+def _roll_dice(node: Dice, rng, detail: bool):
+    # Все кубики узла берутся одним вызовом randints (для больших пачек это
+    # один векторный вызов numpy), «взрывы» — ещё по одному вызову на волну.
+    if node.plain and not detail:
+        return rng.sum_randints(1, node.m, node.n), None
+    rolls = rng.randints(1, node.m, node.n)
+    if node.explode:
+        fresh = rolls
+        for _ in range(EXPLODE_DEPTH):
+            extra = fresh.count(node.m)
+            if not extra:
+                break
+            fresh = rng.randints(1, node.m, extra)
+            rolls += fresh
+    if node.keep is None:
+        return sum(rolls), (rolls, [])
+    size = len(rolls)
+    k = node.count
+    if node.keep in ("dh", "dl"):
+        k = max(0, size - k)
+    largest = node.keep in ("kh", "dl")
+    pick = heapq.nlargest if largest else heapq.nsmallest
+    kept = pick(k, rolls)
+    if not detail:
+        return sum(kept), None
+    dropped = sorted(rolls, reverse=largest)[k:]
+    return sum(kept), (kept, dropped)
+
+
+def evaluate(node, rng, detail=True):
+    # Возвращает (значение, текст с бросками или None).
+    kind = type(node)
+    if kind is Num:
+        return node.value, str(node.value) if detail else None
+    if kind is Dice:
+        value, rolls = _roll_dice(node, rng, detail)
+        if not detail:
+            return value, None
+        kept, dropped = rolls
+        shown = ", ".join(map(str, kept))
+        if dropped:
+            shown += " | " + ", ".join(map(str, dropped))
+        suffix = (node.keep + str(node.count) if node.keep else "") + ("!" if node.explode else "")
+        return value, f"{node.n}d{node.m}{suffix}[{shown}]"
+    if kind is Neg:
+        v, t = evaluate(node.x, rng, detail)
+        return -v, (f"-{t}" if detail else None)
+    if kind is Group:
+        v, t = evaluate(node.x, rng, detail)
+        return v, (f"({t})" if detail else None)
+    lv, lt = evaluate(node.left, rng, detail)
+    rv, rt = evaluate(node.right, rng, detail)
+    op = node.op
+    if op == "+":
+        v = lv + rv
+    elif op == "-":
+        v = lv - rv
+    elif op == "*":
+        v = lv * rv
+    else:
+        if rv == 0:
+            raise ArgError("Деление на ноль")
+        v = lv // rv
+    return v, (f"{lt} {op} {rt}" if detail else None)
+
+
+def run(program: Program, rng, detail=None) -> list:
+    # [(значение, текст), ...] для каждого повтора; подробности — если кубиков немного.
+    if detail is None:
+        detail = program.dice <= SHOW_DICE
+    return [evaluate(program.expr, rng, detail) for _ in range(program.repeat)]
+
+
+def format_results(program: Program, results) -> str:
+    lines = []
+    for value, text in results:
+        lines.append(f"{text} = {value}" if text is not None else f"{program.text} = {value}")
+    return "\n".join(lines)
@@ -0,0 +1,92 @@
+import os
+import queue
+import string
+import threading
+
+PASSWORD_ALPHABET = string.ascii_letters + string.digits
+
+_tables = {}
+
+
+def _table(alphabet: str):
+    # Таблица для bytes.translate: байт b < limit превращается в символ
+    # alphabet[b % len], байты >= limit удаляются (rejection sampling без смещения).
+    t = _tables.get(alphabet)
+    if t is None:
+        if not 2 <= len(alphabet) <= 256 or not alphabet.isascii():
+            raise ValueError("алфавит должен состоять из 2..256 ASCII-символов")
+        limit = 256 - 256 % len(alphabet)
+        enc = alphabet.encode("ascii")
+        mapping = bytes(enc[b % len(enc)] if b < limit else 0 for b in range(256))
+        t = _tables[alphabet] = (mapping, bytes(range(limit, 256)), limit / 256)
+    return t
+
+
+class EntropyPool:
+    # Буфер криптостойких случайных байтов: читает os.urandom крупными блоками,
+    # выдаёт каждый байт ровно один раз. Фоновый поток заранее готовит
+    # следующие блоки, чтобы горячий путь не ждал системного вызова.
+    def __init__(self, block_size=64 * 1024, prefetch=2, urandom=os.urandom):
+        self.block_size = block_size
+        self._urandom = urandom
+        self._lock = threading.Lock()
+        self._buf = b""
+        self._pos = 0
+        self._ready = queue.Queue(maxsize=prefetch) if prefetch else None
+        self._refiller = None
+        self.blocks_read = 0
+
+    def _refill_loop(self):
+        while True:
+            self._ready.put(self._urandom(self.block_size))
+
+    def _next_block(self) -> bytes:
+        if self._ready is not None:
+            if self._refiller is None:
+                self._refiller = threading.Thread(target=self._refill_loop, name="entropy-refill", daemon=True)
+                self._refiller.start()
+            try:
+                block = self._ready.get_nowait()
+            except queue.Empty:
+                block = self._urandom(self.block_size)
+        else:
+            block = self._urandom(self.block_size)
+        self.blocks_read += 1
+        return block
+
+    def take(self, n: int) -> bytes:
+        parts = []
+        with self._lock:
+            while n > 0:
+                if self._pos >= len(self._buf):
+                    self._buf, self._pos = self._next_block(), 0
+                chunk = self._buf[self._pos:self._pos + n]
+                self._pos += len(chunk)
+                n -= len(chunk)
+                parts.append(chunk)
+        return parts[0] if len(parts) == 1 else b"".join(parts)
+
+    def ascii(self, length: int, alphabet: str = PASSWORD_ALPHABET) -> bytes:
+        mapping, delete, accept = _table(alphabet)
+        parts = []
+        have = 0
+        while have < length:
+            raw = self.take(int((length - have) / accept) + 8)
+            part = raw.translate(mapping, delete)
+            parts.append(part)
+            have += len(part)
+        out = parts[0] if len(parts) == 1 else b"".join(parts)
+        return out[:length]
+
+    def string(self, length: int, alphabet: str = PASSWORD_ALPHABET) -> str:
+        return self.ascii(length, alphabet).decode("ascii")
+
+    def strings(self, length: int, count: int, alphabet: str = PASSWORD_ALPHABET) -> list:
+        blob = self.string(length * count, alphabet)
+        return [blob[i:i + length] for i in range(0, length * count, length)]
+
+    def password(self, length: int) -> str:
+        return self.string(length)
+
+    def passwords(self, length: int, count: int) -> list:
+        return self.strings(length, count)
@@ -0,0 +1,177 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import deque
+from aiohttp import ClientSession, web
+from telegram.request import BaseRequest
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "RandomLab", "username": "randomlab_bot"}
+
+
+class FakeTelegram:
+    # Минимальный локальный Bot API: отвечает на getMe/setWebhook/sendMessage
+    # и запоминает отправленные сообщения. Нужен для тестов и бенчмарков без сети.
+    # Если заданы global_rate/chat_rate, sendMessage сверх лимита за последнюю
+    # секунду получает 429 с retry_after, как настоящий Telegram.
+    def __init__(self, host="127.0.0.1", port=0, global_rate=None, chat_rate=None, retry_after=1):
+        self.host = host
+        self.port = port
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.retry_after = retry_after
+        self.too_many = 0
+        self._window = deque()
+        self._chat_windows = {}
+        self.sent = []
+        self.calls = {}
+        self._message_ids = itertools.count(1)
+        self._waiters = []
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def _params(self, request):
+        if request.content_type == "application/json":
+            return await request.json()
+        return dict(await request.post()) if request.can_read_body else dict(request.query)
+
+    def _ok(self, result):
+        return web.json_response({"ok": True, "result": result})
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params = await self._params(request)
+        if method == "getMe":
+            return self._ok(BOT_USER)
+        if method == "sendMessage":
+            if self._limited(int(params["chat_id"])):
+                self.too_many += 1
+                return web.json_response({"ok": False, "error_code": 429,
+                                          "description": f"Too Many Requests: retry after {self.retry_after}",
+                                          "parameters": {"retry_after": self.retry_after}}, status=429)
+            return self._ok(self.record_message(params))
+        return self._ok(True)
+
+    def _limited(self, chat_id) -> bool:
+        now = time.monotonic()
+        checks = []
+        if self.global_rate:
+            checks.append((self._window, self.global_rate))
+        if self.chat_rate:
+            checks.append((self._chat_windows.setdefault(chat_id, deque()), self.chat_rate))
+        for window, limit in checks:
+            while window and now - window[0] >= 1.0:
+                window.popleft()
+            if len(window) >= limit:
+                return True
+        for window, _ in checks:
+            window.append(now)
+        return False
+
+    def record_message(self, params):
+        chat_id = int(params["chat_id"])
+        msg = {"message_id": next(self._message_ids), "date": int(time.time()),
+               "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+        self.sent.append(msg)
+        for n, fut in list(self._waiters):
+            if len(self.sent) >= n and not fut.done():
+                fut.set_result(None)
+        return msg
+
+    async def wait_for_messages(self, n, timeout=30.0):
+        if len(self.sent) >= n:
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append((n, fut))
+        try:
+            await asyncio.wait_for(fut, timeout)
+        finally:
+            self._waiters.remove((n, fut))
+
+    async def start(self):
+        web_app = web.Application()
+        web_app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(web_app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class StubRequest(BaseRequest):
+    # Подмена HTTP-клиента бота: отвечает на запросы Bot API прямо в процессе,
+    # без сокетов. Подключается через Application.builder().request(...).
+    def __init__(self):
+        self.calls = {}
+        self.sent = 0
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        params = request_data.parameters if request_data else {}
+        if endpoint == "getMe":
+            result = BOT_USER
+        elif endpoint == "sendMessage":
+            self.sent += 1
+            result = {"message_id": next(self._message_ids), "date": int(time.time()),
+                      "chat": {"id": int(params["chat_id"]), "type": "private"}, "text": params.get("text", "")}
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    # JSON апдейта в том виде, в каком его присылает Telegram.
+    entities = []
+    if text.startswith("/"):
+        entities = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "U"},
+            "text": text,
+            "entities": entities,
+        },
+    }
+
+
+async def post_updates(url, updates, concurrency=32, secret_token=None):
+    # Отправляет апдейты на webhook параллельно; возвращает статусы ответов.
+    headers = {"Content-Type": "application/json"}
+    if secret_token:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret_token
+    statuses = []
+    it = iter(updates)
+
+    async def worker(session):
+        for upd in it:
+            async with session.post(url, data=json.dumps(upd), headers=headers) as resp:
+                statuses.append(resp.status)
+
+    async with ClientSession() as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return statuses
@@ -0,0 +1,135 @@
+import itertools
+from collections import OrderedDict, deque
+from telegram import InlineQueryResultArticle, InputTextMessageContent
+from router import ArgError, compile_schema
+
+POOL_SIZE = 32        # столько значений генерируется за раз для одного запроса
+MAX_POOLS = 256       # пулы для редких запросов вытесняются (LRU)
+CACHE_SIZE = 1024     # готовые ответы на детерминированные запросы
+CACHE_TIME = 300      # сколько секунд Telegram может кэшировать такие ответы
+
+
+class CandidatePool:
+    # Заранее сгенерированные значения для одного запроса (например, 2d6):
+    # генерируются пачкой через fill(count), раздаются по одному.
+    def __init__(self, fill, size=POOL_SIZE):
+        self.fill = fill
+        self.size = size
+        self.items = deque()
+
+    def take(self):
+        if not self.items:
+            self.items.extend(self.fill(self.size))
+        return self.items.popleft()
+
+
+class _Kind:
+    __slots__ = ("name", "parse", "batch", "render")
+
+    def __init__(self, name, parse, batch, render):
+        self.name = name
+        self.parse = parse
+        self.batch = batch
+        self.render = render
+
+
+class InlineRouter:
+    # Inline-режим (@bot 2d6, @bot pw 16, @bot uuid). Запрос разбирается теми же
+    # конвертерами, что и команды. Случайные результаты берутся из пулов
+    # кандидатов, поэтому набор запроса по буквам не генерирует значение
+    # заново на каждое нажатие; детерминированные ответы (справка, подсказки
+    # об ошибках) кэшируются и на сервере, и в Telegram через cache_time.
+    def __init__(self, pool_size=POOL_SIZE, max_pools=MAX_POOLS, cache_size=CACHE_SIZE, cache_time=CACHE_TIME):
+        self.pool_size = pool_size
+        self.max_pools = max_pools
+        self.cache_size = cache_size
+        self.cache_time = cache_time
+        self.kinds = {}
+        self.default = None
+        self.help = None
+        self._pools = OrderedDict()
+        self._cache = OrderedDict()
+        self._ids = itertools.count(1)
+        self.stats = {"queries": 0, "cache_hits": 0, "pool_hits": 0, "refills": 0}
+
+    def add(self, names, batch, render, *args, rest=None, usage=None, default=False):
+        # batch(*values, count) → список из count значений; render(*values, value) → (заголовок, текст).
+        parse = compile_schema(args, rest, usage or f"Пример: {names[0]}")
+        kind = _Kind(names[0], parse, batch, render)
+        for name in names:
+            self.kinds[name] = kind
+        if default:
+            self.default = kind
+        return kind
+
+    def _article(self, title, text, description=None):
+        return InlineQueryResultArticle(id=str(next(self._ids)), title=title, description=description,
+                                        input_message_content=InputTextMessageContent(text))
+
+    def _store(self, query, results):
+        self._cache[query] = results
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _pool(self, kind, values):
+        key = (kind.name,) + tuple(tuple(v) if isinstance(v, list) else v for v in values)
+        pool = self._pools.get(key)
+        if pool is not None:
+            self._pools.move_to_end(key)
+            self.stats["pool_hits"] += 1
+            return pool
+
+        def fill(count):
+            self.stats["refills"] += 1
+            return kind.batch(*values, count)
+        pool = self._pools[key] = CandidatePool(fill, self.pool_size)
+        if len(self._pools) > self.max_pools:
+            self._pools.popitem(last=False)
+        return pool
+
+    def _help(self):
+        title, text = self.help if self.help else ("RandomLab", "Набери /help")
+        return [self._article(title, text)]
+
+    def resolve(self, query: str):
+        # Возвращает (results, cacheable): cacheable — ответ не зависит от случая.
+        parts = query.split()
+        kind = self.kinds.get(parts[0].lower()) if parts else None
+        args = parts[1:]
+        if kind is None:
+            kind, args = self.default, parts
+            if kind is None or not parts:
+                return self._help(), True
+        try:
+            values = kind.parse(args)
+        except ArgError as e:
+            if kind is self.default and parts[0].lower() not in self.kinds:
+                return self._help(), True
+            return [self._article(str(e), str(e))], True
+        title, text = kind.render(*values, self._pool(kind, values).take())
+        return [self._article(title, text, description=text)], False
+
+    async def answer(self, update, context):
+        q = update.inline_query
+        query = " ".join(q.query.split())
+        self.stats["queries"] += 1
+        results = self._cache.get(query)
+        if results is not None:
+            self._cache.move_to_end(query)
+            self.stats["cache_hits"] += 1
+            cacheable = True
+        else:
+            results, cacheable = self.resolve(query)
+            if cacheable:
+                self._store(query, results)
+        if cacheable:
+            await context.bot.answer_inline_query(inline_query_id=q.id, results=results,
+                                                  cache_time=self.cache_time)
+        else:
+            # случайный результат нельзя кэшировать ни в Telegram, ни между пользователями
+            await context.bot.answer_inline_query(inline_query_id=q.id, results=results,
+                                                  cache_time=0, is_personal=True)
+
+    def handler(self):
+        from telegram.ext import InlineQueryHandler
+        return InlineQueryHandler(self.answer)
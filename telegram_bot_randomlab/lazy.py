@@ -0,0 +1,37 @@
+import importlib.util
+import re
+import subprocess
+import sys
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def lazy_import(name: str):
+    # Модуль, который выполняется при первом обращении к его атрибуту
+    # (importlib.util.LazyLoader). Уже загруженный модуль возвращается как есть,
+    # отсутствующий — None (для необязательных зависимостей вроде numpy).
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return None
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def importtime(module: str, python=sys.executable) -> list:
+    # Разбор `python -X importtime -c "import module"`:
+    # [(имя, собственное время мкс, с вложенными мкс, глубина), ...] в порядке вывода.
+    proc = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
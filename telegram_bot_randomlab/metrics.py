@@ -0,0 +1,170 @@
+import time
+from array import array
+from contextvars import ContextVar
+
+SUB_BITS = 5                       # 32 подкорзины на каждую степень двойки → погрешность ~3%
+SUB_COUNT = 1 << SUB_BITS
+HALF = SUB_COUNT >> 1
+MAX_EXP = 40                       # до 2^40 мкс ≈ 12 суток
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+PHASES = ("parse", "generate", "send")
+
+# Замеры текущей команды; None — метрики выключены и код замеров не выполняется.
+current = ContextVar("randomlab_timing", default=None)
+
+
+def _index(v: int) -> int:
+    if v < SUB_COUNT:
+        return v
+    e = v.bit_length() - SUB_BITS
+    return SUB_COUNT + (e - 1) * HALF + (v >> e) - HALF
+
+
+def _lower_bound(i: int) -> int:
+    if i < SUB_COUNT:
+        return i
+    e, sub = divmod(i - SUB_COUNT, HALF)
+    return (sub + HALF) << (e + 1)
+
+
+class Histogram:
+    # Гистограмма в стиле HDR: логарифмические корзины с линейным делением
+    # внутри, фиксированный размер, запись — O(1) без выделения памяти.
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * (SUB_COUNT + MAX_EXP * HALF)))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, micros: int):
+        i = _index(micros)
+        if i >= len(self.counts):
+            i = len(self.counts) - 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += micros
+        if micros > self.max:
+            self.max = micros
+
+    def percentile(self, q: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(_lower_bound(i + 1) - 1, self.max)
+        return self.max
+
+
+class Timing:
+    __slots__ = ("parse", "send", "error")
+
+    def __init__(self):
+        self.parse = 0
+        self.send = 0
+        self.error = False
+
+
+class Metrics:
+    # Реестр метрик бота: гистограммы задержек по командам и фазам
+    # (разбор аргументов, генерация, отправка), счётчики команд и ошибок
+    # валидации, глубина очередей. Экспорт — в текстовом формате Prometheus.
+    def __init__(self):
+        self.histograms = {}
+        self.commands = {}
+        self.validation_errors = {}
+        self.api = {}
+        self.gauges = {}
+        self.counters = {}
+
+    def _hist(self, key) -> Histogram:
+        h = self.histograms.get(key)
+        if h is None:
+            h = self.histograms[key] = Histogram()
+        return h
+
+    async def observe(self, name: str, handler, update, context):
+        t = Timing()
+        token = current.set(t)
+        start = time.perf_counter_ns()
+        try:
+            await handler(update, context)
+        finally:
+            total = (time.perf_counter_ns() - start) // 1000
+            current.reset(token)
+            self.commands[name] = self.commands.get(name, 0) + 1
+            if t.error:
+                self.validation_errors[name] = self.validation_errors.get(name, 0) + 1
+            self._hist((name, "parse")).record(t.parse)
+            self._hist((name, "generate")).record(max(0, total - t.parse - t.send))
+            self._hist((name, "send")).record(t.send)
+            self._hist((name, "total")).record(total)
+
+    def observe_api(self, endpoint: str, seconds: float):
+        h = self.api.get(endpoint)
+        if h is None:
+            h = self.api[endpoint] = Histogram()
+        h.record(int(seconds * 1e6))
+
+    def gauge(self, name: str, fn):
+        self.gauges[name] = fn
+
+    def counter(self, name: str, fn):
+        # fn возвращает накопленное значение (например, счётчик из stats очереди)
+        self.counters[name] = fn
+
+    def render(self) -> str:
+        out = ["# TYPE randomlab_command_latency_seconds summary"]
+        for (cmd, phase), h in sorted(self.histograms.items()):
+            labels = f'command="{cmd}",phase="{phase}"'
+            out += _summary("randomlab_command_latency_seconds", labels, h)
+        out.append("# TYPE randomlab_api_latency_seconds summary")
+        for endpoint, h in sorted(self.api.items()):
+            out += _summary("randomlab_api_latency_seconds", f'endpoint="{endpoint}"', h)
+        out.append("# TYPE randomlab_commands_total counter")
+        out += [f'randomlab_commands_total{{command="{k}"}} {v}' for k, v in sorted(self.commands.items())]
+        out.append("# TYPE randomlab_validation_errors_total counter")
+        out += [f'randomlab_validation_errors_total{{command="{k}"}} {v}'
+                for k, v in sorted(self.validation_errors.items())]
+        for kind, fns in (("gauge", self.gauges), ("counter", self.counters)):
+            for name, fn in sorted(fns.items()):
+                out.append(f"# TYPE {name} {kind}")
+                out.append(f"{name} {fn()}")
+        return "\n".join(out) + "\n"
+
+
+def _summary(name: str, labels: str, h: Histogram) -> list:
+    lines = [f'{name}{{{labels},quantile="{q}"}} {h.percentile(q) / 1e6:.6f}' for q in QUANTILES]
+    lines.append(f"{name}_sum{{{labels}}} {h.total / 1e6:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {h.count}")
+    return lines
+
+
+class MetricsServer:
+    # Необязательный HTTP-эндпоинт /metrics (aiohttp импортируется только здесь).
+    def __init__(self, metrics: Metrics, host="0.0.0.0", port=9100):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.metrics.render(), content_type="text/plain", charset="utf-8")
+
+        web_app = web.Application()
+        web_app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(web_app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,389 @@
+import asyncio
+import math
+import re
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from itertools import accumulate
+from dice import BinOp, Dice, Group, Neg, Num, compile_roll
+from lazy import lazy_import
+from router import ArgError
+
+np = lazy_import("numpy")  # без numpy свёртка считается напрямую, с меньшими лимитами
+
+MAX_DICE = 1000               # кубиков в выражении /odds
+MAX_SUPPORT = 2_000_001       # возможных значений у распределения
+MAX_SUPPORT_PURE = 20_001     # то же без numpy (прямая свёртка O(n²))
+MAX_KEEP_DICE = 200           # kh/kl/dh/dl: кубиков в пачке
+KEEP_BUDGET = 1e9             # kh/kl/dh/dl: оценка работы _keep_highest на выражение (≈ нс, около секунды)
+KEEP_CELL_PURE = 50           # во сколько раз дороже сложение строк без numpy
+EXPLODE_EPS = 1e-15           # «взрывы» учитываются, пока вероятность ветки больше
+MEMO_CELLS = 8_000_000        # суммарный размер закэшированных распределений
+TABLE_MAX = 40                # до стольких значений распределение выводится таблицей
+PERCENTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+_CMP = re.compile(r"^(.*?)\s*(>=|<=|==|=|>|<)\s*(-?\d+)\s*$")
+
+
+class Dist:
+    # Распределение целочисленной величины: P(X = offset + i) = probs[i].
+    __slots__ = ("offset", "probs")
+
+    def __init__(self, offset: int, probs):
+        self.offset = offset
+        self.probs = probs
+
+    def __len__(self):
+        return len(self.probs)
+
+
+def _check(size: int):
+    limit = MAX_SUPPORT if np is not None else MAX_SUPPORT_PURE
+    if size > limit:
+        raise ArgError(f"Слишком много возможных значений ({size:,}); предел — {limit:,}")
+
+
+def _array(values):
+    return np.asarray(values, dtype=float) if np is not None else list(values)
+
+
+def _zeros(size: int):
+    return np.zeros(size) if np is not None else [0.0] * size
+
+
+def _add_shifted(target, row, shift: int, w: float):
+    # target[s + shift] += row[s] * w
+    if np is not None:
+        target[shift:] += row[:len(row) - shift] * w
+        return
+    for s, x in enumerate(row[:len(row) - shift]):
+        if x:
+            target[s + shift] += x * w
+
+
+def _clean(probs):
+    # Погрешность FFT даёт крошечные отрицательные значения — обнуляем и нормируем.
+    if np is None:
+        return probs
+    probs = np.clip(probs, 0.0, None)
+    return probs / probs.sum()
+
+
+def _convolve(a, b):
+    if np is None:
+        out = [0.0] * (len(a) + len(b) - 1)
+        for i, x in enumerate(a):
+            if x:
+                for j, y in enumerate(b):
+                    out[i + j] += x * y
+        return out
+    if min(len(a), len(b)) < 64:
+        return np.convolve(a, b)
+    size = len(a) + len(b) - 1
+    n = 1 << (size - 1).bit_length()
+    return _clean(np.fft.irfft(np.fft.rfft(a, n) * np.fft.rfft(b, n), n)[:size])
+
+
+def _power(p, k: int):
+    # Распределение суммы k независимых копий: p^k в частотной области
+    # (одно прямое и одно обратное FFT) или возведение свёрткой в квадрат.
+    size = k * (len(p) - 1) + 1
+    _check(size)
+    if k == 1:
+        return p
+    if np is not None:
+        n = 1 << (size - 1).bit_length()
+        return _clean(np.fft.irfft(np.fft.rfft(p, n) ** k, n)[:size])
+    result, base = None, p
+    while k:
+        if k & 1:
+            result = base if result is None else _convolve(result, base)
+        k >>= 1
+        if k:
+            base = _convolve(base, base)
+    return result
+
+
+def _log_comb(n: int, k: int) -> float:
+    return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+
+
+def _keep_highest(n: int, m: int, k: int) -> Dist:
+    # Сумма k старших из n кубиков dm без перебора исходов. Грани v идут от m
+    # вниз; состояние — сколько кубиков i < k уже выпало выше v и сумма этих
+    # кубиков. Если на грани v набирается k кубиков, остальные должны быть
+    # меньше v — эта вероятность считается сразу, и ветка закрывается.
+    width = k * m + 1
+    states = [_zeros(width) for _ in range(k)]
+    states[0][0] = 1.0
+    final = _zeros(width)
+    log_m = math.log(m)
+    for v in range(m, 0, -1):
+        nxt = [_zeros(width) for _ in range(k)]
+        log_lower = math.log(v - 1) - log_m if v > 1 else None
+        for i, row in enumerate(states):
+            rest, need = n - i, k - i
+            # c < need из rest оставшихся кубиков показали v: C(rest, c) / m^c
+            for c in range(need):
+                _add_shifted(nxt[i + c], row, c * v, math.exp(_log_comb(rest, c) - c * log_m))
+            # хотя бы need показали v, остальные меньше v
+            w = 0.0
+            for c in range(need, rest + 1):
+                lower = rest - c
+                if lower and log_lower is None:
+                    continue
+                w += math.exp(_log_comb(rest, c) - c * log_m + (lower * log_lower if lower else 0.0))
+            _add_shifted(final, row, need * v, w)
+        states = nxt
+    return Dist(k, _clean(final[k:]))
+
+
+def _keep_cost(node) -> float:
+    # Оценка _keep_highest: на каждую из m граней и k состояний — до k сдвигов
+    # строки ширины k·m (плюс накладные расходы вызова) и цикл по остальным кубикам.
+    kind = type(node)
+    if kind in (Group, Neg):
+        return _keep_cost(node.x)
+    if kind is BinOp:
+        return _keep_cost(node.left) + _keep_cost(node.right)
+    if kind is not Dice or node.keep is None:
+        return 0.0
+    n, m, k = node.n, node.m, node.count
+    if node.keep in ("dh", "dl"):
+        k = n - k
+    cell = 1 if np is not None else KEEP_CELL_PURE
+    return m * k * ((k + 1) / 2 * (k * m * cell + 2000) + 500 * (n - k))
+
+
+def _dice(node: Dice) -> Dist:
+    n, m = node.n, node.m
+    if node.keep is not None:
+        if node.explode:
+            raise ArgError("/odds: «взрывы» вместе с kh/kl не поддерживаются")
+        if n > MAX_KEEP_DICE:
+            raise ArgError(f"/odds: kh/kl/dh/dl — не больше {MAX_KEEP_DICE} кубиков")
+        k = node.count
+        if node.keep in ("dh", "dl"):
+            k = n - k
+        if k == 0:
+            return Dist(0, _array([1.0]))
+        highest = node.keep in ("kh", "dl")
+        dist = _keep_highest(n, m, k)
+        if highest:
+            return dist
+        # младшие k граней v — это старшие k граней m + 1 - v
+        probs = dist.probs[::-1]
+        return Dist(k * (m + 1) - (dist.offset + len(dist) - 1), probs)
+    if node.explode:
+        # одна кость: m*j + r с вероятностью m^-(j+1), r = 1..m-1
+        single = []
+        j = 0
+        while True:
+            p = m ** -(j + 1)
+            single += [p] * (m - 1) + [0.0]
+            j += 1
+            if p < EXPLODE_EPS:
+                break
+        return Dist(n, _power(_array(single[:-1]), n))
+    return Dist(n, _power(_array([1.0 / m] * m), n))
+
+
+def _scale(d: Dist, c: int) -> Dist:
+    if c == 0:
+        return Dist(0, _array([1.0]))
+    if c < 0:
+        d = _negate(d)
+        c = -c
+    size = (len(d) - 1) * c + 1
+    _check(size)
+    out = _zeros(size)
+    out[::c] = d.probs
+    return Dist(d.offset * c, out)
+
+
+def _floordiv(d: Dist, c: int) -> Dist:
+    if c == 0:
+        raise ArgError("Деление на ноль")
+    lo = d.offset // c if c > 0 else (d.offset + len(d) - 1) // c
+    hi = (d.offset + len(d) - 1) // c if c > 0 else d.offset // c
+    if np is not None:
+        # offset бывает больше int64 ((10**9 * 10**9 * 10**9) / 7): numpy получает
+        # только остаток r, |r| < |c| ≤ MAX_NUMBER, частное q остаётся целым Python
+        q, r = divmod(d.offset, c)
+        index = np.arange(r, r + len(d)) // c + (q - lo)
+        return Dist(lo, np.bincount(index, weights=d.probs, minlength=hi - lo + 1))
+    out = [0.0] * (hi - lo + 1)
+    for i, p in enumerate(d.probs):
+        out[(d.offset + i) // c - lo] += p
+    return Dist(lo, out)
+
+
+def _negate(d: Dist) -> Dist:
+    return Dist(-(d.offset + len(d) - 1), d.probs[::-1])
+
+
+def _const(node):
+    while isinstance(node, Group):
+        node = node.x
+    if isinstance(node, Num):
+        return node.value
+    if isinstance(node, Neg):
+        inner = _const(node.x)
+        return None if inner is None else -inner
+    return None
+
+
+def distribution(node) -> Dist:
+    kind = type(node)
+    if kind is Num:
+        return Dist(node.value, _array([1.0]))
+    if kind is Dice:
+        return _dice(node)
+    if kind is Group:
+        return distribution(node.x)
+    if kind is Neg:
+        return _negate(distribution(node.x))
+    if node.op in ("+", "-"):
+        left, right = distribution(node.left), distribution(node.right)
+        if node.op == "-":
+            right = _negate(right)
+        _check(len(left) + len(right) - 1)
+        return Dist(left.offset + right.offset, _convolve(left.probs, right.probs))
+    c = _const(node.right)
+    if node.op == "/":
+        if c is None:
+            raise ArgError("/odds: делить можно только на число")
+        return _floordiv(distribution(node.left), c)
+    if c is not None:
+        return _scale(distribution(node.left), c)
+    c = _const(node.left)
+    if c is None:
+        raise ArgError("/odds: умножать можно только на число")
+    return _scale(distribution(node.right), c)
+
+
+class _Memo:
+    # LRU распределений по нормализованному выражению, ограниченный суммарным размером.
+    def __init__(self, max_cells=MEMO_CELLS):
+        self.max_cells = max_cells
+        self.cells = 0
+        self._items = OrderedDict()
+        self.hits = 0
+
+    def get(self, key):
+        d = self._items.get(key)
+        if d is not None:
+            self._items.move_to_end(key)
+            self.hits += 1
+        return d
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def put(self, key, d: Dist):
+        if len(d) > self.max_cells:
+            return
+        self._items[key] = d
+        self.cells += len(d)
+        while self.cells > self.max_cells:
+            _, old = self._items.popitem(last=False)
+            self.cells -= len(old)
+
+
+MEMO = _Memo()
+_executor = None
+
+
+def parse_odds(text: str):
+    # «выражение [оператор число]» → (Program, (оператор, число) или None).
+    # Правила NdM те же, что у /roll (dice.compile_roll).
+    cmp = None
+    m = _CMP.match(text.strip())
+    if m:
+        text, op, value = m.group(1), m.group(2), int(m.group(3))
+        cmp = ("==" if op == "=" else op, value)
+    program = compile_roll(text, MAX_DICE)
+    if program.repeat != 1:
+        raise ArgError("/odds считает одно выражение, без повторов «Nx»")
+    # проверка до очереди: долгий kh/kl занял бы общий поток /odds для всех
+    if _keep_cost(program.expr) > KEEP_BUDGET:
+        raise ArgError("/odds: слишком долго считать kh/kl/dh/dl — уменьшите число кубиков, граней или оставляемых")
+    return program, cmp
+
+
+def solve(program) -> Dist:
+    d = MEMO.get(program.text)
+    if d is None:
+        d = distribution(program.expr)
+        MEMO.put(program.text, d)
+    return d
+
+
+async def solve_async(program) -> Dist:
+    # Из кэша — сразу; новое выражение считается в отдельном потоке, чтобы
+    # свёртка на миллион значений не держала цикл событий.
+    global _executor
+    if program.text in MEMO:
+        return solve(program)
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="randomlab-odds")
+    return await asyncio.get_running_loop().run_in_executor(_executor, solve, program)
+
+
+def _cdf(d: Dist):
+    if np is not None:
+        return np.cumsum(d.probs)
+    return list(accumulate(d.probs))
+
+
+def stats(d: Dist):
+    # (среднее, дисперсия); значения отсчитываются от offset, чтобы не терять
+    # точность. Среднее — точная дробь offset + m: offset бывает за пределами float.
+    if np is not None:
+        x = np.arange(len(d), dtype=float)
+        mean = float((x * d.probs).sum())
+        var = float(((x - mean) ** 2 * d.probs).sum())
+    else:
+        mean = sum(i * p for i, p in enumerate(d.probs))
+        var = sum((i - mean) ** 2 * p for i, p in enumerate(d.probs))
+    return d.offset + Fraction(mean), var
+
+
+def percentile(d: Dist, q: float) -> int:
+    i = bisect_left(_cdf(d), q - 1e-12)
+    return d.offset + min(i, len(d) - 1)
+
+
+def probability(d: Dist, op: str, value: int) -> float:
+    # P(X op value) через функцию распределения
+    cdf = _cdf(d)
+    i = value - d.offset   # индекс значения value
+
+    def below(j):  # P(X < offset + j)
+        return 0.0 if j <= 0 else 1.0 if j > len(d) else float(cdf[j - 1])
+    p = {"<": below(i), "<=": below(i + 1), ">": 1.0 - below(i + 1),
+         ">=": 1.0 - below(i), "==": below(i + 1) - below(i)}[op]
+    return min(1.0, max(0.0, p))
+
+
+def _num(x) -> str:
+    # 4 знака после запятой; через Fraction, чтобы большое точное среднее не округлялось до float
+    scaled = round(Fraction(x) * 10 ** 4)
+    whole, frac = divmod(abs(scaled), 10 ** 4)
+    return ("-" if scaled < 0 else "") + f"{whole}.{frac:04d}".rstrip("0").rstrip(".")
+
+
+def format_odds(program, cmp, d: Dist) -> str:
+    mean, var = stats(d)
+    lines = [f"{program.text}: среднее {_num(mean)}, дисперсия {_num(var)}, σ {_num(math.sqrt(var))}",
+             f"значения {d.offset}..{d.offset + len(d) - 1}"]
+    if cmp is not None:
+        op, value = cmp
+        lines.append(f"P(X {op} {value}) = {probability(d, op, value) * 100:.6g}%")
+    lines.append("перцентили: " + ", ".join(f"p{int(q * 100)}={percentile(d, q)}" for q in PERCENTILES))
+    if len(d) <= TABLE_MAX:
+        top = max(d.probs)
+        for i, p in enumerate(d.probs):
+            lines.append(f"{d.offset + i:>5} {p * 100:7.3f}% {'█' * round(20 * p / top)}")
+    return "\n".join(lines)
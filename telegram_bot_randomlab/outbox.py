@@ -0,0 +1,231 @@
+import asyncio
+import time
+import warnings
+from collections import deque
+from telegram.constants import MessageLimit
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+COALESCE_KEYS = {"chat_id", "text"}
+
+
+def _seconds(exc: RetryAfter) -> float:
+    # В новых версиях PTB retry_after — timedelta, в старых — int
+    # (и обращение к нему выдаёт предупреждение о смене типа).
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        retry_after = exc.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+def _rewind(data: dict):
+    # Файл, отданный в InputFile без чтения (read_file_handle=False, см.
+    # streaming.send_stream), первая попытка уже дочитала до конца — перед
+    # повтором его надо вернуть в начало, иначе уйдёт пустой документ.
+    for value in data.values():
+        content = getattr(value, "input_file_content", None)
+        if hasattr(content, "seek"):
+            content.seek(0)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.stamp = clock()
+
+    def delay(self) -> float:
+        # Забирает жетон, если он есть (возвращает 0), иначе — сколько ждать.
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def idle(self) -> bool:
+        return self.tokens + (self.clock() - self.stamp) * self.rate >= self.capacity
+
+
+class _Item:
+    __slots__ = ("callback", "endpoint", "data", "kwargs", "future")
+
+    def __init__(self, callback, endpoint, data, kwargs, future):
+        self.callback = callback
+        self.endpoint = endpoint
+        self.data = data
+        self.kwargs = kwargs
+        self.future = future
+
+    @property
+    def coalescable(self) -> bool:
+        return self.endpoint == "sendMessage" and set(self.data) <= COALESCE_KEYS
+
+
+class OutboundDispatcher(BaseRateLimiter):
+    # Очередь исходящих запросов к Bot API, подключается через
+    # Application.builder().rate_limiter(...). Держит глобальный бакет
+    # (30 сообщений/с) и бакет на каждый чат (1 сообщение/с), соблюдает
+    # retry_after из ответа 429 и склеивает несколько ожидающих текстовых
+    # ответов в один чат в одно сообщение (до 4096 символов).
+    def __init__(self, global_rate=30.0, chat_rate=1.0, chat_burst=1, max_queue=1000,
+                 max_retries=3, coalesce=True, detach=True, clock=time.monotonic):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.coalesce = coalesce
+        self.detach = detach
+        self.clock = clock
+        self.max_queue = max_queue
+        self._global = TokenBucket(global_rate, global_rate, clock)
+        self._chat_buckets = {}
+        self._pending = {}
+        self._workers = {}
+        self._detached = 0
+        self.api_metrics = None  # metrics.Metrics для замера времени запросов к Bot API
+        self._slots = None
+        self._resume = None
+        self.stats = {"queued": 0, "max_depth": 0, "requests": 0, "messages": 0,
+                      "coalesced": 0, "retry_after": 0, "backpressure_waits": 0}
+
+    async def initialize(self):
+        self._slots = asyncio.Semaphore(self.max_queue)
+        self._resume = asyncio.Event()
+        self._resume.set()
+
+    async def shutdown(self):
+        if self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
+
+    def metrics(self) -> dict:
+        return dict(self.stats, chats=len(self._pending), buckets=len(self._chat_buckets))
+
+    def has_room(self) -> bool:
+        return self._detached < self.max_queue and self.stats["queued"] < self.max_queue
+
+    def submit(self, application, coro, update=None):
+        # Отправка без ожидания результата: обработчик сразу освобождается,
+        # а запрос проходит через очередь в задаче Application.create_task.
+        self._detached += 1
+
+        async def run():
+            try:
+                return await coro
+            finally:
+                self._detached -= 1
+        return application.create_task(run(), update=update)
+
+    async def _acquire(self, bucket):
+        while True:
+            await self._resume.wait()
+            d = bucket.delay()
+            if not d:
+                return
+            await asyncio.sleep(d)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if self._slots is None:
+            await self.initialize()
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            await self._acquire(self._global)
+            return await self._call(callback, endpoint, data, kwargs, rate_limit_args)
+
+        if self._slots.locked():
+            self.stats["backpressure_waits"] += 1
+        await self._slots.acquire()
+        fut = asyncio.get_running_loop().create_future()
+        fut.add_done_callback(lambda _: self._release())
+        self._pending.setdefault(chat_id, deque()).append(_Item(callback, endpoint, data, kwargs, fut))
+        self.stats["queued"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], self.stats["queued"])
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._chat_worker(chat_id))
+        return await fut
+
+    def _release(self):
+        self.stats["queued"] -= 1
+        self._slots.release()
+
+    def _bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                # полные бакеты ничего не помнят — их можно выбросить
+                for key in [k for k, b in self._chat_buckets.items() if b.idle()]:
+                    del self._chat_buckets[key]
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, self.clock)
+        return bucket
+
+    def _take_batch(self, queue: deque) -> list:
+        batch = [queue.popleft()]
+        if not (self.coalesce and batch[0].coalescable):
+            return batch
+        size = len(batch[0].data["text"])
+        while queue and queue[0].coalescable:
+            extra = len(queue[0].data["text"]) + 1
+            if size + extra > MessageLimit.MAX_TEXT_LENGTH:
+                break
+            size += extra
+            batch.append(queue.popleft())
+        return batch
+
+    async def _chat_worker(self, chat_id):
+        queue = self._pending[chat_id]
+        bucket = self._bucket(chat_id)
+        try:
+            while queue:
+                await self._acquire(bucket)
+                await self._acquire(self._global)
+                batch = self._take_batch(queue)
+                await self._send(batch)
+        finally:
+            del self._workers[chat_id]
+            if not queue:
+                self._pending.pop(chat_id, None)
+
+    async def _send(self, batch: list):
+        first = batch[0]
+        data = first.data
+        if len(batch) > 1:
+            data = dict(data, text="\n".join(item.data["text"] for item in batch))
+            self.stats["coalesced"] += len(batch) - 1
+        try:
+            result = await self._call(first.callback, first.endpoint, data, first.kwargs, None)
+        except Exception as exc:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(exc)
+            return
+        self.stats["messages"] += len(batch)
+        for item in batch:
+            if not item.future.done():
+                item.future.set_result(result)
+
+    async def _call(self, callback, endpoint, data, kwargs, max_retries):
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            try:
+                self.stats["requests"] += 1
+                if self.api_metrics is None:
+                    return await callback(endpoint, data, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await callback(endpoint, data, **kwargs)
+                finally:
+                    self.api_metrics.observe_api(endpoint, time.perf_counter() - start)
+            except RetryAfter as exc:
+                self.stats["retry_after"] += 1
+                if attempt == max_retries:
+                    raise
+                # 429 касается всего бота — приостанавливаем все отправки
+                self._resume.clear()
+                try:
+                    await asyncio.sleep(_seconds(exc) + 0.1)
+                finally:
+                    self._resume.set()
+                _rewind(data)
@@ -0,0 +1,146 @@
+import math
+import time
+from array import array
+from collections import OrderedDict
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, TypeHandler
+from router import reply
+
+CAPACITY = 1 << 16       # ключей в одном окне; самые давние вытесняются
+DEDUP_WINDOW = 2.0       # одинаковые команды за столько секунд схлопываются в одну
+DEDUP_MAX = 1 << 16
+LIMITED_TEXT = "Слишком много запросов — подождите {} с."
+
+
+class SlidingWindow:
+    # Скользящее окно «два счётчика»: оценка = prev * (доля прошлого окна,
+    # ещё попадающая в скользящее) + cur. На ключ — одна ячейка в массивах
+    # (номер окна, два счётчика, окно последнего предупреждения), а словарь
+    # хранит только ключ → номер ячейки в порядке последнего обращения.
+    # Когда ячейки кончаются, переиспользуется ячейка самого давнего ключа,
+    # поэтому память ограничена capacity при любом числе пользователей.
+    def __init__(self, limit: int, window: float, capacity=CAPACITY, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.capacity = capacity
+        self.clock = clock
+        self._slots = OrderedDict()
+        self._bucket = array("q")
+        self._prev = array("I")
+        self._cur = array("I")
+        self._warned = array("q")
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _slot(self, key) -> int:
+        slot = self._slots.get(key)
+        if slot is not None:
+            self._slots.move_to_end(key)
+            return slot
+        if len(self._slots) < self.capacity:
+            slot = len(self._bucket)
+            self._bucket.append(0)
+            self._prev.append(0)
+            self._cur.append(0)
+            self._warned.append(-1)
+        else:
+            _, slot = self._slots.popitem(last=False)
+            self.evicted += 1
+        self._bucket[slot] = self._prev[slot] = self._cur[slot] = 0
+        self._warned[slot] = -1
+        self._slots[key] = slot
+        return slot
+
+    def hit(self, key):
+        # None — запрос разрешён и посчитан; иначе — через сколько секунд станет можно.
+        now = self.clock()
+        bucket = int(now // self.window)
+        slot = self._slot(key)
+        start = self._bucket[slot]
+        if bucket != start:
+            self._prev[slot] = self._cur[slot] if bucket == start + 1 else 0
+            self._cur[slot] = 0
+            self._bucket[slot] = bucket
+        elapsed = now / self.window - bucket
+        if self._prev[slot] * (1.0 - elapsed) + self._cur[slot] < self.limit:
+            self._cur[slot] += 1
+            return None
+        return (1.0 - elapsed) * self.window
+
+    def warn(self, key) -> bool:
+        # True один раз за окно: предупреждать о лимите не чаще.
+        slot = self._slots.get(key)
+        if slot is None or self._warned[slot] == self._bucket[slot]:
+            return False
+        self._warned[slot] = self._bucket[slot]
+        return True
+
+
+class Deduplicator:
+    # Одинаковые команды (пользователь, чат, хэш текста) за window секунд — одна.
+    def __init__(self, window=DEDUP_WINDOW, max_size=DEDUP_MAX, clock=time.monotonic):
+        self.window = window
+        self.max_size = max_size
+        self.clock = clock
+        self._seen = OrderedDict()   # ключ → время; по возрастанию времени
+
+    def seen(self, key) -> bool:
+        now = self.clock()
+        seen = self._seen
+        while seen:
+            oldest = next(iter(seen.values()))
+            if now - oldest < self.window and len(seen) < self.max_size:
+                break
+            seen.popitem(last=False)
+        if key in seen:
+            return True
+        seen[key] = now
+        return False
+
+
+class RequestGuard:
+    # Слой перед всеми обработчиками (группа -1): повторы одной и той же
+    # команды отбрасываются, запросы сверх лимита пользователя или группового
+    # чата получают короткий готовый ответ (не чаще раза за окно) и дальше
+    # не идут — до разбора аргументов и генерации дело не доходит. Inline-запросы
+    # приходят на каждое нажатие клавиши и считаются в отдельном, более широком окне.
+    def __init__(self, user_limit=10, chat_limit=30, window=10.0, dedup_window=DEDUP_WINDOW,
+                 inline_limit=60, capacity=CAPACITY, clock=time.monotonic):
+        self.users = SlidingWindow(user_limit, window, capacity, clock)
+        self.inline = SlidingWindow(inline_limit, window, capacity, clock)
+        self.chats = SlidingWindow(chat_limit, window, capacity, clock)
+        self.dedup = Deduplicator(dedup_window, clock=clock) if dedup_window else None
+        self.stats = {"allowed": 0, "limited": 0, "deduped": 0}
+
+    async def check(self, update: Update, context):
+        # Считаются только обращения к боту: команды и inline-запросы. Обычная
+        # переписка в группе проходит мимо окон и не тратит лимит чата.
+        user = update.effective_user
+        if user is None:
+            return
+        chat = update.effective_chat
+        msg = update.message
+        if update.inline_query is not None:
+            windows = [(self.inline, user.id)]
+        elif msg is not None and msg.text and msg.text.startswith("/"):
+            if self.dedup is not None and self.dedup.seen((user.id, chat.id, hash(msg.text))):
+                self.stats["deduped"] += 1
+                raise ApplicationHandlerStop
+            windows = [(self.users, user.id)]
+            if chat.id != user.id:
+                windows.append((self.chats, chat.id))
+        else:
+            return
+        for limiter, key in windows:
+            wait = limiter.hit(key)
+            if wait is not None:
+                self.stats["limited"] += 1
+                if msg is not None and limiter.warn(key):
+                    await reply(update, context, LIMITED_TEXT.format(math.ceil(wait)))
+                raise ApplicationHandlerStop
+        self.stats["allowed"] += 1
+
+    def handler(self):
+        return TypeHandler(Update, self.check)
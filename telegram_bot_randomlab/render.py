@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import multiprocessing
+import struct
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from telegram.error import BadRequest
+
+CACHE_BYTES = 16 << 20   # LRU готовых PNG
+MAX_FILE_IDS = 10000     # file_id уже загруженных картинок
+DIE_SIZE = 64
+DICE_PER_ROW = 6
+HIST_HEIGHT = 200
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+GREY = (200, 200, 200)
+BAR = (66, 133, 244)
+
+# Шрифт 3×5 для цифр на гранях: строка — 3 бита слева направо.
+DIGITS = {
+    "0": (7, 5, 5, 5, 7), "1": (2, 6, 2, 2, 7), "2": (7, 1, 7, 4, 7), "3": (7, 1, 7, 1, 7),
+    "4": (5, 5, 7, 1, 1), "5": (7, 4, 7, 1, 7), "6": (7, 4, 7, 5, 7), "7": (7, 1, 1, 1, 1),
+    "8": (7, 5, 7, 5, 7), "9": (7, 5, 7, 1, 7),
+}
+# Точки d6 в сетке 3×3 (номера клеток 0..8)
+PIPS = {1: (4,), 2: (0, 8), 3: (0, 4, 8), 4: (0, 2, 6, 8), 5: (0, 2, 4, 6, 8), 6: (0, 2, 3, 5, 6, 8)}
+
+log = logging.getLogger(__name__)
+
+
+def encode_png(width: int, height: int, rows) -> bytes:
+    # Минимальный PNG (8 бит RGB, без фильтров) из строк пикселей по 3*width байт.
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    raw = b"".join(b"\x00" + bytes(row) for row in rows)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 6))
+            + chunk(b"IEND", b""))
+
+
+class Canvas:
+    # RGB-холст: строки — bytearray, прямоугольники заливаются срезами.
+    def __init__(self, width: int, height: int, bg=WHITE):
+        self.width = width
+        self.height = height
+        self.rows = [bytearray(bytes(bg) * width) for _ in range(height)]
+
+    def rect(self, x: int, y: int, w: int, h: int, rgb):
+        x0, x1 = max(0, x), min(self.width, x + w)
+        if x0 >= x1:
+            return
+        line = bytes(rgb) * (x1 - x0)
+        for row in self.rows[max(0, y):max(0, y + h)]:
+            row[3 * x0:3 * x1] = line
+
+    def text(self, x: int, y: int, s: str, scale: int, rgb):
+        for ch in s:
+            for dy, bits in enumerate(DIGITS[ch]):
+                for dx in range(3):
+                    if bits & (4 >> dx):
+                        self.rect(x + dx * scale, y + dy * scale, scale, scale, rgb)
+            x += 4 * scale
+
+    def png(self) -> bytes:
+        return encode_png(self.width, self.height, self.rows)
+
+
+def swatch(rgb: int, size=128) -> bytes:
+    c = Canvas(size, size, ((rgb >> 16) & 0xFF, (rgb >> 8) & 0xFF, rgb & 0xFF))
+    return c.png()
+
+
+def _die(c: Canvas, x: int, y: int, value: int, sides: int, size: int):
+    c.rect(x, y, size, size, BLACK)
+    c.rect(x + 2, y + 2, size - 4, size - 4, WHITE)
+    if sides == 6:
+        cell = size // 3
+        dot = size // 6
+        for i in PIPS[value]:
+            cx, cy = x + (i % 3) * cell + (cell - dot) // 2, y + (i // 3) * cell + (cell - dot) // 2
+            c.rect(cx, cy, dot, dot, BLACK)
+        return
+    s = str(value)
+    scale = max(1, min(size // 10, (size - 12) // (4 * len(s))))
+    c.text(x + (size - (4 * len(s) - 1) * scale) // 2, y + (size - 5 * scale) // 2, s, scale, BLACK)
+
+
+def dice(values, sides: int, size=DIE_SIZE) -> bytes:
+    # Грани кубиков рядами по DICE_PER_ROW; для d6 — точки, для остальных — цифры.
+    gap = size // 8
+    cols = min(len(values), DICE_PER_ROW)
+    rows = (len(values) + DICE_PER_ROW - 1) // DICE_PER_ROW
+    c = Canvas(cols * (size + gap) + gap, rows * (size + gap) + gap)
+    for i, v in enumerate(values):
+        _die(c, gap + (i % DICE_PER_ROW) * (size + gap), gap + (i // DICE_PER_ROW) * (size + gap), v, sides, size)
+    return c.png()
+
+
+def histogram(counts, height=HIST_HEIGHT, max_width=800) -> bytes:
+    # Столбцы counts слева направо; если их больше max_width, соседние складываются.
+    n = len(counts)
+    if n > max_width:
+        step = -(-n // max_width)
+        counts = [sum(counts[i:i + step]) for i in range(0, n, step)]
+        n = len(counts)
+    bar = max(1, min(16, max_width // n))
+    c = Canvas(n * bar + 2, height + 2)
+    c.rect(0, height, n * bar + 2, 2, GREY)
+    top = max(counts) or 1
+    for i, v in enumerate(counts):
+        h = round(height * v / top)
+        c.rect(1 + i * bar, height - h, max(1, bar - 1), h, BAR)
+    return c.png()
+
+
+class Renderer:
+    # Картинки для ответов. PNG кодируются в пуле процессов, чтобы кодирование
+    # не держало цикл событий (workers=0 — прямо в цикле, для тестов и сравнения).
+    # Готовые байты лежат в LRU по ключу картинки, а после первой загрузки
+    # в Telegram запоминается file_id — повторная картинка уходит без
+    # кодирования и без загрузки.
+    def __init__(self, workers=1, max_bytes=CACHE_BYTES, max_file_ids=MAX_FILE_IDS):
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.max_file_ids = max_file_ids
+        self._pool = None
+        self._cache = OrderedDict()
+        self._size = 0
+        self._file_ids = OrderedDict()
+        self._pending = {}   # ключ → Future кодирования, чтобы не рисовать одно и то же дважды
+        self.stats = {"renders": 0, "hits": 0, "uploads": 0, "reused": 0}
+
+    async def open(self):
+        if self.workers and self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def png(self, key, fn, *args) -> bytes:
+        data = self._cache.get(key)
+        if data is not None:
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return data
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        if self._pool is None:
+            await self.open()
+        loop = asyncio.get_running_loop()
+        fut = self._pending[key] = loop.create_future()
+        try:
+            if self._pool is None:
+                data = fn(*args)
+            else:
+                data = await loop.run_in_executor(self._pool, fn, *args)
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # ошибка уже передана вызывающему; не ругаться «never retrieved»
+            raise
+        finally:
+            del self._pending[key]
+        fut.set_result(data)
+        self.stats["renders"] += 1
+        self._put(key, data)
+        return data
+
+    def _put(self, key, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        self._cache[key] = data
+        self._size += len(data)
+        while self._size > self.max_bytes:
+            _, old = self._cache.popitem(last=False)
+            self._size -= len(old)
+
+    async def send(self, update, context, key, fn, *args, caption=None):
+        chat_id = update.effective_chat.id
+        file_id = self._file_ids.get(key)
+        if file_id is not None:
+            self._file_ids.move_to_end(key)
+            try:
+                await context.bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+                self.stats["reused"] += 1
+                return
+            except BadRequest:
+                log.warning("file_id для %r больше не действует, загружаем заново", key)
+                self._file_ids.pop(key, None)
+        data = await self.png(key, fn, *args)
+        msg = await context.bot.send_photo(chat_id=chat_id, photo=data, caption=caption)
+        self.stats["uploads"] += 1
+        photo = getattr(msg, "photo", None)
+        if photo and isinstance(photo[-1].file_id, str):
+            self._file_ids[key] = photo[-1].file_id
+            if len(self._file_ids) > self.max_file_ids:
+                self._file_ids.popitem(last=False)
@@ -0,0 +1,227 @@
+import random
+from array import array
+from lazy import lazy_import
+
+# numpy необязателен: без него работает PythonEngine. Загружается при первом
+# броске, а не при импорте модуля.
+np = lazy_import("numpy")
+
+BULK = 32  # начиная с такого количества значения генерируются одним вызовом numpy
+BLOCK = 4096  # размер блока для потоковых iter_*/sum_*
+
+
+class RandomEngine:
+    # Общий интерфейс генератора для обработчиков. Подклассы реализуют
+    # randbelow/randbelow_many, остальное выражено через них.
+    name = "base"
+
+    def randbelow(self, n: int) -> int:
+        raise NotImplementedError
+
+    def fork(self):
+        # Независимый генератор того же вида для работы в другом потоке
+        # (буфер слов не делится); зерно берётся из этого, поэтому прогон
+        # с RANDOMLAB_SEED остаётся воспроизводимым.
+        return type(self)(self.randbelow(1 << 128))
+
+    def randbelow_many(self, n: int, count: int) -> list:
+        return [self.randbelow(n) for _ in range(count)]
+
+    def randint(self, a: int, b: int) -> int:
+        return a + self.randbelow(b - a + 1)
+
+    def randints(self, a: int, b: int, count: int) -> list:
+        return [a + x for x in self.randbelow_many(b - a + 1, count)]
+
+    def choice(self, seq):
+        return seq[self.randbelow(len(seq))]
+
+    def choices(self, seq, count: int) -> list:
+        return [seq[i] for i in self.randbelow_many(len(seq), count)]
+
+    def shuffle(self, items: list) -> None:
+        for i in range(len(items) - 1, 0, -1):
+            j = self.randbelow(i + 1)
+            items[i], items[j] = items[j], items[i]
+
+    def permutation(self, n: int) -> list:
+        arr = list(range(1, n + 1))
+        self.shuffle(arr)
+        return arr
+
+    def sample(self, seq, k: int) -> list:
+        pool = list(seq)
+        n = len(pool)
+        if not 0 <= k <= n:
+            raise ValueError("k вне диапазона 0..len(seq)")
+        for i in range(k):
+            j = i + self.randbelow(n - i)
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
+
+    # Потоковые варианты для больших n: значения выдаются блоками по block,
+    # так что целиком в памяти держится не больше одного блока.
+    def iter_randints(self, a: int, b: int, count: int, block: int = BLOCK):
+        while count > 0:
+            k = min(block, count)
+            yield from self.randints(a, b, k)
+            count -= k
+
+    def sum_randints(self, a: int, b: int, count: int, block: int = BLOCK) -> int:
+        total = 0
+        while count > 0:
+            k = min(block, count)
+            total += sum(self.randints(a, b, k))
+            count -= k
+        return total
+
+    def iter_choices(self, seq, count: int, block: int = BLOCK):
+        while count > 0:
+            k = min(block, count)
+            yield from self.choices(seq, k)
+            count -= k
+
+    def iter_permutation(self, n: int, block: int = BLOCK):
+        # Сама перестановка хранится компактным массивом, а не списком int.
+        arr = array("l", range(1, n + 1))
+        self.shuffle(arr)
+        for i in range(0, n, block):
+            yield from arr[i:i + block]
+
+
+class PythonEngine(RandomEngine):
+    # Запасной вариант на random.Random (Mersenne Twister).
+    name = "python"
+
+    def __init__(self, seed=None):
+        self._r = random.Random(seed)
+
+    def randbelow(self, n: int) -> int:
+        return self._r.randrange(n)
+
+    def randbelow_many(self, n: int, count: int) -> list:
+        r = self._r.randrange
+        return [r(n) for _ in range(count)]
+
+    def choices(self, seq, count: int) -> list:
+        return self._r.choices(seq, k=count)
+
+    def shuffle(self, items: list) -> None:
+        self._r.shuffle(items)
+
+    def sample(self, seq, k: int) -> list:
+        return self._r.sample(list(seq), k)
+
+
+class WordEngine(RandomEngine):
+    # Генератор поверх потока 64-битных слов: подклассы реализуют _word().
+    def _word(self) -> int:
+        raise NotImplementedError
+
+    def randbelow(self, n: int) -> int:
+        if n <= 0:
+            raise ValueError("n должно быть положительным")
+        if n <= 1 << 64:
+            # остаток от 64-битного слова с отбрасыванием «хвоста» — без смещения
+            limit = (1 << 64) - (1 << 64) % n
+            while True:
+                w = self._word()
+                if w < limit:
+                    return w % n
+        bits = n.bit_length()
+        while True:
+            x = 0
+            for _ in range((bits + 63) // 64):
+                x = (x << 64) | self._word()
+            x >>= (-bits) % 64
+            if x < n:
+                return x
+
+
+class NumpyEngine(WordEngine):
+    # PCG64 из numpy. Одиночные значения берутся из кольцевого буфера
+    # 64-битных слов (заполняется блоком за один вызов), массовые —
+    # векторизованно через Generator.integers/permutation.
+    name = "numpy"
+
+    def __init__(self, seed=None, block_size=4096):
+        if np is None:
+            raise RuntimeError("numpy не установлен")
+        self._seed = seed
+        self._generator = None
+        self._block_size = block_size
+        self._words = []
+        self._pos = 0
+
+    @property
+    def _gen(self):
+        # Generator создаётся при первом обращении: импорт бота не тянет numpy,
+        # а воркер, запущенный fork'ом, берёт зерно из ОС уже после fork.
+        if self._generator is None:
+            self._generator = np.random.Generator(np.random.PCG64(self._seed))
+        return self._generator
+
+    def _word(self) -> int:
+        if self._pos >= len(self._words):
+            self._words = self._gen.bit_generator.random_raw(self._block_size).tolist()
+            self._pos = 0
+        w = self._words[self._pos]
+        self._pos += 1
+        return w
+
+    def randbelow_many(self, n: int, count: int) -> list:
+        if count >= BULK and n <= 1 << 63:
+            return self._gen.integers(0, n, size=count, dtype=np.int64).tolist()
+        if n > 1 << 64 or self._pos + count > len(self._words):
+            return [self.randbelow(n) for _ in range(count)]
+        words = self._words[self._pos:self._pos + count]
+        self._pos += count
+        limit = (1 << 64) - (1 << 64) % n
+        out = [w % n for w in words if w < limit]
+        while len(out) < count:
+            out.append(self.randbelow(n))
+        return out
+
+    def shuffle(self, items: list) -> None:
+        if len(items) >= BULK:
+            perm = self._gen.permutation(len(items)).tolist()
+            items[:] = [items[i] for i in perm]
+        else:
+            super().shuffle(items)
+
+    def permutation(self, n: int) -> list:
+        if n >= BULK:
+            return (self._gen.permutation(n) + 1).tolist()
+        return super().permutation(n)
+
+    def sum_randints(self, a: int, b: int, count: int, block: int = 1 << 16) -> int:
+        if b - a >= 1 << 31:
+            return super().sum_randints(a, b, count, block)
+        total = 0
+        while count > 0:
+            k = min(block, count)
+            total += int(self._gen.integers(a, b + 1, size=k, dtype=np.int64).sum())
+            count -= k
+        return total
+
+    def iter_permutation(self, n: int, block: int = BLOCK):
+        perm = self._gen.permutation(n).astype(np.int32 if n < 1 << 31 else np.int64)
+        perm += 1
+        for i in range(0, n, block):
+            yield from perm[i:i + block].tolist()
+
+    def sample(self, seq, k: int) -> list:
+        if k >= BULK:
+            idx = self._gen.choice(len(seq), size=k, replace=False).tolist()
+            return [seq[i] for i in idx]
+        return super().sample(seq, k)
+
+
+def make_engine(seed=None, kind=None) -> RandomEngine:
+    # seed=None — зерно из ОС; для воспроизводимых прогонов передайте целое число.
+    kind = kind or ("numpy" if np is not None else "python")
+    if kind == "numpy":
+        return NumpyEngine(seed)
+    if kind == "python":
+        return PythonEngine(seed)
+    raise ValueError(f"неизвестный генератор: {kind}")
@@ -0,0 +1,145 @@
+import sys
+import time
+from functools import wraps
+import metrics
+
+
+class ArgError(Exception):
+    # Ошибка разбора аргументов; текст исключения уходит пользователю как есть.
+    pass
+
+
+async def reply(update, context, text: str):
+    # Единая точка отправки ответа на команду. Если у бота есть очередь
+    # OutboundDispatcher и в ней есть место, ответ уходит в фоне; при
+    # заполненной очереди обработчик ждёт отправки (обратное давление).
+    timing = metrics.current.get()
+    if timing is not None:
+        start = time.perf_counter_ns()
+    limiter = getattr(context.bot, "rate_limiter", None)
+    # outbox.py тянет telegram.ext; пока он не загружен, очереди у бота быть не может
+    outbox = sys.modules.get("outbox")
+    send = context.bot.send_message(chat_id=update.effective_chat.id, text=text)
+    queued = outbox is not None and isinstance(limiter, outbox.OutboundDispatcher)
+    if queued and limiter.detach and limiter.has_room():
+        limiter.submit(context.application, send, update)
+        result = None
+    else:
+        result = await send
+    if timing is not None:
+        timing.send += (time.perf_counter_ns() - start) // 1000
+    return result
+
+
+def int_arg(lo=None, hi=None, type_error="Ожидалось целое число", range_error=None):
+    range_error = range_error or f"Значение должно быть в диапазоне {lo}..{hi}"
+
+    def convert(s: str) -> int:
+        try:
+            v = int(s)
+        except ValueError:
+            raise ArgError(type_error) from None
+        if (lo is not None and v < lo) or (hi is not None and v > hi):
+            raise ArgError(range_error)
+        return v
+    return convert
+
+
+def parse_list(arg: str) -> list:
+    return [x for x in (s.strip() for s in arg.split("|")) if x]
+
+
+def list_arg(empty_error=None):
+    # Список a|b|c из оставшихся аргументов; пустой список — ошибка, если задан empty_error.
+    def convert(s: str) -> list:
+        items = parse_list(s)
+        if not items and empty_error:
+            raise ArgError(empty_error)
+        return items
+    return convert
+
+
+def compile_schema(args=(), rest=None, usage=None, exact=True, opt=(), rest_optional=False):
+    # Собирает из описания аргументов одну функцию разбора context.args.
+    # args — конвертеры позиционных аргументов, opt — необязательных
+    # (отсутствующий даёт None), rest — конвертер для всего хвоста
+    # (склеивается через пробел; при rest_optional пустой хвост даёт None).
+    args = tuple(args)
+    opt = tuple(opt)
+    n = len(args)
+
+    def parse(raw):
+        raw = raw or []
+        if rest is not None:
+            if len(raw) < n + (0 if rest_optional else 1):
+                raise ArgError(usage)
+        elif (exact and len(raw) > n + len(opt)) or len(raw) < n:
+            raise ArgError(usage)
+        values = [conv(a) for conv, a in zip(args, raw)]
+        if opt:
+            tail = raw[n:n + len(opt)]
+            values += [conv(a) for conv, a in zip(opt, tail)] + [None] * (len(opt) - len(tail))
+        if rest is not None:
+            values.append(rest(" ".join(raw[n:])) if len(raw) > n else None)
+        return values
+    return parse
+
+
+class CommandRouter:
+    # Таблица команд: имя → обработчик. Вместо отдельного CommandHandler на
+    # каждую команду регистрируется один MessageHandler, который находит
+    # нужный обработчик поиском в словаре.
+    def __init__(self):
+        self.commands = {}
+        self.metrics = None  # metrics.Metrics; None — замеры выключены
+
+    def add(self, name: str, handler):
+        self.commands[name] = handler
+        return handler
+
+    def command(self, name: str, *args, rest=None, usage=None, exact=True, opt=(), rest_optional=False):
+        parse = compile_schema(args, rest, usage, exact, opt, rest_optional) if (args or rest or opt) else None
+
+        def decorator(func):
+            # ArgError — и из разбора аргументов, и из самого обработчика
+            # (диапазон k, выражение кубиков, размер файла) — становится ответом
+            # с текстом ошибки и считается в метриках как ошибка валидации.
+            @wraps(func)
+            async def handler(update, context):
+                timing = metrics.current.get()
+                if timing is not None:
+                    start = time.perf_counter_ns()
+                try:
+                    values = parse(context.args) if parse is not None else ()
+                    if timing is not None:
+                        timing.parse = (time.perf_counter_ns() - start) // 1000
+                    await func(update, context, *values)
+                except ArgError as e:
+                    if timing is not None:
+                        timing.parse = timing.parse or (time.perf_counter_ns() - start) // 1000
+                        timing.error = True
+                    await reply(update, context, str(e))
+            return self.add(name, handler)
+        return decorator
+
+    async def dispatch(self, update, context):
+        msg = update.effective_message
+        text = msg.text if msg else None
+        if not text or not text.startswith("/"):
+            return
+        parts = text.split()
+        name, _, bot_name = parts[0][1:].partition("@")
+        if bot_name and bot_name.lower() != (context.bot.username or "").lower():
+            return
+        handler = self.commands.get(name.lower())
+        if handler is None:
+            return
+        context.args = parts[1:]
+        if self.metrics is None:
+            await handler(update, context)
+        else:
+            await self.metrics.observe(name.lower(), handler, update, context)
+
+    def handler(self):
+        from telegram.ext import MessageHandler, filters
+        return MessageHandler(filters.COMMAND, self.dispatch)
@@ -0,0 +1,388 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from router import ArgError
+
+JOB = "job"              # вид записи в ChatStore: name — id задания, value — JSON
+BATCH = 500              # сработавших заданий за один заход
+MAX_PER_CHAT = 20
+MIN_EVERY = 60           # самый частый повтор, секунд
+MAX_AHEAD = 366 * 86400  # in/every/at: не дальше, чем на год вперёд
+COMMANDS = ("choose", "sample", "shuffle", "roll", "coin", "rand", "eightball")
+CRON_SEARCH = 20000      # шагов поиска следующего срабатывания cron
+
+_DURATION = re.compile(r"(\d+)([smhd])")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+USAGE = ("Использование: /schedule in 10m /choose a|b | at 18:00 /roll 2d6 | every 1h /coin | "
+         "daily 18:00 /sample 3 @список | cron */15 9-18 * * 1-5 /choose a|b (время — UTC)")
+
+log = logging.getLogger(__name__)
+
+
+def parse_duration(s: str) -> int:
+    # «90s», «10m», «1h30m», «2d» → секунды
+    parts = _DURATION.findall(s.lower())
+    if not parts or "".join(n + u for n, u in parts) != s.lower():
+        raise ArgError(f"Не понял интервал «{s}»: например, 30s, 10m, 1h30m, 2d")
+    seconds = sum(int(n) * _UNITS[u] for n, u in parts)
+    if seconds > MAX_AHEAD:
+        raise ArgError(f"Интервал больше {MAX_AHEAD // 86400} дней")
+    return seconds
+
+
+def _field(spec: str, lo: int, hi: int) -> frozenset:
+    # Поле cron: «*», «5», «1-5», «*/15», «0-30/10», «1,15» → множество значений
+    values = set()
+    for part in spec.split(","):
+        rng, _, step = part.partition("/")
+        try:
+            step = int(step) if step else 1
+            if rng == "*":
+                a, b = lo, hi
+            elif "-" in rng:
+                a, b = map(int, rng.split("-", 1))
+            else:
+                a = b = int(rng)
+        except ValueError:
+            raise ArgError(f"Не понял поле cron «{spec}»") from None
+        if not lo <= a <= b <= hi or step < 1:
+            raise ArgError(f"Поле cron «{spec}» вне диапазона {lo}..{hi}")
+        values.update(range(a, b + 1, step))
+    return frozenset(values)
+
+
+class Cron:
+    # Расписание из пяти полей cron (минута, час, день, месяц, день недели; UTC).
+    # Следующий срок ищется прыжками по месяцам, дням и часам, а не перебором минут.
+    def __init__(self, spec: str):
+        fields = spec.split()
+        if len(fields) != 5:
+            raise ArgError("В cron пять полей: минута час день месяц день_недели")
+        self.spec = " ".join(fields)
+        self.minutes = sorted(_field(fields[0], 0, 59))
+        self.hours = _field(fields[1], 0, 23)
+        self.days = _field(fields[2], 1, 31)
+        self.months = _field(fields[3], 1, 12)
+        self.weekdays = frozenset(d % 7 for d in _field(fields[4], 0, 7))   # 0 и 7 — воскресенье
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_ok(self, t: datetime) -> bool:
+        # Как в cron: если заданы и день месяца, и день недели, подходит любой из них.
+        day = t.day in self.days
+        weekday = (t.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next(self, after: float) -> float:
+        t = datetime.fromtimestamp(after, timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(CRON_SEARCH):
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_ok(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            else:
+                minute = next((m for m in self.minutes if m >= t.minute), None)
+                if minute is not None:
+                    return t.replace(minute=minute).timestamp()
+                t = t.replace(minute=0) + timedelta(hours=1)
+        raise ArgError(f"Расписание «{self.spec}» никогда не срабатывает")
+
+
+class Job:
+    __slots__ = ("chat_id", "id", "due", "cmd", "user_id", "chat_type", "every", "cron", "_cron")
+
+    def __init__(self, chat_id, id, due, cmd, user_id=0, chat_type="private", every=None, cron=None):
+        self.chat_id = chat_id
+        self.id = id
+        self.due = due
+        self.cmd = cmd
+        self.user_id = user_id
+        self.chat_type = chat_type
+        self.every = every
+        self.cron = cron
+        self._cron = Cron(cron) if cron else None
+
+    @property
+    def key(self):
+        return self.chat_id, self.id
+
+    def following(self, now: float):
+        # Следующий срок повторяющегося задания (пропущенные сроки не догоняются);
+        # None — задание разовое.
+        if self.every:
+            return self.due + ((now - self.due) // self.every + 1) * self.every
+        if self._cron is not None:
+            return self._cron.next(now)
+        return None
+
+    def dump(self) -> str:
+        return json.dumps({"due": self.due, "cmd": self.cmd, "user": self.user_id, "type": self.chat_type,
+                           "every": self.every, "cron": self.cron}, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, chat_id, id, value: str):
+        d = json.loads(value)
+        return cls(chat_id, id, d["due"], d["cmd"], d["user"], d["type"], d["every"], d["cron"])
+
+
+def parse_schedule(text: str, now: float):
+    # «in 10m /cmd», «at 18:00 /cmd», «at 2030-01-01T18:00 /cmd», «every 1h /cmd»,
+    # «daily 18:00 /cmd», «cron */15 9-18 * * 1-5 /cmd» → (срок, every, cron, команда). Время — UTC.
+    words = text.split()
+    if len(words) < 3:
+        raise ArgError(USAGE)
+    mode = words[0].lower()
+    every = cron = None
+    rest = words[2:]
+    if mode == "in":
+        due = now + parse_duration(words[1])
+    elif mode == "every":
+        every = parse_duration(words[1])
+        if every < MIN_EVERY:
+            raise ArgError(f"Повтор не чаще раза в {MIN_EVERY} с")
+        due = now + every
+    elif mode in ("at", "daily"):
+        when = _clock_time(words[1], now, allow_date=mode == "at")
+        if mode == "daily":
+            cron = f"{when.minute} {when.hour} * * *"
+        due = when.timestamp()
+    elif mode == "cron":
+        cron = " ".join(words[1:6])
+        rest = words[6:]
+        due = Cron(cron).next(now)
+    else:
+        raise ArgError(USAGE)
+    if not rest or not rest[0].startswith("/"):
+        raise ArgError(USAGE)
+    name = rest[0][1:].partition("@")[0].lower()
+    if name not in COMMANDS:
+        raise ArgError("По расписанию можно: " + ", ".join("/" + c for c in COMMANDS))
+    return due, every, cron, " ".join(["/" + name, *rest[1:]])
+
+
+def _clock_time(s: str, now: float, allow_date: bool) -> datetime:
+    # «18:00» — ближайшие 18:00 UTC; «2030-01-01T18:00» — точная дата (только для at).
+    try:
+        if "T" in s and allow_date:
+            when = datetime.strptime(s, "%Y-%m-%dT%H:%M").replace(tzinfo=timezone.utc)
+            if when.timestamp() <= now:
+                raise ArgError("Это время уже прошло")
+            if when.timestamp() > now + MAX_AHEAD:
+                raise ArgError(f"Не дальше, чем на {MAX_AHEAD // 86400} дней вперёд")
+            return when
+        hm = datetime.strptime(s, "%H:%M")
+    except ValueError:
+        raise ArgError(f"Не понял время «{s}»: ЧЧ:ММ" + (" или ГГГГ-ММ-ДДTЧЧ:ММ" if allow_date else "")) from None
+    base = datetime.fromtimestamp(now, timezone.utc)
+    when = base.replace(hour=hm.hour, minute=hm.minute, second=0, microsecond=0)
+    return when if when.timestamp() > now else when + timedelta(days=1)
+
+
+class TimerHeap:
+    # Двоичная куча сроков с индексом позиций: добавление, удаление и перенос
+    # задания — O(log n), ближайший срок — O(1). Цикл таймера смотрит только
+    # на вершину, поэтому сотни тысяч ожидающих заданий ничего не стоят.
+    def __init__(self):
+        self._heap = []    # [(срок, порядковый номер, ключ)]
+        self._pos = {}     # ключ → индекс в _heap
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, key):
+        return key in self._pos
+
+    def push(self, key, due: float):
+        if key in self._pos:
+            self.remove(key)
+        self._seq += 1
+        self._heap.append((due, self._seq, key))
+        self._pos[key] = len(self._heap) - 1
+        self._up(len(self._heap) - 1)
+
+    def remove(self, key):
+        i = self._pos.pop(key)
+        last = self._heap.pop()
+        if i < len(self._heap):
+            self._heap[i] = last
+            self._pos[last[2]] = i
+            self._down(self._up(i))
+
+    def peek(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float, limit: int) -> list:
+        keys = []
+        heap = self._heap
+        while heap and heap[0][0] <= now and len(keys) < limit:
+            key = heap[0][2]
+            self.remove(key)
+            keys.append(key)
+        return keys
+
+    def _up(self, i: int) -> int:
+        heap, pos = self._heap, self._pos
+        item = heap[i]
+        while i:
+            parent = (i - 1) >> 1
+            if heap[parent] <= item:
+                break
+            heap[i] = heap[parent]
+            pos[heap[i][2]] = i
+            i = parent
+        heap[i] = item
+        pos[item[2]] = i
+        return i
+
+    def _down(self, i: int):
+        heap, pos = self._heap, self._pos
+        n = len(heap)
+        item = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and heap[child + 1] < heap[child]:
+                child += 1
+            if item <= heap[child]:
+                break
+            heap[i] = heap[child]
+            pos[heap[i][2]] = i
+            i = child
+        heap[i] = item
+        pos[item[2]] = i
+
+
+class Scheduler:
+    # Отложенные и повторяющиеся команды чатов. Сроки — в TimerHeap, одна
+    # фоновая задача спит до ближайшего срока (добавление более раннего
+    # задания её будит). Сработавшие задания запускаются пачками до batch
+    # штук параллельно. С хранилищем (store.ChatStore) задания записываются
+    # как вид JOB и загружаются при старте; пропущенные за время простоя
+    # срабатывают сразу. owns(chat_id) отбирает чаты своего воркера.
+    def __init__(self, fire=None, store=None, clock=time.time, batch=BATCH, owns=None,
+                 max_per_chat=MAX_PER_CHAT):
+        self.fire = fire            # async fire(job): выполнить команду задания
+        self.store = store
+        self.clock = clock
+        self.batch = batch
+        self.owns = owns
+        self.max_per_chat = max_per_chat
+        self._timers = TimerHeap()
+        self._jobs = {}             # (chat_id, id) → Job
+        self._chats = {}            # chat_id → {id: Job}
+        self._task = None
+        self._wake = asyncio.Event()
+        self.stats = {"fired": 0, "failed": 0}
+
+    def __len__(self):
+        return len(self._jobs)
+
+    async def open(self):
+        if self.store is not None:
+            for chat_id, job_id, value in await self.store.scan(JOB):
+                if self.owns is None or self.owns(chat_id):
+                    self._insert(Job.load(chat_id, job_id, value))
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _insert(self, job: Job):
+        self._jobs[job.key] = job
+        self._chats.setdefault(job.chat_id, {})[job.id] = job
+        self._timers.push(job.key, job.due)
+
+    def _drop(self, job: Job):
+        del self._jobs[job.key]
+        chat = self._chats[job.chat_id]
+        del chat[job.id]
+        if not chat:
+            del self._chats[job.chat_id]
+
+    def add(self, chat_id, due: float, cmd: str, user_id=0, chat_type="private", every=None, cron=None) -> Job:
+        chat = self._chats.get(chat_id, {})
+        if len(chat) >= self.max_per_chat:
+            raise ArgError(f"Не больше {self.max_per_chat} заданий на чат, удалите лишние: /unschedule <id>")
+        job_id = os.urandom(3).hex()
+        while job_id in chat:
+            job_id = os.urandom(3).hex()
+        job = Job(chat_id, job_id, due, cmd, user_id, chat_type, every, cron)
+        head = self._timers.peek()
+        self._insert(job)
+        if self.store is not None:
+            self.store.put(chat_id, JOB, job.id, job.dump())
+        if head is None or due < head:
+            self._wake.set()
+        return job
+
+    def cancel(self, chat_id, job_id: str) -> bool:
+        job = self._chats.get(chat_id, {}).get(job_id)
+        if job is None:
+            return False
+        self._timers.remove(job.key)
+        self._drop(job)
+        if self.store is not None:
+            self.store.delete(chat_id, JOB, job_id)
+        return True
+
+    def jobs(self, chat_id) -> list:
+        return sorted(self._chats.get(chat_id, {}).values(), key=lambda job: job.due)
+
+    async def tick(self) -> int:
+        # Запускает все задания со сроком до clock(); возвращает их число.
+        now = self.clock()
+        fired = 0
+        while True:
+            keys = self._timers.pop_due(now, self.batch)
+            if not keys:
+                return fired
+            jobs = [self._jobs[key] for key in keys]
+            for job in jobs:
+                # следующий срок — до запуска: упавшая команда не сработает повторно
+                due = job.following(now)
+                if due is None:
+                    self._drop(job)
+                    if self.store is not None:
+                        self.store.delete(job.chat_id, JOB, job.id)
+                else:
+                    job.due = due
+                    self._timers.push(job.key, due)
+                    if self.store is not None:
+                        self.store.put(job.chat_id, JOB, job.id, job.dump())
+            results = await asyncio.gather(*[self.fire(job) for job in jobs], return_exceptions=True)
+            for job, result in zip(jobs, results):
+                if isinstance(result, Exception):
+                    self.stats["failed"] += 1
+                    log.error("Задание %s чата %s (%s) упало: %r", job.id, job.chat_id, job.cmd, result)
+            self.stats["fired"] += len(jobs)
+            fired += len(jobs)
+
+    async def _run(self):
+        while True:
+            head = self._timers.peek()
+            delay = None if head is None else max(0.0, head - self.clock())
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.tick()
+            except Exception:
+                log.exception("Ошибка планировщика")
@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import struct
+import tempfile
+from collections import deque
+from telegram import Bot, Update
+from telegram.ext import BaseUpdateProcessor
+from webhook import WebhookServer
+
+HEADER = struct.Struct("!I")
+CHAT_KEYS = ("message", "edited_message", "channel_post", "edited_channel_post",
+             "business_message", "edited_business_message", "my_chat_member",
+             "chat_member", "chat_join_request", "message_reaction")
+USER_KEYS = ("inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query", "poll_answer")
+# Модули, которые сервер forkserver загружает один раз до запуска воркеров.
+# Отложенные модули бота идут раньше него, чтобы попасть в память уже выполненными;
+# httpcore httpx импортирует только при создании первого клиента.
+PRELOAD = ("telegram.ext", "httpcore", "numpy", "dotenv", "odds", "render", "outbox", "ratelimit", "store",
+           "bot_randomlab", "shard")
+
+log = logging.getLogger(__name__)
+
+
+def chat_key(data: dict) -> int:
+    # Ключ шардирования по «сырому» JSON апдейта: id чата, а если чата нет —
+    # id пользователя. Полный разбор в Update на входе не нужен.
+    for key in CHAT_KEYS:
+        obj = data.get(key)
+        if obj and "chat" in obj:
+            return obj["chat"]["id"]
+    cq = data.get("callback_query")
+    if cq:
+        msg = cq.get("message")
+        return msg["chat"]["id"] if msg else cq["from"]["id"]
+    for key in USER_KEYS:
+        obj = data.get(key)
+        if obj:
+            return (obj.get("from") or obj.get("user") or {}).get("id", 0)
+    return data.get("update_id", 0)
+
+
+def shard_for(data: dict, shards: int) -> int:
+    return chat_key(data) % shards
+
+
+class ChatOrderedProcessor(BaseUpdateProcessor):
+    # Обрабатывает апдейты параллельно, но апдейты одного чата — строго по очереди.
+    # В отличие от BaseUpdateProcessor.process_update слот берётся уже под замком
+    # чата: иначе апдейты одного заспамившего чата заняли бы все слоты, ожидая
+    # свой же замок, и остальные чаты встали бы.
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}
+
+    async def process_update(self, update, coroutine):
+        chat = getattr(update, "effective_chat", None)
+        if chat is None:
+            async with self._semaphore:
+                await coroutine
+            return
+        entry = self._locks.get(chat.id)
+        if entry is None:
+            entry = self._locks[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._semaphore:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[chat.id]
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+async def _read_frames(reader):
+    while True:
+        try:
+            head = await reader.readexactly(HEADER.size)
+            body = await reader.readexactly(HEADER.unpack(head)[0])
+        except asyncio.IncompleteReadError:
+            return
+        yield body
+
+
+async def _worker(index: int, sock_path: str, shards: int):
+    import bot_randomlab as br
+    concurrent = int(os.getenv("CONCURRENT_UPDATES", "64"))
+    app = br.app_from_env(webhook=True, shards=shards, concurrent_updates=ChatOrderedProcessor(concurrent),
+                          shard_index=index)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    loop.add_signal_handler(signal.SIGINT, lambda: None)  # останавливает супервизор
+
+    readers = set()
+
+    async def on_connect(reader, writer):
+        readers.add(asyncio.current_task())
+        try:
+            async for body in _read_frames(reader):
+                await app.update_queue.put(Update.de_json(json.loads(body), app.bot))
+        finally:
+            readers.discard(asyncio.current_task())
+            writer.close()
+
+    async with app:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        server = await asyncio.start_unix_server(on_connect, sock_path)
+        log.info("Воркер %s слушает %s", index, sock_path)
+        await stop.wait()
+        server.close()
+        # супервизор закрывает сокет перед SIGTERM — дочитываем то, что уже отправлено
+        if readers:
+            await asyncio.wait(readers, timeout=5)
+        await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+    if app.post_shutdown:
+        await app.post_shutdown(app)
+
+
+def worker_main(index: int, sock_path: str, shards: int):
+    asyncio.run(_worker(index, sock_path, shards))
+
+
+class ShardSupervisor:
+    # Запускает N процессов-воркеров, перезапускает упавшие и раздаёт им
+    # апдейты по chat_id: все апдейты одного чата попадают в один процесс
+    # через один Unix-сокет, поэтому их порядок сохраняется.
+    # По умолчанию воркеры запускаются через forkserver: импорты (PRELOAD)
+    # выполняются один раз, а каждый воркер — в том числе перезапущенный —
+    # получается fork'ом уже прогретого процесса. start_method="spawn" —
+    # каждый воркер импортирует всё заново.
+    def __init__(self, workers: int, target=worker_main, restart_delay=0.5, max_buffer=10000,
+                 start_method="forkserver", preload=PRELOAD):
+        self.workers = workers
+        self.target = target
+        self.restart_delay = restart_delay
+        self.max_buffer = max_buffer
+        self.sock_dir = tempfile.mkdtemp(prefix="randomlab-")
+        self.paths = [os.path.join(self.sock_dir, f"worker-{i}.sock") for i in range(workers)]
+        self.procs = [None] * workers
+        self.restarts = [0] * workers
+        self.routed = [0] * workers
+        self._writers = [None] * workers
+        self._buffers = [deque() for _ in range(workers)]
+        self._ctx = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            self._ctx.set_forkserver_preload(list(preload))
+        self._tasks = []
+        self._stopping = False
+
+    def _spawn(self, i: int):
+        if os.path.exists(self.paths[i]):
+            os.unlink(self.paths[i])
+        proc = self._ctx.Process(target=self.target, args=(i, self.paths[i], self.workers),
+                                 name=f"randomlab-worker-{i}", daemon=True)
+        proc.start()
+        self.procs[i] = proc
+
+    async def start(self):
+        for i in range(self.workers):
+            self._spawn(i)
+        self._tasks = [asyncio.create_task(self._connect_loop(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._monitor()))
+
+    async def _monitor(self):
+        while not self._stopping:
+            for i, proc in enumerate(self.procs):
+                if proc.exitcode is not None and not self._stopping:
+                    log.warning("Воркер %s завершился с кодом %s, перезапуск", i, proc.exitcode)
+                    self.restarts[i] += 1
+                    await asyncio.sleep(self.restart_delay)
+                    self._spawn(i)
+            await asyncio.sleep(0.2)
+
+    async def _connect_loop(self, i: int):
+        while not self._stopping:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.paths[i])
+            except OSError:
+                await asyncio.sleep(0.05)
+                continue
+            buf = self._buffers[i]
+            while buf:
+                writer.write(buf.popleft())
+            self._writers[i] = writer
+            try:
+                await reader.read()  # воркер ничего не пишет: EOF значит, что он упал
+            except ConnectionError:
+                pass  # убитый воркер может оборвать соединение с RST вместо EOF
+            self._writers[i] = None
+            writer.close()
+
+    async def route(self, data: dict, body: bytes):
+        i = shard_for(data, self.workers)
+        frame = HEADER.pack(len(body)) + body
+        writer = self._writers[i]
+        if writer is not None and not writer.is_closing():
+            try:
+                writer.write(frame)
+                await writer.drain()
+                self.routed[i] += 1
+                return True
+            except ConnectionError:
+                self._writers[i] = None
+        if len(self._buffers[i]) < self.max_buffer:
+            # воркер перезапускается — копим апдейты в порядке поступления
+            self._buffers[i].append(frame)
+        else:
+            return False
+        self.routed[i] += 1
+        return True
+
+    async def stop(self, timeout=10.0):
+        self._stopping = True
+        for t in self._tasks:
+            t.cancel()
+        for writer in self._writers:
+            if writer is not None:
+                writer.close()
+        for proc in self.procs:
+            if proc is not None and proc.is_alive():
+                proc.terminate()  # SIGTERM: воркер дорабатывает свою очередь
+        loop = asyncio.get_running_loop()
+        for proc in self.procs:
+            if proc is not None:
+                await loop.run_in_executor(None, proc.join, timeout)
+                if proc.is_alive():
+                    proc.kill()
+        shutil.rmtree(self.sock_dir, ignore_errors=True)
+
+
+async def serve(workers: int, listen="0.0.0.0", port=8443, url_path="telegram", secret_token=None,
+                webhook_url=None, drain_timeout=10.0, stop_event=None):
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    supervisor = ShardSupervisor(workers, start_method=os.getenv("SHARD_START", "forkserver"))
+    await supervisor.start()
+    server = WebhookServer(None, listen, port, url_path, secret_token, sink=supervisor.route)
+    await server.start()
+    if webhook_url:
+        bot = Bot(os.environ["TELEGRAM_BOT_TOKEN"], base_url=os.getenv("TELEGRAM_BASE_URL") or "https://api.telegram.org/bot")
+        async with bot:
+            await bot.set_webhook(url=webhook_url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES)
+    try:
+        await stop_event.wait()
+    finally:
+        await server.stop(drain_timeout)
+        await supervisor.stop(drain_timeout)
+    return supervisor
+
+
+def run(workers: int, **kwargs):
+    asyncio.run(serve(workers, **kwargs))
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+LIST = "list"          # сохранённые списки: name → текст «a|b:2|c»
+SETTING = "setting"    # настройки чата: dice, password, ...
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_state (
+    chat_id INTEGER NOT NULL,
+    kind    TEXT    NOT NULL,
+    name    TEXT    NOT NULL,
+    value   TEXT    NOT NULL,
+    PRIMARY KEY (chat_id, kind, name)
+) WITHOUT ROWID
+"""
+
+log = logging.getLogger(__name__)
+
+
+class ChatStore:
+    # Состояние чатов в SQLite (WAL). Чтение — через LRU-кэш: чат
+    # загружается одним запросом по первичному ключу при первом обращении,
+    # поэтому старт не зависит от числа чатов в базе. Запись — отложенная:
+    # put/delete меняют кэш и копят изменения, фоновая задача сбрасывает их
+    # пачкой в одной транзакции раз в flush_interval или по batch_size.
+    # Все обращения к SQLite идут через один поток, цикл событий не блокируется.
+    def __init__(self, path: str, cache_size=10000, flush_interval=1.0, batch_size=500):
+        self.path = path
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._cache = OrderedDict()
+        self._dirty = {}          # (chat_id, kind, name) → value; None — удалить
+        self._flushing = {}       # пачка, которая сейчас пишется в базу
+        self._db = None
+        self._executor = None
+        self._task = None
+        self._wake = None
+        self.stats = {"hits": 0, "misses": 0, "flushes": 0, "written": 0}
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(SCHEMA)
+        return db
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def open(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="randomlab-store")
+        self._db = await self._run(self._connect)
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._flusher())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db is not None:
+            await self.flush()
+            await self._run(self._db.close)
+            self._db = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _load(self, chat_id):
+        rows = self._db.execute("SELECT kind, name, value FROM chat_state WHERE chat_id = ?", (chat_id,))
+        return {(kind, name): value for kind, name, value in rows}
+
+    async def state(self, chat_id) -> dict:
+        # Всё состояние чата: {(kind, name): value}.
+        state = self._cache.get(chat_id)
+        if state is not None:
+            self._cache.move_to_end(chat_id)
+            self.stats["hits"] += 1
+            return state
+        self.stats["misses"] += 1
+        state = await self._run(self._load, chat_id)
+        cached = self._cache.get(chat_id)
+        if cached is not None:
+            return cached  # пока шёл запрос, чат загрузила другая команда
+        # изменения, ещё не сброшенные в базу, важнее прочитанного
+        for (cid, kind, name), value in [*self._flushing.items(), *self._dirty.items()]:
+            if cid == chat_id:
+                if value is None:
+                    state.pop((kind, name), None)
+                else:
+                    state[(kind, name)] = value
+        self._cache[chat_id] = state
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return state
+
+    def _scan(self, kind: str):
+        return self._db.execute("SELECT chat_id, name, value FROM chat_state WHERE kind = ?", (kind,)).fetchall()
+
+    async def scan(self, kind: str) -> list:
+        # Все записи вида kind по всем чатам: [(chat_id, name, value)]. Полный
+        # просмотр таблицы — для загрузки при старте, не для горячего пути.
+        rows = {(chat_id, name): value for chat_id, name, value in await self._run(self._scan, kind)}
+        for (cid, k, name), value in [*self._flushing.items(), *self._dirty.items()]:
+            if k == kind:
+                if value is None:
+                    rows.pop((cid, name), None)
+                else:
+                    rows[(cid, name)] = value
+        return [(chat_id, name, value) for (chat_id, name), value in rows.items()]
+
+    async def get(self, chat_id, kind: str, name: str, default=None):
+        return (await self.state(chat_id)).get((kind, name), default)
+
+    async def names(self, chat_id, kind: str) -> dict:
+        return {name: value for (k, name), value in (await self.state(chat_id)).items() if k == kind}
+
+    def put(self, chat_id, kind: str, name: str, value: str):
+        state = self._cache.get(chat_id)
+        if state is not None:
+            state[(kind, name)] = value
+        self._mark((chat_id, kind, name), value)
+
+    def delete(self, chat_id, kind: str, name: str):
+        state = self._cache.get(chat_id)
+        if state is not None:
+            state.pop((kind, name), None)
+        self._mark((chat_id, kind, name), None)
+
+    def _mark(self, key, value):
+        self._dirty[key] = value
+        if len(self._dirty) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    def _write(self, batch: dict):
+        upserts = [(c, k, n, v) for (c, k, n), v in batch.items() if v is not None]
+        deletes = [key for key, v in batch.items() if v is None]
+        db = self._db
+        db.execute("BEGIN")
+        try:
+            if upserts:
+                db.executemany("INSERT OR REPLACE INTO chat_state VALUES (?, ?, ?, ?)", upserts)
+            if deletes:
+                db.executemany("DELETE FROM chat_state WHERE chat_id = ? AND kind = ? AND name = ?", deletes)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    async def flush(self):
+        if not self._dirty or self._db is None:
+            return
+        batch = self._flushing = self._dirty
+        self._dirty = {}
+        try:
+            await self._run(self._write, batch)
+        except Exception:
+            log.exception("Не удалось сохранить %s изменений, повторим позже", len(batch))
+            for key, value in batch.items():
+                self._dirty.setdefault(key, value)  # более новые изменения не затираем
+            return
+        finally:
+            self._flushing = {}
+        self.stats["flushes"] += 1
+        self.stats["written"] += len(batch)
+
+    async def _flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
@@ -0,0 +1,114 @@
+import asyncio
+import io
+import tempfile
+from itertools import chain
+from telegram import InputFile
+from telegram.constants import MessageLimit
+from router import reply
+
+MAX_MESSAGES = 3                 # больше частей — отправляем одним файлом
+SPOOL_SIZE = 1 << 20             # до 1 МиБ файл собирается в памяти, дальше — на диске
+
+
+def chunk_text(pieces, sep=" ", limit=MessageLimit.MAX_TEXT_LENGTH):
+    # Склеивает поток строк через sep в куски не длиннее limit, разрезая
+    # только между элементами (слишком длинный элемент режется по limit).
+    # Пустые элементы и пустые остатки разрезания пропускаются — иначе
+    # следующий кусок начался бы с лишнего sep.
+    buf = []
+    size = 0
+    for piece in pieces:
+        while len(piece) > limit:
+            if buf:
+                yield sep.join(buf)
+                buf, size = [], 0
+            yield piece[:limit]
+            piece = piece[limit:]
+        if not piece:
+            continue
+        extra = len(piece) + (len(sep) if buf else 0)
+        if size + extra > limit:
+            yield sep.join(buf)
+            buf, size = [piece], len(piece)
+        else:
+            buf.append(piece)
+            size += extra
+    if buf:
+        yield sep.join(buf)
+
+
+class Prepared:
+    # Результат, готовый к отправке: до max_messages кусков текста (chunks)
+    # или собранный файл (file), открытый и перемотанный в начало.
+    __slots__ = ("chunks", "file")
+
+    def __init__(self, chunks=None, file=None):
+        self.chunks = chunks
+        self.file = file
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def _prepare(pieces, sep, max_messages) -> Prepared:
+    chunks = chunk_text(pieces, sep)
+    head = []
+    for chunk in chunks:
+        head.append(chunk)
+        if len(head) > max_messages:
+            break
+    else:
+        return Prepared(chunks=head)
+
+    f = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        writer = io.TextIOWrapper(f, encoding="utf-8", newline="")
+        first = True
+        for chunk in chain(head, chunks):
+            if not first:
+                writer.write(sep)
+            writer.write(chunk)
+            first = False
+        writer.flush()
+        writer.detach()
+        f.seek(0)
+    except BaseException:
+        f.close()
+        raise
+    return Prepared(file=f)
+
+
+async def prepare(pieces, sep=" ", max_messages=MAX_MESSAGES) -> Prepared:
+    # Весь проход по генератору (генерация, форматирование, запись файла) —
+    # в отдельном потоке: миллион строк не держит цикл событий. Генератор не
+    # должен делить состояние с кодом в цикле (см. RandomEngine.fork).
+    return await asyncio.to_thread(_prepare, pieces, sep, max_messages)
+
+
+async def send_prepared(update, context, prepared: Prepared, filename="result.txt") -> int:
+    # Файл отдаётся HTTP-клиенту потоком, без чтения целиком.
+    try:
+        if prepared.file is None:
+            for chunk in prepared.chunks:
+                await reply(update, context, chunk)
+            return len(prepared.chunks)
+        await context.bot.send_document(chat_id=update.effective_chat.id,
+                                        document=InputFile(prepared.file, filename=filename,
+                                                           read_file_handle=False))
+        return 0
+    finally:
+        prepared.close()
+
+
+async def send_stream(update, context, pieces, sep=" ", filename="result.txt", max_messages=MAX_MESSAGES,
+                      offload=False):
+    # Отправляет результат из генератора: до max_messages сообщений по 4096
+    # символов, а если частей больше — одним текстовым файлом. Файл
+    # собирается во временном файле (до SPOOL_SIZE — в памяти). С offload
+    # генератор проходится в отдельном потоке (prepare).
+    if offload:
+        prepared = await prepare(pieces, sep, max_messages)
+    else:
+        prepared = _prepare(pieces, sep, max_messages)
+    return await send_prepared(update, context, prepared, filename)
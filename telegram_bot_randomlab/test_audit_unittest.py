@@ -0,0 +1,229 @@
+import contextlib
+import hashlib
+import hmac
+import io
+import json
+import os
+import random
+import struct
+import tempfile
+import unittest
+from collections import Counter
+from unittest.mock import AsyncMock, patch
+import audit
+import bot_randomlab as br
+import verify_audit
+from audit import AuditLog, Auditor, DrawStream, derive_key, draw, result_digest, verify
+from router import ArgError
+from test_randomlab_unittest import mock_update
+
+
+class TestDrawStream(unittest.TestCase):
+    # Проверяет, что поток — это HMAC-SHA512(key, счётчик), и не зависит от размера пополнения
+    def test_counter_mode(self):
+        key = b"k" * 32
+        first = struct.unpack("<8Q", hmac.digest(key, (0).to_bytes(8, "big"), "sha512"))
+        s = DrawStream(key, blocks=1)
+        self.assertEqual([s._word() for _ in range(8)], list(first))
+        a, b = DrawStream(key, blocks=1), DrawStream(key, blocks=7)
+        self.assertEqual([a._word() for _ in range(100)], [b._word() for _ in range(100)])
+
+    # Свойство: перестановка полная, воспроизводимая и равномерная (3! вариантов)
+    def test_permutation(self):
+        key = derive_key(b"seed", "permute", "salt", "1000")
+        perm = list(DrawStream(key).iter_permutation(1000, block=64))
+        self.assertEqual(sorted(perm), list(range(1, 1001)))
+        self.assertEqual(perm, list(DrawStream(key).iter_permutation(1000)))
+        self.assertNotEqual(perm, list(DrawStream(derive_key(b"seed", "permute", "salt2", "1000")).iter_permutation(1000)))
+        rnd = random.Random(1)
+        counts = Counter(tuple(DrawStream(rnd.randbytes(16)).iter_permutation(3)) for _ in range(6000))
+        self.assertEqual(len(counts), 6)
+        self.assertTrue(all(850 < c < 1150 for c in counts.values()), counts)
+
+    # Проверяет розыгрыши по видам и ошибки в списке до первого результата
+    def test_draw(self):
+        key = derive_key(b"seed", "sample", "s", "a:5|b|c|d", 2)
+        picked = list(draw("sample", DrawStream(key), "a:5|b|c|d", 2))
+        self.assertEqual(len(set(picked)), 2)
+        self.assertEqual(picked, list(draw("sample", DrawStream(key), "a:5|b|c|d", 2)))
+        self.assertEqual(sorted(draw("shuffle", DrawStream(key), "x|y|z")), ["x", "y", "z"])
+        self.assertIn(next(draw("choose", DrawStream(key), "x|y|z")), "xyz")
+        with self.assertRaises(br.ArgError):
+            draw("sample", DrawStream(key), "a|b", 3)
+        with self.assertRaises(br.ArgError):
+            draw("choose", DrawStream(key), " | ")
+
+
+class TestAuditLog(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "audit.jsonl")
+
+    # Проверяет цепочку: после повторного открытия нумерация и хэши продолжаются
+    async def test_chain(self):
+        for _ in range(2):
+            log = AuditLog(self.path)
+            await log.open()
+            await log.append(kind="commit", chat=1, commit="00")
+            await log.close()
+        with open(self.path, "rb") as f:
+            lines = f.read().splitlines()
+        self.assertEqual([json.loads(line)["n"] for line in lines], [1, 2])
+        self.assertEqual(json.loads(lines[1])["prev"], hashlib.sha256(lines[0]).hexdigest())
+
+    # Проверяет, что неудачная запись (в том числе частичная) не рвёт цепочку для следующих записей
+    async def test_failed_write(self):
+        log = AuditLog(self.path)
+        await log.open()
+        try:
+            await log.append(kind="commit", chat=1, commit="00")
+            real = log._file
+
+            class Broken:
+                def seek(self, *args):
+                    return real.seek(*args)
+
+                def write(self, data):
+                    real.write(bytes(data[:10]))
+                    raise OSError("disk full")
+
+                def truncate(self, size):
+                    return real.truncate(size)
+            log._file = Broken()
+            with self.assertRaises(OSError):
+                await log.append(kind="commit", chat=1, commit="11")
+            log._file = real
+            await log.append(kind="commit", chat=1, commit="22")
+        finally:
+            await log.close()
+        with open(self.path, "rb") as f:
+            lines = f.read().splitlines()
+        self.assertEqual([json.loads(line)["commit"] for line in lines], ["00", "22"])
+        self.assertEqual([p for _, p in verify(lines)], [[], []])
+
+    # Проверяет полный цикл: коммит, розыгрыш, проверка журнала и обнаружение подделки
+    async def test_verify(self):
+        items = "|".join(map(str, range(50)))   # чужая соль не даст ту же перестановку (шанс 1/50!)
+        auditor = Auditor(self.path)
+        await auditor.open()
+        try:
+            entry = await auditor.commit(7)
+            seed = auditor.pending(7)
+            self.assertEqual(audit.commitment(seed), entry["commit"])
+            key = derive_key(seed, "shuffle", "salt", items)
+            out = result_digest(draw("shuffle", DrawStream(key), items))
+            await auditor.record(7, seed, "shuffle", "salt", items, None, out)
+            self.assertIsNone(auditor.pending(7))
+            with self.assertRaises(ArgError):   # зерно одноразовое
+                await auditor.record(7, seed, "shuffle", "salt", items, None, out)
+        finally:
+            await auditor.close()
+        with open(self.path, "rb") as f:
+            lines = f.read().splitlines()
+        self.assertEqual([p for _, p in verify(lines)], [[], []])
+
+        forged = json.loads(lines[1])
+        forged["salt"] = "other"
+        problems = [p for _, p in verify([lines[0], json.dumps(forged).encode()])]
+        self.assertEqual(problems[1], ["результат не совпадает"])
+        problems = [p for _, p in verify([lines[1]])]
+        self.assertIn("цепочка хэшей нарушена", problems[0])
+        self.assertIn("коммита нет раньше в журнале или он уже использован", problems[0])
+
+
+class TestAuditedCommands(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "audit.jsonl")
+        self.auditor = Auditor(self.path)
+        await self.auditor.open()
+        patcher = patch.object(br, "AUDIT", self.auditor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        await self.auditor.close()
+
+    async def run_cmd(self, text):
+        ctx = AsyncMock()
+        await br.ROUTER.dispatch(mock_update(text), ctx)
+        return [c.kwargs["text"] for c in ctx.bot.send_message.call_args_list], ctx
+
+    # Проверяет /commit → /shuffle !соль: результат, раскрытое зерно и одноразовость коммита
+    async def test_commit_reveal(self):
+        texts, _ = await self.run_cmd("/shuffle !abc a|b|c")
+        self.assertIn("Сначала /commit", texts[0])
+        texts, _ = await self.run_cmd("/commit")
+        commit = texts[0].split(" = ")[1].split("\n")[0]
+        texts, _ = await self.run_cmd("/shuffle !abc a|b|c")
+        self.assertEqual(sorted(texts[0].split(" | ")), ["a", "b", "c"])
+        self.assertIn(f"коммит {commit}", texts[1])
+        seed = bytes.fromhex(texts[1].split("зерно: ")[1].split("\n")[0])
+        self.assertEqual(hashlib.sha256(seed).hexdigest(), commit)
+        texts, _ = await self.run_cmd("/choose !abc a|b|c")
+        self.assertIn("Сначала /commit", texts[0])
+        texts, _ = await self.run_cmd("/choose a|!b")  # обычный список с «!»
+        self.assertIn(texts[0], ["a", "!b"])
+
+    # Проверяет /permute n !соль на большом n: файл, а журнал проверяется утилитой
+    async def test_permute_file(self):
+        await self.run_cmd("/commit")
+        texts, ctx = await self.run_cmd("/permute 5000 !round1")
+        ctx.bot.send_document.assert_called_once()
+        self.assertIn("sha256 результата", texts[-1])
+        await self.run_cmd("/commit")
+        texts, _ = await self.run_cmd("/sample 5 !x a|b")
+        self.assertEqual(texts, ["k должно быть в диапазоне 0..len(items)"])
+        await self.run_cmd("/sample 1 !x a|b")
+        await self.auditor.close()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            code = verify_audit.main([self.path, "--show", "4"])
+        self.assertEqual(code, 0, out.getvalue())
+        self.assertIn("#2 permute чат 1: ok", out.getvalue())
+        self.assertIn("журнал в порядке", out.getvalue())
+
+    # Проверяет, что розыгрыш генерируется один раз, а хэш в журнале совпадает с отправленным файлом
+    async def test_single_pass(self):
+        await self.run_cmd("/commit")
+        ctx = AsyncMock()
+
+        async def capture(chat_id, document):
+            capture.body = document.input_file_content.read()
+        ctx.bot.send_document.side_effect = capture
+        with patch.object(audit, "draw", wraps=audit.draw) as spy:
+            await br.ROUTER.dispatch(mock_update("/permute 5000 !once"), ctx)
+        spy.assert_called_once()
+        text = ctx.bot.send_message.call_args.kwargs["text"]
+        out = text.split("sha256 результата: ")[1]
+        self.assertEqual(hashlib.sha256(b"\n".join(capture.body.split())).hexdigest(), out)
+
+    # Проверяет порядок: запись в журнал раньше отправки, а сбой записи не сжигает коммит
+    async def test_record_before_send(self):
+        await self.run_cmd("/commit")
+        seed = self.auditor.pending(1)
+        with patch.object(self.auditor.log, "append", AsyncMock(side_effect=OSError("disk"))):
+            with self.assertRaises(OSError):
+                await self.run_cmd("/shuffle !abc a|b|c")
+        self.assertEqual(self.auditor.pending(1), seed)
+        with patch.object(br, "send_prepared", AsyncMock(side_effect=RuntimeError("network"))):
+            with self.assertRaises(RuntimeError):
+                await self.run_cmd("/shuffle !abc a|b|c")
+        self.assertIsNone(self.auditor.pending(1))
+        await self.auditor.close()
+        with open(self.path, "rb") as f:
+            lines = f.read().splitlines()
+        self.assertEqual([json.loads(line)["kind"] for line in lines], ["commit", "shuffle"])
+        self.assertEqual([p for _, p in verify(lines)], [[], []])
+
+    # Проверяет, что без AUDIT_LOG розыгрыши с проверкой выключены
+    async def test_disabled(self):
+        with patch.object(br, "AUDIT", None):
+            texts, _ = await self.run_cmd("/commit")
+        self.assertIn("AUDIT_LOG", texts[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
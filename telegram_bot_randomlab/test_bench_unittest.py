@@ -0,0 +1,40 @@
+import unittest
+import bench_randomlab as bench
+
+class TestBenchHelpers(unittest.TestCase):
+    # Проверяет разбор смеси команд и отказ на неизвестной команде
+    def test_parse_mix(self):
+        self.assertEqual(bench.parse_mix("roll=3,coin"), {"roll": 3.0, "coin": 1.0})
+        self.assertEqual(set(bench.parse_mix("")), set(bench.COMMANDS))
+        with self.assertRaises(SystemExit):
+            bench.parse_mix("nope=1")
+
+    # Проверяет формы нагрузки: равномерная, пачками и пуассоновская
+    def test_schedule(self):
+        self.assertEqual(bench.schedule("steady", 3, 10, 0, 0, 1), [0.0, 0.1, 0.2])
+        self.assertEqual(bench.schedule("burst", 5, 0, 2, 0.5, 1), [0, 0, 0.5, 0.5, 1.0])
+        times = bench.schedule("poisson", 100, 1000, 0, 0, 1)
+        self.assertEqual(times, sorted(times))
+
+    # Проверяет, что сравнение с базовой линией находит деградацию
+    def test_compare(self):
+        base = {"updates_per_sec": 1000, "p99_us": 100, "params": {},
+                "commands": {"roll": {"p50_us": 100, "p99_us": 200, "alloc_bytes": 1000}}}
+        same = {"updates_per_sec": 950, "p99_us": 110, "params": {},
+                "commands": {"roll": {"p50_us": 110, "p99_us": 220, "alloc_bytes": 1000}}}
+        worse = {"updates_per_sec": 500, "p99_us": 500, "params": {},
+                 "commands": {"roll": {"p50_us": 400, "p99_us": 900, "alloc_bytes": 9000}}}
+        self.assertEqual(bench.compare(same, base, 0.25), [])
+        self.assertEqual(len(bench.compare(worse, base, 0.25)), 4)
+
+class TestBenchRun(unittest.IsolatedAsyncioTestCase):
+    # Проверяет прогон небольшого потока через Application с заглушкой Bot API
+    async def test_run_stream(self):
+        stream = bench.make_stream(bench.parse_mix("roll,coin,password"), 60, 5, 1)
+        rate, total, per_cmd = await bench.run_stream(stream, [0.0] * 60, 8)
+        self.assertEqual(total.count, 60)
+        self.assertEqual(set(per_cmd), {"roll", "coin", "password"})
+        self.assertGreater(rate, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import uuid
+from unittest.mock import AsyncMock, Mock, patch
+import bot_randomlab as br
+import bulk
+from entropy import EntropyPool
+from router import ArgError
+from test_randomlab_unittest import mock_update
+
+def sent_file(ctx):
+    doc = ctx.bot.send_document.call_args.kwargs["document"]
+    return doc.filename, doc.input_file_content.decode("ascii")
+
+
+class TestBulk(unittest.TestCase):
+    # Проверяет UUID из одного чтения os.urandom: совпадают с uuid.UUID(bytes=..., version=4)
+    def test_uuids(self):
+        reads = []
+
+        def urandom(n):
+            reads.append(n)
+            return bytes(range(256)) * (n // 256) + bytes(range(n % 256))
+        data = bulk.uuids(40, b"uuid\n", urandom=urandom)
+        raw = urandom(16 * 40)
+        expected = [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, len(raw), 16)]
+        self.assertEqual(data.decode().split("\n"), ["uuid", *expected, ""])
+        self.assertEqual(reads[0], 16 * 40)
+
+    # Проверяет пароли и цвета: длина, алфавит, заранее известный размер буфера
+    def test_passwords_colors(self):
+        data = bulk.passwords(EntropyPool(prefetch=0), 16, 500)
+        lines = data.decode().split("\n")[:-1]
+        self.assertEqual((len(lines), len(data)), (500, 17 * 500))
+        self.assertTrue(all(len(p) == 16 and p.isalnum() for p in lines))
+        self.assertGreater(len(set(lines)), 499)
+        colors = bulk.colors(100).decode().split()
+        self.assertEqual(len(colors), 100)
+        self.assertTrue(all(len(c) == 7 and c[0] == "#" and int(c[1:], 16) >= 0 and c == c.upper() for c in colors))
+
+    # Проверяет ограничение памяти на запрос: ошибка до чтения энтропии
+    def test_cap(self):
+        urandom = Mock()
+        with patch.object(bulk, "MAX_BYTES", 1000):
+            with self.assertRaises(ArgError):
+                bulk.uuids(100, urandom=urandom)
+            self.assertEqual(len(bulk.uuids(27)), 27 * 37)
+        urandom.assert_not_called()
+
+
+class TestBulkCommands(unittest.IsolatedAsyncioTestCase):
+    async def run_cmd(self, text):
+        ctx = AsyncMock()
+        await br.ROUTER.dispatch(mock_update(text), ctx)
+        return ctx
+
+    # Проверяет /uuid 10000: один файл из 10000 различных UUID v4
+    async def test_uuid_file(self):
+        ctx = await self.run_cmd("/uuid 10000")
+        name, text = sent_file(ctx)
+        lines = text.split()
+        self.assertEqual((name, len(lines), len(set(lines))), ("uuid_10000.txt", 10000, 10000))
+        self.assertTrue(all(uuid.UUID(v).version == 4 for v in lines[:100]))
+
+    # Проверяет /password 16 x5000 csv и /color 3: заголовок CSV, мелкий объём — сообщением
+    async def test_password_color(self):
+        ctx = await self.run_cmd("/password 16 x5000 csv")
+        name, text = sent_file(ctx)
+        lines = text.split("\n")
+        self.assertEqual((name, lines[0], len(lines)), ("passwords_16x5000.csv", "password", 5002))
+        self.assertEqual(len(lines[1]), 16)
+        ctx = await self.run_cmd("/color 3")
+        self.assertRegex(ctx.bot.send_message.call_args.kwargs["text"], r"^(#[0-9A-F]{6}\n){2}#[0-9A-F]{6}$")
+        ctx.bot.send_document.assert_not_called()
+
+    # Проверяет ошибки разбора: лишнее слово, размер сверх лимита
+    async def test_errors(self):
+        ctx = await self.run_cmd("/uuid 5 6")
+        self.assertIn("Использование: /uuid", ctx.bot.send_message.call_args.kwargs["text"])
+        ctx = await self.run_cmd("/uuid 1000000")
+        self.assertIn("Количество должно быть 1..", ctx.bot.send_message.call_args.kwargs["text"])
+        ctx = await self.run_cmd("/password 64 x100000")
+        self.assertIn("Слишком большой файл", ctx.bot.send_message.call_args.kwargs["text"])
+        ctx.bot.send_document.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import random
+import unittest
+from unittest.mock import AsyncMock
+import bot_randomlab as br
+from dice import BinOp, Dice, Group, Num, compile_roll, evaluate, run
+from rng import PythonEngine, make_engine
+from router import ArgError
+from test_randomlab_unittest import mock_update
+
+def bounds(node):
+    # Минимум и максимум выражения без делений и унарного минуса.
+    if isinstance(node, Num):
+        return node.value, node.value
+    if isinstance(node, Group):
+        return bounds(node.x)
+    if isinstance(node, Dice):
+        k = node.n if node.keep is None else node.count
+        return k, k * node.m
+    (a, b), (c, d) = bounds(node.left), bounds(node.right)
+    if node.op == "+":
+        return a + c, b + d
+    if node.op == "-":
+        return a - d, b - c
+    products = (a * c, a * d, b * c, b * d)
+    return min(products), max(products)
+
+def random_expr(r, depth=0):
+    # Случайное выражение: текст и ожидаемое дерево.
+    if depth > 2 or r.random() < 0.4:
+        if r.random() < 0.3:
+            v = r.randint(0, 50)
+            return str(v), Num(v)
+        n, m = r.randint(1, 8), r.choice([2, 4, 6, 8, 10, 12, 20, 100])
+        mod = r.choice(["", "kh", "kl"])
+        k = r.randint(1, n) if mod else 0
+        return f"{n}d{m}{mod}{k or ''}", Dice(n, m, mod or None, k)
+    op = r.choice("+-*")
+    sides = []
+    for _ in range(2):
+        t, node = random_expr(r, depth + 1)
+        if isinstance(node, BinOp):
+            t, node = f"({t})", Group(node)
+        sides.append((t, node))
+    (lt, ln), (rt, rn) = sides
+    return f"{lt} {op} {rt}", BinOp(op, ln, rn)
+
+class CountingEngine(PythonEngine):
+    def __init__(self, seed=None):
+        super().__init__(seed)
+        self.calls = 0
+
+    def randbelow_many(self, n, count):
+        self.calls += 1
+        return super().randbelow_many(n, count)
+
+class TestDiceProperties(unittest.TestCase):
+    # Свойство: случайное выражение разбирается в ожидаемое дерево, а значение лежит в его границах
+    def test_random_expressions(self):
+        r = random.Random(2024)
+        rng = make_engine(1)
+        for _ in range(300):
+            text, tree = random_expr(r)
+            program = compile_roll(text)
+            self.assertEqual(program.expr, tree, text)
+            lo, hi = bounds(tree)
+            for value, shown in run(program, rng):
+                self.assertTrue(lo <= value <= hi, (text, value))
+                self.assertEqual(shown.count("["), text.count("d"))
+
+    # Свойство: разбор кэшируется по нормализованному тексту
+    def test_cache(self):
+        self.assertIs(compile_roll("4d6KH3 +  2"), compile_roll("4d6kh3 + 2"))
+
+    # Проверяет средние значения модификаторов по большой выборке
+    def test_distributions(self):
+        rng = make_engine(7)
+        cases = {"3d6": 10.5, "4d6kh3": 12.24, "2d20adv": 13.825, "d20dis": 7.175, "1d6!": 4.2, "d%": 50.5,
+                 "4d6dl1": 12.24}
+        for text, mean in cases.items():
+            program = compile_roll(text)
+            values = [evaluate(program.expr, rng, detail=False)[0] for _ in range(20000)]
+            self.assertAlmostEqual(sum(values) / len(values), mean, delta=0.15, msg=text)
+
+    # Проверяет, что большая пачка кубиков берётся одним вызовом генератора, а не по кубику
+    def test_bulk(self):
+        rng = CountingEngine(3)
+        value, _ = evaluate(compile_roll("50000d6kh3").expr, rng, detail=False)
+        self.assertEqual(rng.calls, 1)
+        self.assertEqual(value, 18)
+
+    # Проверяет сообщения об ошибках разбора и ограничение числа кубиков
+    def test_errors(self):
+        for bad in ("bad", "0d6", "2d1001", "4d6kh0", "(1d6", "", "2d6 x", "101x d6"):
+            with self.assertRaises(ArgError, msg=bad):
+                compile_roll(bad)
+        with self.assertRaises(ArgError):
+            compile_roll("10x 20d6", max_dice=100)
+        with self.assertRaises(ArgError):
+            evaluate(compile_roll("1d6/0").expr, make_engine(1))
+
+    # Проверяет ограничение вложенности: глубокие скобки, длинные минусы и цепочки — ArgError, а не RecursionError
+    def test_depth(self):
+        self.assertEqual(run(compile_roll("(" * 32 + "1" + ")" * 32), make_engine(1))[0][0], 1)
+        self.assertEqual(run(compile_roll("-" * 32 + "1"), make_engine(1))[0][0], 1)
+        for bad in ("(" * 300 + "1" + ")" * 300, "-" * 1200 + "1", "+".join(["1"] * 3000), "(-" * 20 + "1" + ")" * 20):
+            with self.assertRaisesRegex(ArgError, "вложенность|операций"):
+                compile_roll(bad)
+
+
+class TestRollExpressions(unittest.IsolatedAsyncioTestCase):
+    async def run_cmd(self, text):
+        ctx = AsyncMock()
+        await br.ROUTER.dispatch(mock_update(text), ctx)
+        return ctx.bot.send_message.call_args.kwargs["text"]
+
+    # Проверяет /roll с выражением: броски показаны, итог совпадает с суммой оставленных + 2
+    async def test_roll_expression(self):
+        text = await self.run_cmd("/roll 4d6kh3 + 2")
+        self.assertRegex(text, r"^4d6kh3\[\d, \d, \d \| \d\] \+ 2 = \d+$")
+        kept = map(int, text.split("[")[1].split("|")[0].split(","))
+        self.assertEqual(int(text.split("= ")[1]), sum(kept) + 2)
+
+    # Проверяет повторы, режим sum и деление на ноль
+    async def test_roll_repeat_and_sum(self):
+        self.assertEqual(len((await self.run_cmd("/roll 6x 4d6kh3")).split("\n")), 6)
+        self.assertRegex(await self.run_cmd("/roll 200d6kh3 + 1 sum"), r"^200d6kh3 \+ 1 = \d+$")
+        self.assertIn("Деление на ноль", await self.run_cmd("/roll 1d6/0"))
+
+    # Проверяет, что /roll и /odds отвечают подсказкой на очень глубокое выражение
+    async def test_deep_expression(self):
+        self.assertIn("вложенность", await self.run_cmd("/roll " + "(" * 300 + "1"))
+        self.assertIn("вложенность", await self.run_cmd("/odds " + "-" * 1200 + "1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import threading
+import unittest
+from collections import Counter
+from entropy import PASSWORD_ALPHABET, EntropyPool
+
+def counting_urandom():
+    # Детерминированный «urandom»: каждый байт помечен порядковым номером блока
+    state = {"n": 0}
+    def urandom(size):
+        start = state["n"]; state["n"] += size
+        return bytes((start + i) % 256 for i in range(size))
+    return urandom
+
+class TestEntropyPool(unittest.TestCase):
+    # Проверяет длину и алфавит [A-Za-z0-9] у паролей из пула
+    def test_password_alphabet(self):
+        pool = EntropyPool()
+        for pwd in pool.passwords(32, 100):
+            self.assertEqual(len(pwd), 32)
+            self.assertRegex(pwd, r"^[A-Za-z0-9]+$")
+
+    # Проверяет, что байты >= 248 отбрасываются, а остальные отображаются без смещения
+    def test_rejection_sampling(self):
+        pool = EntropyPool(block_size=256, prefetch=0, urandom=lambda n: bytes(range(256))[:n])
+        out = pool.string(248)
+        self.assertEqual(out, (PASSWORD_ALPHABET * 4)[:248])
+
+    # Проверяет, что ни один байт пула не выдаётся дважды
+    def test_no_byte_reuse(self):
+        pool = EntropyPool(block_size=100, prefetch=0, urandom=counting_urandom())
+        data = pool.take(70) + pool.take(70) + pool.take(60)
+        self.assertEqual(data, bytes(i % 256 for i in range(200)))
+        self.assertEqual(pool.blocks_read, 2)
+
+    # Проверяет потокобезопасность: параллельные take() не пересекаются
+    def test_thread_safety(self):
+        pool = EntropyPool(block_size=1000, prefetch=0, urandom=lambda n: bytes(n))
+        seen = []
+        def worker():
+            for _ in range(200):
+                seen.append(len(pool.take(7)))
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(sum(seen), 8 * 200 * 7)
+        self.assertEqual(pool.blocks_read * 1000 - (1000 - pool._pos), 8 * 200 * 7)
+
+    # Проверяет равномерность распределения символов (критерий хи-квадрат)
+    def test_uniform_distribution(self):
+        counts = Counter(EntropyPool().string(62 * 2000))
+        expected = 2000
+        chi2 = sum((counts[c] - expected) ** 2 / expected for c in PASSWORD_ALPHABET)
+        self.assertEqual(len(counts), 62)
+        self.assertLess(chi2, 120)  # 61 степень свободы, p ≈ 1e-5
+
+    # Проверяет, что слишком короткий алфавит отклоняется
+    def test_bad_alphabet(self):
+        with self.assertRaises(ValueError):
+            EntropyPool().string(5, "a")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import AsyncMock
+from telegram import InlineQuery, Update, User
+import bot_randomlab as br
+from inline import InlineRouter
+from rng import PythonEngine
+
+def inline_update(query, user_id=1):
+    user = User(id=user_id, first_name="U", is_bot=False)
+    return Update(update_id=1, inline_query=InlineQuery(id="q1", from_user=user, query=query, offset=""))
+
+class TestInline(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._rng = br.RNG
+        br.RNG = PythonEngine(1)
+
+    def tearDown(self):
+        br.RNG = self._rng
+
+    async def ask(self, router, query):
+        ctx = AsyncMock()
+        await router.answer(inline_update(query), ctx)
+        kwargs = ctx.bot.answer_inline_query.call_args.kwargs
+        return kwargs, kwargs["results"][0].input_message_content.message_text
+
+    # Проверяет «@bot 2d6»: формат как у /roll, ответ не кэшируется в Telegram
+    async def test_roll_default(self):
+        kwargs, text = await self.ask(br.INLINE, "2d6")
+        self.assertRegex(text, r"Броски: \[\d+, \d+\] \| сумма=\d+")
+        self.assertEqual(kwargs["cache_time"], 0)
+        self.assertTrue(kwargs["is_personal"])
+
+    # Проверяет pw/uuid/choose: значения совпадают по формату с командами
+    async def test_generators(self):
+        _, pw = await self.ask(br.INLINE, "pw 16")
+        self.assertEqual(len(pw), 16)
+        _, u = await self.ask(br.INLINE, "uuid")
+        self.assertRegex(u, r"^[0-9a-f-]{36}$")
+        _, c = await self.ask(br.INLINE, "choose a | b|c")
+        self.assertIn(c, ["a", "b", "c"])
+
+    # Проверяет, что справка и ошибки разбора кэшируются на сервере и в Telegram
+    async def test_static_cached(self):
+        router = br.INLINE
+        hits = router.stats["cache_hits"]
+        kwargs, text = await self.ask(router, "")
+        self.assertEqual(text, br.HELP_TEXT)
+        self.assertEqual(kwargs["cache_time"], router.cache_time)
+        await self.ask(router, "")
+        _, err = await self.ask(router, "pw 100")
+        self.assertIn("от 8 до 64", err)
+        await self.ask(router, "pw  100")
+        self.assertEqual(router.stats["cache_hits"], hits + 2)
+
+    # Проверяет, что повторные запросы берут значения из пула, а не генерируют по одному
+    async def test_pool_refills(self):
+        calls = []
+
+        def batch(n, count):
+            calls.append(count)
+            return list(range(count))
+        router = InlineRouter(pool_size=8)
+        router.add(("n",), batch, lambda n, v: ("n", str(v)), br.int_arg(1, 10), usage="n <k>")
+        texts = [(await self.ask(router, "n 3"))[1] for _ in range(10)]
+        self.assertEqual(texts, [str(i) for i in range(8)] + ["0", "1"])
+        self.assertEqual(calls, [8, 8])
+        self.assertEqual(router.stats["refills"], 2)
+
+    # Проверяет, что обработчик inline-запросов подключается к приложению
+    def test_registered(self):
+        app = br.build_application("123:ABC")
+        self.assertTrue(any(h.callback == br.INLINE.answer for g in app.handlers.values() for h in g))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import unittest
+from lazy import importtime, lazy_import
+
+class TestLazy(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        sys.path.insert(0, self.dir.name)
+        with open(os.path.join(self.dir.name, "lazy_probe.py"), "w") as f:
+            f.write("import builtins\nbuiltins.lazy_probe_runs = getattr(builtins, 'lazy_probe_runs', 0) + 1\nVALUE = 42\n")
+
+    def tearDown(self):
+        sys.path.remove(self.dir.name)
+        sys.modules.pop("lazy_probe", None)
+        import builtins
+        builtins.__dict__.pop("lazy_probe_runs", None)
+        self.dir.cleanup()
+
+    # Проверяет, что модуль выполняется при первом обращении к атрибуту и только один раз
+    def test_deferred(self):
+        import builtins
+        probe = lazy_import("lazy_probe")
+        self.assertFalse(hasattr(builtins, "lazy_probe_runs"))
+        self.assertIs(lazy_import("lazy_probe"), probe)
+        self.assertEqual(probe.VALUE, 42)
+        import lazy_probe
+        self.assertEqual((lazy_probe.VALUE, builtins.lazy_probe_runs), (42, 1))
+
+    # Проверяет, что отсутствующий необязательный модуль — None
+    def test_missing(self):
+        self.assertIsNone(lazy_import("no_such_module_randomlab"))
+
+    # Проверяет разбор вывода -X importtime
+    def test_importtime(self):
+        rows = importtime("json")
+        names = [name for name, _, _, _ in rows]
+        self.assertIn("json.decoder", names)
+        name, own, cum, depth = rows[-1]
+        self.assertEqual((name, depth), ("json", 0))
+        self.assertGreaterEqual(cum, own)
+        self.assertTrue(all(d >= 1 for n, _, _, d in rows if n == "json.decoder"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import AsyncMock
+from aiohttp import ClientSession
+import bot_randomlab as br
+import metrics
+from metrics import Histogram, Metrics, MetricsServer
+from test_randomlab_unittest import mock_update
+
+class TestHistogram(unittest.TestCase):
+    # Проверяет точность перцентилей (погрешность корзин не больше ~3%)
+    def test_percentiles(self):
+        h = Histogram()
+        for v in range(1, 10001):
+            h.record(v)
+        for q, expected in ((0.5, 5000), (0.9, 9000), (0.99, 9900)):
+            self.assertAlmostEqual(h.percentile(q), expected, delta=expected * 0.04)
+        self.assertEqual(h.count, 10000)
+        self.assertEqual(h.percentile(1.0), 10000)
+
+    # Проверяет малые значения, пустую гистограмму и значения за верхней границей
+    def test_edges(self):
+        h = Histogram()
+        self.assertEqual(h.percentile(0.5), 0)
+        h.record(0); h.record(3)
+        self.assertEqual(h.percentile(0.5), 0)
+        self.assertEqual(h.percentile(1.0), 3)
+        h.record(1 << 50)
+        self.assertEqual(h.count, 3)
+
+class TestCommandMetrics(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.m = Metrics(); br.ROUTER.metrics = self.m
+
+    def tearDown(self):
+        br.ROUTER.metrics = None
+
+    # Проверяет замеры по фазам и счётчик ошибок валидации
+    async def test_phases_and_errors(self):
+        ctx = AsyncMock()
+        await br.ROUTER.dispatch(mock_update("/roll 2d6"), ctx)
+        await br.ROUTER.dispatch(mock_update("/roll bad"), ctx)
+        self.assertEqual(self.m.commands["roll"], 2)
+        self.assertEqual(self.m.validation_errors["roll"], 1)
+        for phase in ("parse", "generate", "send", "total"):
+            self.assertEqual(self.m.histograms[("roll", phase)].count, 2)
+        text = self.m.render()
+        self.assertIn('randomlab_command_latency_seconds_count{command="roll",phase="send"} 2', text)
+        self.assertIn('randomlab_validation_errors_total{command="roll"} 1', text)
+
+    # Проверяет, что считаются и ошибки, поднятые внутри обработчика, а не только при разборе схемы
+    async def test_handler_errors(self):
+        for text in ("/sample 5 a|b", "/roll 2d6+bad", "/odds 100d1000kh50", "/uuid 5 6"):
+            ctx = AsyncMock()
+            await br.ROUTER.dispatch(mock_update(text), ctx)
+            ctx.bot.send_message.assert_called_once()
+        self.assertEqual(self.m.validation_errors, {"sample": 1, "roll": 1, "odds": 1, "uuid": 1})
+
+    # Проверяет, что вне замера (метрики выключены) контекст пуст
+    async def test_disabled(self):
+        br.ROUTER.metrics = None
+        ctx = AsyncMock()
+        await br.ROUTER.dispatch(mock_update("/coin"), ctx)
+        self.assertIsNone(metrics.current.get())
+        self.assertEqual(self.m.commands, {})
+
+    # Проверяет HTTP-эндпоинт /metrics
+    async def test_endpoint(self):
+        self.m.gauge("randomlab_update_queue_depth", lambda: 3)
+        self.m.counter("randomlab_outbox_retry_after_total", lambda: 2)
+        server = MetricsServer(self.m, "127.0.0.1", 0)
+        await server.start()
+        try:
+            async with ClientSession() as s:
+                async with s.get(f"http://127.0.0.1:{server.port}/metrics") as resp:
+                    body = await resp.text()
+        finally:
+            await server.stop()
+        self.assertIn("# TYPE randomlab_update_queue_depth gauge\nrandomlab_update_queue_depth 3", body)
+        self.assertIn("# TYPE randomlab_outbox_retry_after_total counter\nrandomlab_outbox_retry_after_total 2", body)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import itertools
+import random
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+import bot_randomlab as br
+import odds
+from dice import BinOp, Dice, Group, Neg, compile_roll, evaluate
+from odds import format_odds, parse_odds, percentile, probability, solve, stats
+from router import ArgError
+from test_randomlab_unittest import mock_update
+
+def dice_nodes(node):
+    # Кубики выражения в том порядке, в каком их бросает evaluate.
+    if isinstance(node, Dice):
+        return [node]
+    if isinstance(node, (Group, Neg)):
+        return dice_nodes(node.x)
+    if isinstance(node, BinOp):
+        return dice_nodes(node.left) + dice_nodes(node.right)
+    return []
+
+def brute(text):
+    # Точное распределение перебором всех исходов (только для маленьких выражений).
+    program = compile_roll(text)
+    counts = {}
+    faces = [range(1, d.m + 1) for d in dice_nodes(program.expr) for _ in range(d.n)]
+    for outcome in itertools.product(*faces):
+        it = iter(outcome)
+
+        class Replay:
+            def randints(self, a, b, count):
+                return [next(it) for _ in range(count)]
+        value, _ = evaluate(program.expr, Replay())
+        counts[value] = counts.get(value, 0) + 1
+    total = sum(counts.values())
+    return {v: c / total for v, c in counts.items()}
+
+def as_dict(d):
+    return {d.offset + i: float(p) for i, p in enumerate(d.probs) if p > 1e-15}
+
+
+class TestOdds(unittest.TestCase):
+    # Свойство: свёртка совпадает с полным перебором для случайных маленьких выражений
+    def test_matches_enumeration(self):
+        r = random.Random(14)
+        cases = ["3d6", "4d6kh3", "4d6kl2", "5d4dl2", "5d4dh1", "2d20adv", "d20dis", "2d6+3", "2d6-1d4",
+                 "(1d4+1)*3", "-2d6", "2d6/2", "3*d4 - 2", "d4*-2"]
+        for _ in range(20):
+            n, m = r.randint(1, 4), r.randint(2, 6)
+            mod = r.choice(["", f"kh{r.randint(1, n)}", f"kl{r.randint(1, n)}"])
+            cases.append(f"{n}d{m}{mod} + {r.randint(0, 5)}")
+        for text in cases:
+            expected = brute(text)
+            got = as_dict(solve(compile_roll(text, odds.MAX_DICE)))
+            self.assertEqual(set(got), set(expected), text)
+            for v, p in expected.items():
+                self.assertAlmostEqual(got[v], p, places=12, msg=text)
+
+    # Проверяет то же без numpy: прямая свёртка и списки вместо массивов
+    def test_pure_python(self):
+        with patch.object(odds, "np", None), patch.object(odds, "MEMO", odds._Memo()):
+            for text in ("3d6", "4d6kh3", "2d20dis", "10d10 - 5", "2d6/2"):
+                expected = brute(text) if "10d10" not in text else None
+                d = solve(compile_roll(text))
+                self.assertIsInstance(d.probs, list)
+                self.assertAlmostEqual(sum(d.probs), 1.0, places=12)
+                if expected is not None:
+                    for v, p in expected.items():
+                        self.assertAlmostEqual(as_dict(d)[v], p, places=12, msg=text)
+            self.assertAlmostEqual(stats(solve(compile_roll("10d10 - 5")))[0], 50.0, places=9)
+
+    # Проверяет среднее, дисперсию, перцентили и вероятность условия
+    def test_stats(self):
+        d = solve(compile_roll("3d6"))
+        mean, var = stats(d)
+        self.assertAlmostEqual(mean, 10.5)
+        self.assertAlmostEqual(var, 8.75)
+        self.assertEqual(percentile(d, 0.5), 10)
+        self.assertEqual((percentile(d, 0.0), percentile(d, 1.0)), (3, 18))
+        self.assertAlmostEqual(probability(d, ">=", 18), 1 / 216)
+        self.assertAlmostEqual(probability(d, "<", 4), 1 / 216)
+        self.assertAlmostEqual(probability(d, "==", 10), 27 / 216)
+        self.assertAlmostEqual(probability(d, ">", 18), 0.0)
+        self.assertAlmostEqual(probability(d, "<=", 100), 1.0)
+        d = solve(compile_roll("4d6kh3"))
+        self.assertAlmostEqual(stats(d)[0], 15869 / 1296)
+        self.assertAlmostEqual(probability(d, ">=", 15), 300 / 1296)
+
+    # Проверяет большие выражения: сотни кубиков с тысячей граней, «взрывы», кэш
+    def test_large_and_cached(self):
+        program = compile_roll("800d1000", odds.MAX_DICE)
+        d = solve(program)
+        mean, var = stats(d)
+        self.assertEqual((d.offset, d.offset + len(d) - 1), (800, 800_000))
+        self.assertAlmostEqual(mean, 800 * 500.5, places=3)
+        self.assertAlmostEqual(var / (800 * (1000 ** 2 - 1) / 12), 1.0, places=9)
+        self.assertIs(solve(compile_roll("800D1000", odds.MAX_DICE)), d)
+        d = solve(compile_roll("100d20kh10"))
+        self.assertAlmostEqual(float(d.probs.sum()), 1.0)
+        self.assertEqual(percentile(d, 0.99), 200)
+        self.assertAlmostEqual(stats(solve(compile_roll("10d6!")))[0], 42.0, places=9)
+
+    # Проверяет деление, когда значения не помещаются в int64, — с numpy и без
+    def test_floordiv_big(self):
+        big = 10 ** 27
+        for text in ("(1000000000*1000000000*1000000000)/7", "(1000000000*1000000000*1000000000 + 2d6)/-7"):
+            program = compile_roll(text, odds.MAX_DICE)
+            with patch.object(odds, "MEMO", odds._Memo()):
+                d = solve(program)
+            with patch.object(odds, "np", None), patch.object(odds, "MEMO", odds._Memo()):
+                pure = solve(program)
+            self.assertEqual((d.offset, len(d)), (pure.offset, len(pure)))
+            self.assertEqual([round(p, 12) for p in d.probs], [round(p, 12) for p in pure.probs])
+        self.assertEqual((d.offset, d.offset + len(d) - 1), ((big + 12) // -7, (big + 2) // -7))
+        self.assertEqual(percentile(solve(compile_roll("(1000000000*1000000000*1000000000)/7")), 0.5), big // 7)
+        d = solve(compile_roll("(1000000000*1000000000*1000000000)/7 + 1d6"))
+        self.assertAlmostEqual(stats(d)[0] - big // 7, 3.5)
+        self.assertIn(f"среднее {big // 7 + 3}.5,", format_odds(compile_roll("(1000000000*1000000000*1000000000)/7 + 1d6"), None, d))
+
+    # Проверяет разбор условия и ошибки
+    def test_parse_and_errors(self):
+        program, cmp = parse_odds("4d6KH3 >= 15")
+        self.assertEqual((program.text, cmp), ("4d6kh3", (">=", 15)))
+        self.assertEqual(parse_odds("2d6=7")[1], ("==", 7))
+        self.assertEqual(parse_odds("2d6 > -1")[1], (">", -1))
+        self.assertIsNone(parse_odds("2d6")[1])
+        for bad in ("2d1001", "0d6", "6x 4d6", "1001d6", "bad >= 3"):
+            with self.assertRaises(ArgError, msg=bad):
+                parse_odds(bad)
+        for bad in ("2d6*1d6", "2d6/d4", "1d6/0", "4d6kh3!", "201d6kh1", "1000d1000 * 10"):
+            with self.assertRaises(ArgError, msg=bad):
+                solve(compile_roll(bad, odds.MAX_DICE))
+
+    # Проверяет бюджет kh/kl: дорогие пачки отклоняются до расчёта, самая дорогая допустимая — около секунды
+    def test_keep_budget(self):
+        for bad in ("100d1000kh50", "200d1000kh100", "40d1000kl20", "30d1000kh15 + 1d6"):
+            with self.assertRaisesRegex(ArgError, "слишком долго", msg=bad):
+                parse_odds(bad)
+        program, _ = parse_odds("78d1000kh10")
+        self.assertGreater(odds._keep_cost(program.expr), 0.9 * odds.KEEP_BUDGET)
+        with patch.object(odds, "MEMO", odds._Memo()):
+            start = time.perf_counter()
+            d = solve(program)
+            self.assertLess(time.perf_counter() - start, 3 * odds.KEEP_BUDGET / 1e9)
+        self.assertAlmostEqual(float(sum(d.probs)), 1.0)
+
+    # Проверяет, что кэш ограничен суммарным размером распределений
+    def test_memo_bound(self):
+        memo = odds._Memo(max_cells=100)
+        for n in (10, 11, 12):
+            memo.put(f"{n}d6", solve(compile_roll(f"{n}d6")))
+        self.assertNotIn("10d6", memo)
+        self.assertIn("12d6", memo)
+        self.assertLessEqual(memo.cells, 100)
+
+    # Проверяет текст ответа: таблица для маленьких распределений, без неё — для больших
+    def test_format(self):
+        program, cmp = parse_odds("2d6 >= 11")
+        text = format_odds(program, cmp, solve(program))
+        self.assertIn("2d6: среднее 7, дисперсия 5.8333", text)
+        self.assertIn("P(X >= 11) = 8.33333%", text)
+        self.assertEqual(len(text.split("\n")), 4 + 11)
+        program, cmp = parse_odds("100d100")
+        self.assertEqual(len(format_odds(program, cmp, solve(program)).split("\n")), 3)
+
+
+class TestOddsCommand(unittest.IsolatedAsyncioTestCase):
+    async def run_cmd(self, text):
+        ctx = AsyncMock()
+        await br.ROUTER.dispatch(mock_update(text), ctx)
+        return ctx.bot.send_message.call_args.kwargs["text"]
+
+    # Проверяет /odds: вероятность условия, подсказку и ошибки
+    async def test_odds(self):
+        text = await self.run_cmd("/odds 4d6kh3 >= 15")
+        self.assertTrue(text.startswith("4d6kh3: среднее 12.2446"))
+        self.assertIn("P(X >= 15) = 23.1481%", text)
+        self.assertIn("Использование: /odds", await self.run_cmd("/odds"))
+        self.assertIn("граней должно быть", await self.run_cmd("/odds 2d1001"))
+        self.assertIn("умножать можно только на число", await self.run_cmd("/odds 2d6*1d6"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import asyncio
+import tempfile
+import unittest
+from datetime import timedelta
+from types import SimpleNamespace
+from telegram import InputFile
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+from fake_telegram import FakeTelegram
+from outbox import OutboundDispatcher, TokenBucket
+from router import reply
+
+class FakeClock:
+    def __init__(self): self.t = 0.0
+    def __call__(self): return self.t
+
+class TestTokenBucket(unittest.TestCase):
+    # Проверяет выдачу жетонов и время ожидания при пустом бакете
+    def test_bucket(self):
+        clock = FakeClock()
+        b = TokenBucket(rate=2, capacity=2, clock=clock)
+        self.assertEqual(b.delay(), 0); self.assertEqual(b.delay(), 0)
+        self.assertAlmostEqual(b.delay(), 0.5)
+        clock.t = 0.5
+        self.assertEqual(b.delay(), 0)
+        self.assertFalse(b.idle())
+        clock.t = 10
+        self.assertTrue(b.idle())
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+    async def start(self, api_kwargs, **dispatcher_kwargs):
+        self.api = FakeTelegram(**api_kwargs); await self.api.start()
+        self.outbox = OutboundDispatcher(**dispatcher_kwargs)
+        self.bot = ExtBot("1:test", base_url=self.api.base_url, rate_limiter=self.outbox)
+        await self.bot.initialize()
+
+    async def asyncTearDown(self):
+        await self.bot.shutdown()
+        await self.api.stop()
+
+    # Проверяет, что ожидающие ответы в один чат склеиваются в одно сообщение
+    async def test_coalesce_same_chat(self):
+        await self.start({"chat_rate": 10}, chat_rate=10)
+        first = await self.bot.send_message(7, "m0")
+        results = await asyncio.gather(*(self.bot.send_message(7, f"m{i}") for i in range(1, 10)))
+        self.assertEqual(len(self.api.sent), 2)
+        self.assertEqual(first.text, "m0")
+        self.assertEqual(self.api.sent[1]["text"], "\n".join(f"m{i}" for i in range(1, 10)))
+        self.assertEqual(self.outbox.stats["coalesced"], 8)
+        self.assertEqual(results[0].message_id, results[8].message_id)
+        self.assertEqual(self.api.too_many, 0)
+
+    # Проверяет, что глобальный лимит соблюдается и фейковый API не отвечает 429
+    async def test_global_limit(self):
+        await self.start({"global_rate": 100}, global_rate=50, chat_rate=100)
+        await asyncio.gather(*(self.bot.send_message(100 + i, "x") for i in range(80)))
+        self.assertEqual(len(self.api.sent), 80)
+        self.assertEqual(self.api.too_many, 0)
+
+    # Проверяет, что при 429 отправка повторяется после retry_after
+    async def test_retry_after(self):
+        await self.start({"chat_rate": 1, "retry_after": 1}, chat_rate=100, coalesce=False)
+        await asyncio.gather(self.bot.send_message(5, "a"), self.bot.send_message(5, "b"))
+        self.assertEqual([m["text"] for m in self.api.sent], ["a", "b"])
+        self.assertEqual(self.outbox.stats["retry_after"], 1)
+
+    # Проверяет ограничение длины очереди и учёт ожиданий (обратное давление)
+    async def test_backpressure(self):
+        await self.start({}, chat_rate=1000, global_rate=1000, max_queue=2)
+        await asyncio.gather(*(self.bot.send_message(i, "x") for i in range(6)))
+        self.assertGreater(self.outbox.stats["backpressure_waits"], 0)
+        self.assertLessEqual(self.outbox.stats["max_depth"], 2)
+        self.assertEqual(self.outbox.metrics()["queued"], 0)
+
+    # Проверяет, что reply() не ждёт доставки, если очередь подключена
+    async def test_reply_detached(self):
+        await self.start({}, chat_rate=100)
+        tasks = []
+        app = SimpleNamespace(create_task=lambda coro, update=None: tasks.append(asyncio.ensure_future(coro)))
+        ctx = SimpleNamespace(bot=self.bot, application=app)
+        upd = SimpleNamespace(effective_chat=SimpleNamespace(id=9))
+        self.assertIsNone(await reply(upd, ctx, "hello"))
+        await asyncio.gather(*tasks)
+        self.assertEqual(self.api.sent[0]["text"], "hello")
+
+
+class TestRetryPayload(unittest.IsolatedAsyncioTestCase):
+    # Проверяет, что при повторе после 429 файл отправляется заново с начала, а не пустым
+    async def test_retry_rewinds_file(self):
+        outbox = OutboundDispatcher()
+        await outbox.initialize()
+        bodies = []
+
+        async def callback(endpoint, data):
+            bodies.append(data["document"].input_file_content.read())
+            if len(bodies) == 1:
+                raise RetryAfter(timedelta(0))
+            return True
+        with tempfile.TemporaryFile() as f:
+            f.write(b"payload")
+            f.seek(0)
+            data = {"chat_id": 1, "document": InputFile(f, filename="x.txt", read_file_handle=False)}
+            self.assertTrue(await outbox._call(callback, "sendDocument", data, {}, None))
+        self.assertEqual(bodies, [b"payload", b"payload"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,6 @@
+import os
+import subprocess
+import sys
 import unittest
 from unittest.mock import AsyncMock
 import re
@@ -148,7 +151,7 @@ class TestRandomLab(unittest.IsolatedAsyncioTestCase):
     async def test_lorem_bounds(self):
         u = mock_update("/lorem 0"); ctx=AsyncMock(); ctx.args=["0"]
         await br.lorem(u, ctx)
-        self.assertIn("1..50", ctx.bot.send_message.call_args.kwargs["text"])
+        self.assertIn("1..100000", ctx.bot.send_message.call_args.kwargs["text"])
 
     # Проверяет /lorem: n нецелое → ошибка
     async def test_lorem_bad(self):
@@ -186,9 +189,9 @@ class TestRandomLab(unittest.IsolatedAsyncioTestCase):
 
     # Проверяет /permute: n вне допустимого диапазона → ошибка
     async def test_permute_bounds(self):
-        u = mock_update("/permute 11"); ctx=AsyncMock(); ctx.args=["11"]
+        u = mock_update("/permute 1000001"); ctx=AsyncMock(); ctx.args=["1000001"]
         await br.permute(u, ctx)
-        self.assertIn("1..10", ctx.bot.send_message.call_args.kwargs["text"])
+        self.assertIn("1..1000000", ctx.bot.send_message.call_args.kwargs["text"])
 
     # Проверяет /permute: нецелое n → ошибка
     async def test_permute_bad(self):
@@ -311,5 +314,50 @@ class TestRandomLab(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(ctx.bot.send_message.call_args.kwargs["text"].strip(), "1")
 
 
+    # ---- Тесты таблицы команд (ROUTER) ----
+
+    # Проверяет, что роутер находит обработчик по имени и передаёт аргументы
+    async def test_router_dispatch_roll(self):
+        u = mock_update("/roll 3d6"); ctx = AsyncMock()
+        await br.ROUTER.dispatch(u, ctx)
+        self.assertEqual(ctx.args, ["3d6"])
+        self.assertRegex(ctx.bot.send_message.call_args.kwargs["text"], r"Броски: \[\d+, \d+, \d+\] \| сумма=\d+")
+
+    # Проверяет, что роутер отдаёт сообщение валидатора при неверных аргументах
+    async def test_router_validation_error(self):
+        u = mock_update("/password 100"); ctx = AsyncMock()
+        await br.ROUTER.dispatch(u, ctx)
+        self.assertIn("Длина должна быть от 8", ctx.bot.send_message.call_args.kwargs["text"])
+
+    # Проверяет, что неизвестная команда молча игнорируется
+    async def test_router_unknown_command(self):
+        u = mock_update("/unknown 1"); ctx = AsyncMock()
+        await br.ROUTER.dispatch(u, ctx)
+        ctx.bot.send_message.assert_not_called()
+
+    # Проверяет, что команда, адресованная другому боту, игнорируется, а своему — выполняется
+    async def test_router_bot_mention(self):
+        ctx = AsyncMock(); ctx.bot.username = "RandomLabBot"
+        await br.ROUTER.dispatch(mock_update("/coin@OtherBot"), ctx)
+        ctx.bot.send_message.assert_not_called()
+        await br.ROUTER.dispatch(mock_update("/coin@randomlabbot"), ctx)
+        self.assertIn(ctx.bot.send_message.call_args.kwargs["text"], ["Орёл","Решка"])
+
+    # Проверяет, что в таблице зарегистрированы все команды бота
+    def test_router_table(self):
+        self.assertEqual(set(br.ROUTER.commands), {"start","help","roll","coin","rand","choose","shuffle",
+                                                   "password","uuid","color","eightball","lorem","sample","permute",
+                                                   "save","lists","forget","set","odds","commit","schedule","schedules","unschedule"})
+
+    # Проверяет, что импорт обработчиков (и этого набора тестов) не тянет Application, numpy и dotenv
+    def test_lazy_import(self):
+        code = ("import sys, test_randomlab_unittest; "
+                "print([m for m in ('telegram.ext', 'numpy', 'dotenv', 'odds', 'render', 'outbox', 'ratelimit') "
+                "if type(sys.modules.get(m)).__name__ == 'module'])")
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        self.assertEqual(out.strip(), "[]")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+from unittest.mock import AsyncMock
+from telegram import Chat, InlineQuery, Message, Update, User
+from telegram.ext import ApplicationHandlerStop
+import bot_randomlab as br
+from ratelimit import Deduplicator, RequestGuard, SlidingWindow
+from test_randomlab_unittest import mock_update
+
+class FakeClock:
+    def __init__(self, t=1000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+def group_update(text, user_id, chat_id=-100):
+    chat = Chat(id=chat_id, type="group")
+    user = User(id=user_id, first_name="U", is_bot=False)
+    return Update(update_id=1, message=Message(message_id=1, date=None, chat=chat, text=text, from_user=user))
+
+def inline_update(query, user_id=1):
+    user = User(id=user_id, first_name="U", is_bot=False)
+    return Update(update_id=1, inline_query=InlineQuery(id="1", from_user=user, query=query, offset=""))
+
+
+class TestSlidingWindow(unittest.TestCase):
+    # Проверяет скользящее окно: лимит в окне и частичный учёт прошлого окна
+    def test_limit(self):
+        clock = FakeClock(1000.0)
+        w = SlidingWindow(3, 10.0, clock=clock)
+        self.assertEqual([w.hit(1) for _ in range(3)], [None] * 3)
+        self.assertAlmostEqual(w.hit(1), 10.0)
+        self.assertIsNone(w.hit(2))
+        clock.t = 1015.0          # половина прошлого окна: 3 * 0.5 = 1.5
+        self.assertEqual([w.hit(1) is None for _ in range(3)], [True, True, False])
+        clock.t = 1040.0          # окно давно прошло
+        self.assertEqual([w.hit(1) is None for _ in range(4)], [True, True, True, False])
+
+    # Свойство: память ограничена capacity при любом числе ключей, вытесняются самые давние
+    def test_bounded(self):
+        w = SlidingWindow(1, 10.0, capacity=1000, clock=FakeClock())
+        for user_id in range(100_000):
+            w.hit(user_id)
+        self.assertEqual((len(w), len(w._bucket), w.evicted), (1000, 1000, 99_000))
+        self.assertIsNotNone(w.hit(99_999))
+        self.assertIsNone(w.hit(0))   # давно вытеснен — начинает с нуля
+
+    # Проверяет, что предупреждение о лимите выдаётся раз за окно
+    def test_warn_once(self):
+        clock = FakeClock()
+        w = SlidingWindow(1, 10.0, clock=clock)
+        w.hit(1), w.hit(1)
+        self.assertEqual([w.warn(1), w.warn(1)], [True, False])
+        clock.t += 10
+        w.hit(1), w.hit(1)
+        self.assertTrue(w.warn(1))
+
+
+class TestDeduplicator(unittest.TestCase):
+    # Проверяет схлопывание повторов в окне и ограничение размера
+    def test_window(self):
+        clock = FakeClock()
+        d = Deduplicator(2.0, max_size=3, clock=clock)
+        self.assertEqual([d.seen("a"), d.seen("a"), d.seen("b")], [False, True, False])
+        clock.t += 2.5
+        self.assertFalse(d.seen("a"))
+        for key in "cdef":
+            d.seen(key)
+        self.assertLessEqual(len(d._seen), 3)
+
+
+class TestRequestGuard(unittest.IsolatedAsyncioTestCase):
+    async def check(self, guard, update):
+        ctx = AsyncMock()
+        try:
+            await guard.check(update, ctx)
+        except ApplicationHandlerStop:
+            return False, ctx
+        return True, ctx
+
+    # Проверяет, что одинаковая команда подряд выполняется один раз, а другая — проходит
+    async def test_dedup(self):
+        clock = FakeClock()
+        guard = RequestGuard(dedup_window=2.0, clock=clock)
+        self.assertTrue((await self.check(guard, mock_update("/password 64")))[0])
+        self.assertFalse((await self.check(guard, mock_update("/password 64")))[0])
+        self.assertTrue((await self.check(guard, mock_update("/password 32")))[0])
+        self.assertTrue((await self.check(guard, mock_update("/password 64", user_id=2)))[0])
+        clock.t += 3
+        self.assertTrue((await self.check(guard, mock_update("/password 64")))[0])
+        self.assertEqual(guard.stats["deduped"], 1)
+
+    # Проверяет лимит пользователя: готовый ответ один раз, дальше — молча
+    async def test_user_limit(self):
+        guard = RequestGuard(user_limit=3, dedup_window=0, clock=FakeClock())
+        results = [await self.check(guard, mock_update("/coin")) for _ in range(6)]
+        self.assertEqual([ok for ok, _ in results], [True] * 3 + [False] * 3)
+        self.assertIn("Слишком много запросов", results[3][1].bot.send_message.call_args.kwargs["text"])
+        results[4][1].bot.send_message.assert_not_called()
+        self.assertEqual(guard.stats, {"allowed": 3, "limited": 3, "deduped": 0})
+
+    # Проверяет лимит группового чата: его делят все участники
+    async def test_chat_limit(self):
+        guard = RequestGuard(user_limit=10, chat_limit=4, dedup_window=0, clock=FakeClock())
+        oks = [(await self.check(guard, group_update("/coin", user_id=i % 3 + 1)))[0] for i in range(6)]
+        self.assertEqual(oks, [True] * 4 + [False] * 2)
+        self.assertTrue((await self.check(guard, group_update("/coin", user_id=1, chat_id=-200)))[0])
+
+    # Проверяет, что набор inline-запроса по буквам проходит целиком и не тратит лимит команд
+    async def test_inline_typing(self):
+        clock = FakeClock()
+        guard = RequestGuard(user_limit=10, inline_limit=60, clock=clock)
+        text = "choose alpha|beta|gamma"
+        oks = []
+        for i in range(1, len(text) + 1):
+            clock.t += 0.15
+            oks.append((await self.check(guard, inline_update(text[:i])))[0])
+        self.assertTrue(all(oks))
+        self.assertTrue((await self.check(guard, mock_update("/coin")))[0])
+        oks = [(await self.check(guard, inline_update(f"pw {i}")))[0] for i in range(100)]
+        self.assertEqual(oks.count(True), 60 - len(text))
+
+    # Проверяет, что обычные сообщения не считаются и не схлопываются, а команды после них проходят
+    async def test_plain_text_ignored(self):
+        guard = RequestGuard(user_limit=3, chat_limit=3, clock=FakeClock())
+        for i in range(10):
+            ok, ctx = await self.check(guard, group_update("hello there", user_id=i % 2 + 1))
+            self.assertTrue(ok)
+            ctx.bot.send_message.assert_not_called()
+        self.assertTrue((await self.check(guard, mock_update("hello there")))[0])
+        self.assertEqual(guard.stats, {"allowed": 0, "limited": 0, "deduped": 0})
+        oks = [(await self.check(guard, group_update(f"/rand 1 {i}", user_id=1)))[0] for i in range(4)]
+        self.assertEqual(oks, [True] * 3 + [False])
+
+    # Проверяет, что слой подключается раньше обработчиков команд
+    def test_registered(self):
+        guard = RequestGuard()
+        app = br.build_application("123:ABC", guard=guard)
+        self.assertEqual([h.callback for h in app.handlers[-1]], [guard.check])
+        self.assertEqual(min(app.handlers), -1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import struct
+import unittest
+import zlib
+from unittest.mock import AsyncMock, MagicMock, patch
+from telegram.error import BadRequest
+import bot_randomlab as br
+import render
+from render import Renderer, dice, encode_png, histogram, swatch
+from test_randomlab_unittest import mock_update
+
+def decode_png(data):
+    # Разбирает PNG, который пишет encode_png: (ширина, высота, строки RGB).
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    pos, chunks = 8, {}
+    while pos < len(data):
+        size, = struct.unpack(">I", data[pos:pos + 4])
+        kind, body = data[pos + 4:pos + 8], data[pos + 8:pos + 8 + size]
+        crc, = struct.unpack(">I", data[pos + 8 + size:pos + 12 + size])
+        assert crc == zlib.crc32(kind + body), kind
+        chunks[kind] = body
+        pos += 12 + size
+    width, height = struct.unpack(">II", chunks[b"IHDR"][:8])
+    raw = zlib.decompress(chunks[b"IDAT"])
+    stride = 1 + 3 * width
+    return width, height, [raw[i * stride + 1:(i + 1) * stride] for i in range(height)]
+
+def sent_photo(msg_file_id="file-1"):
+    ctx = AsyncMock()
+    ctx.bot.send_photo.return_value = MagicMock(photo=[MagicMock(file_id="small"), MagicMock(file_id=msg_file_id)])
+    return ctx
+
+
+class TestImages(unittest.TestCase):
+    # Проверяет кодирование PNG: размеры, контрольные суммы и цвет образца
+    def test_swatch(self):
+        width, height, rows = decode_png(swatch(0x3366CC, size=16))
+        self.assertEqual((width, height), (16, 16))
+        self.assertTrue(all(row == bytes([0x33, 0x66, 0xCC]) * 16 for row in rows))
+        self.assertEqual(decode_png(encode_png(2, 1, [b"\x01\x02\x03\x04\x05\x06"]))[2], [b"\x01\x02\x03\x04\x05\x06"])
+
+    # Проверяет раскладку кубиков по рядам и гистограмму с объединением столбцов
+    def test_dice_and_histogram(self):
+        width, height, _ = decode_png(dice([1, 2, 3, 4, 5, 6, 6], 6, size=16))
+        self.assertEqual((width, height), (6 * 18 + 2, 2 * 18 + 2))
+        width, height, rows = decode_png(dice([20, 999], 1000, size=32))
+        self.assertEqual((width, height), (2 * 36 + 4, 40))
+        width, height, rows = decode_png(histogram([0, 1, 2, 4], height=10))
+        self.assertEqual((width, height), (4 * 16 + 2, 12))
+        self.assertEqual(rows[0][3 * (1 + 3 * 16):3 * (2 + 3 * 16)], bytes(render.BAR))   # высокий столбец
+        self.assertEqual(rows[0][3 * 1:3 * 2], bytes(render.WHITE))                      # нулевой
+        self.assertEqual(decode_png(histogram(list(range(1000)), height=10))[0], 500 + 2)
+
+
+class TestRenderer(unittest.IsolatedAsyncioTestCase):
+    # Проверяет LRU байтов: повтор берётся из кэша, объём ограничен
+    async def test_byte_cache(self):
+        r = Renderer(workers=0, max_bytes=300)
+        first = await r.png(("color", 1), swatch, 1, 8)
+        self.assertIs(await r.png(("color", 1), swatch, 1, 8), first)
+        self.assertEqual((r.stats["renders"], r.stats["hits"]), (1, 1))
+        for v in range(2, 10):
+            await r.png(("color", v), swatch, v, 8)
+        self.assertLessEqual(r._size, 300)
+        self.assertNotIn(("color", 1), r._cache)
+
+    # Проверяет пул процессов: одинаковые запросы во время кодирования рисуются один раз
+    async def test_process_pool(self):
+        r = Renderer(workers=1)
+        await r.open()
+        try:
+            results = await asyncio.gather(*[r.png("d", dice, [1, 2, 3], 6) for _ in range(5)])
+            self.assertEqual(len(set(results)), 1)
+            self.assertEqual(results[0], dice([1, 2, 3], 6))
+            self.assertEqual(r.stats["renders"], 1)
+        finally:
+            await r.close()
+
+    # Проверяет повторное использование file_id и перезагрузку, если он устарел
+    async def test_file_id_reuse(self):
+        r = Renderer(workers=0)
+        u = mock_update("/color")
+        ctx = sent_photo("file-1")
+        await r.send(u, ctx, ("color", 5), swatch, 5, caption="#000005")
+        self.assertIsInstance(ctx.bot.send_photo.call_args.kwargs["photo"], bytes)
+        await r.send(u, ctx, ("color", 5), swatch, 5, caption="#000005")
+        self.assertEqual(ctx.bot.send_photo.call_args.kwargs["photo"], "file-1")
+        self.assertEqual((r.stats["uploads"], r.stats["reused"], r.stats["renders"]), (1, 1, 1))
+
+        ctx.bot.send_photo.side_effect = [BadRequest("wrong file identifier"), MagicMock(photo=[MagicMock(file_id="file-2")])]
+        with self.assertLogs("render", "WARNING"):
+            await r.send(u, ctx, ("color", 5), swatch, 5)
+        self.assertIsInstance(ctx.bot.send_photo.call_args.kwargs["photo"], bytes)
+        self.assertEqual(r._file_ids[("color", 5)], "file-2")
+        self.assertEqual(r.stats["renders"], 1)  # байты взяты из кэша
+
+
+class TestImageCommands(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        patcher = patch.object(br, "RENDERER", Renderer(workers=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # Проверяет /color с образцом: картинка нужного цвета, HEX в подписи
+    async def test_color_swatch(self):
+        ctx = sent_photo()
+        await br.ROUTER.dispatch(mock_update("/color"), ctx)
+        kwargs = ctx.bot.send_photo.call_args.kwargs
+        self.assertRegex(kwargs["caption"], r"^#[0-9A-F]{6}$")
+        rgb = bytes.fromhex(kwargs["caption"][1:])
+        self.assertEqual(decode_png(kwargs["photo"])[2][0][:3], rgb)
+        ctx.bot.send_message.assert_not_called()
+
+    # Проверяет /roll ... img: грани для нескольких кубиков, гистограмма для многих, без img — текст
+    async def test_roll_image(self):
+        ctx = sent_photo()
+        await br.ROUTER.dispatch(mock_update("/roll 3d6 img"), ctx)
+        self.assertRegex(ctx.bot.send_photo.call_args.kwargs["caption"], r"^Броски: \[\d, \d, \d\] \| сумма=\d+$")
+        await br.ROUTER.dispatch(mock_update("/roll 1000d6 img"), ctx)
+        kwargs = ctx.bot.send_photo.call_args.kwargs
+        self.assertRegex(kwargs["caption"], r"^1000d6: сумма=\d+$")
+        self.assertEqual(decode_png(kwargs["photo"])[0], 6 * 16 + 2)
+        await br.ROUTER.dispatch(mock_update("/roll 2d6"), ctx)
+        self.assertIn("Броски:", ctx.bot.send_message.call_args.kwargs["text"])
+        self.assertEqual(ctx.bot.send_photo.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from unittest.mock import AsyncMock
+from collections import Counter
+import bot_randomlab as br
+from rng import NumpyEngine, PythonEngine, make_engine, np
+from test_randomlab_unittest import mock_update
+
+class EngineChecks:
+    # Общие проверки для всех реализаций RandomEngine
+    def engine(self, seed=1):
+        raise NotImplementedError
+
+    # Проверяет воспроизводимость: одно зерно → одна последовательность
+    def test_seed_reproducible(self):
+        a, b = self.engine(7), self.engine(7)
+        self.assertEqual([a.randint(1, 6) for _ in range(50)], [b.randint(1, 6) for _ in range(50)])
+        self.assertEqual(a.randints(1, 1000, 100), b.randints(1, 1000, 100))
+        self.assertEqual(a.permutation(100), b.permutation(100))
+
+    # Проверяет границы randint/randints, включая огромные диапазоны
+    def test_ranges(self):
+        e = self.engine()
+        self.assertTrue(all(1 <= x <= 6 for x in e.randints(1, 6, 500)))
+        self.assertTrue(all(-5 <= e.randint(-5, 5) <= 5 for _ in range(200)))
+        big = 10 ** 30
+        self.assertTrue(all(-big <= e.randint(-big, big) <= big for _ in range(50)))
+        self.assertEqual(e.randint(7, 7), 7)
+
+    # Проверяет, что перестановки, shuffle и sample не теряют и не дублируют элементы
+    def test_permutations(self):
+        e = self.engine()
+        for n in (1, 5, 100):
+            self.assertCountEqual(e.permutation(n), range(1, n + 1))
+            items = list(range(n)); e.shuffle(items)
+            self.assertCountEqual(items, range(n))
+        s = e.sample(list(range(1000)), 50)
+        self.assertEqual(len(set(s)), 50)
+        self.assertEqual(e.sample(["a", "b"], 0), [])
+
+    # Проверяет, что fork даёт отдельный генератор того же типа, воспроизводимый от зерна родителя
+    def test_fork(self):
+        a, b = self.engine(7), self.engine(7)
+        fa, fb = a.fork(), b.fork()
+        self.assertIs(type(fa), type(a))
+        self.assertEqual(fa.randints(1, 1000, 100), fb.randints(1, 1000, 100))
+        self.assertEqual(a.randints(1, 1000, 100), b.randints(1, 1000, 100))
+
+    # Проверяет грубую равномерность бросков d6
+    def test_uniform(self):
+        counts = Counter(self.engine().randints(1, 6, 60000))
+        for face in range(1, 7):
+            self.assertAlmostEqual(counts[face] / 60000, 1 / 6, delta=0.01)
+
+class TestPythonEngine(EngineChecks, unittest.TestCase):
+    def engine(self, seed=1):
+        return PythonEngine(seed)
+
+@unittest.skipIf(np is None, "numpy не установлен")
+class TestNumpyEngine(EngineChecks, unittest.TestCase):
+    def engine(self, seed=1):
+        return NumpyEngine(seed, block_size=64)
+
+class TestHandlersWithEngine(unittest.IsolatedAsyncioTestCase):
+    def tearDown(self):
+        br.RNG = make_engine()
+
+    # Проверяет, что с фиксированным зерном /roll и /lorem воспроизводимы
+    async def test_handlers_reproducible(self):
+        outputs = []
+        for _ in range(2):
+            br.RNG = make_engine(123)
+            ctx = AsyncMock(); ctx.args = ["5d20"]
+            await br.roll(mock_update("/roll 5d20"), ctx)
+            ctx.args = ["40"]
+            await br.lorem(mock_update("/lorem 40"), ctx)
+            outputs.append([c.kwargs["text"] for c in ctx.bot.send_message.call_args_list])
+        self.assertEqual(outputs[0], outputs[1])
+
+    # Проверяет, что неизвестный тип генератора отклоняется
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            make_engine(1, "quantum")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import os
+import random
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, patch
+import bot_randomlab as br
+from router import ArgError
+from scheduler import Cron, Scheduler, TimerHeap, parse_schedule
+from store import ChatStore
+from test_randomlab_unittest import mock_update
+
+def ts(s):
+    return datetime.strptime(s, "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc).timestamp()
+
+class FakeClock:
+    def __init__(self, t=ts("2030-01-04 18:50")):   # пятница
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+class TestTimerHeap(unittest.TestCase):
+    # Свойство: после случайных добавлений, переносов и удалений сроки выходят по порядку
+    def test_random_ops(self):
+        rnd = random.Random(5)
+        heap, ref = TimerHeap(), {}
+        for _ in range(20000):
+            key = rnd.randrange(2000)
+            if key in ref and rnd.random() < 0.3:
+                heap.remove(key)
+                del ref[key]
+            else:
+                ref[key] = rnd.random()
+                heap.push(key, ref[key])
+        self.assertEqual(len(heap), len(ref))
+        self.assertEqual(heap.peek(), min(ref.values()))
+        keys = heap.pop_due(0.5, limit=10 ** 6)
+        self.assertEqual(sorted(keys), sorted(k for k, v in ref.items() if v <= 0.5))
+        self.assertEqual([ref[k] for k in keys], sorted(ref[k] for k in keys))
+        self.assertGreater(heap.peek(), 0.5)
+
+
+class TestParse(unittest.TestCase):
+    # Проверяет поиск следующего срока cron: будни, 29 февраля, «день или день недели»
+    def test_cron(self):
+        self.assertEqual(Cron("*/15 9-18 * * 1-5").next(ts("2030-01-04 18:50")), ts("2030-01-07 09:00"))
+        self.assertEqual(Cron("0 0 29 2 *").next(ts("2030-01-01 00:00")), ts("2032-02-29 00:00"))
+        self.assertEqual(Cron("0 12 10 * 0").next(ts("2030-01-04 13:00")), ts("2030-01-06 12:00"))
+        with self.assertRaises(ArgError):
+            Cron("0 0 31 2 *").next(0)
+        with self.assertRaises(ArgError):
+            Cron("60 * * * *")
+
+    # Проверяет разбор /schedule: режимы, UTC, допустимые команды
+    def test_parse_schedule(self):
+        now = ts("2030-01-04 18:50")
+        self.assertEqual(parse_schedule("in 1h30m /roll 2d6", now), (now + 5400, None, None, "/roll 2d6"))
+        self.assertEqual(parse_schedule("at 18:00 /coin", now)[0], ts("2030-01-05 18:00"))
+        self.assertEqual(parse_schedule("daily 19:05 /choose@bot a|b", now),
+                         (ts("2030-01-04 19:05"), None, "5 19 * * *", "/choose a|b"))
+        self.assertEqual(parse_schedule("every 1d /sample 2 @list", now)[:2], (now + 86400, 86400))
+        self.assertEqual(parse_schedule("cron 0 9 * * 1 /coin", now)[0], ts("2030-01-07 09:00"))
+        self.assertEqual(parse_schedule("in 366d /coin", now)[0], now + 366 * 86400)
+        for bad in ("in 367d /coin", "in 999999999999d /coin", "every 400d /coin", "at 2031-01-06T00:00 /coin",
+                    "in 10 /coin", "every 10s /coin", "in 1m /password 20", "at 2020-01-01T00:00 /coin", "in 1m coin"):
+            with self.assertRaises(ArgError, msg=bad):
+                parse_schedule(bad, now)
+
+
+class TestScheduler(unittest.IsolatedAsyncioTestCase):
+    # Проверяет 100 000 заданий: срабатывают пачками только наступившие, повторы переносятся
+    async def test_many_jobs(self):
+        clock = FakeClock(0.0)
+        fired = []
+
+        async def fire(job):
+            fired.append(job.id)
+        s = Scheduler(fire, clock=clock, batch=1000, max_per_chat=10 ** 6)
+        for i in range(100_000):
+            s.add(i % 100, float(i), "/coin", every=86400 if i % 10 == 0 else None)
+        clock.t = 4_999.5
+        self.assertEqual(await s.tick(), 5_000)
+        self.assertEqual((len(fired), len(s)), (5_000, 95_500))
+        self.assertEqual(await s.tick(), 0)
+        dues = [job.due for job in s.jobs(0)]
+        self.assertEqual(dues[0], 5000.0)
+        self.assertTrue({i + 86400.0 for i in range(0, 5000, 100)} <= set(dues))   # повторы — через сутки
+        self.assertFalse({float(i) for i in range(0, 5000, 100)} & set(dues))
+
+    # Проверяет ошибки команды: задание падает, но остальные выполняются и счётчики верны
+    async def test_failures_and_cancel(self):
+        clock = FakeClock(0.0)
+
+        async def fire(job):
+            if job.cmd == "/bad":
+                raise RuntimeError("boom")
+        s = Scheduler(fire, clock=clock, max_per_chat=2)
+        s.add(1, 1.0, "/bad")
+        job = s.add(1, 2.0, "/coin")
+        with self.assertRaises(ArgError):
+            s.add(1, 3.0, "/coin")
+        self.assertTrue(s.cancel(1, job.id))
+        self.assertFalse(s.cancel(1, job.id))
+        clock.t = 10
+        with self.assertLogs("scheduler", "ERROR"):
+            self.assertEqual(await s.tick(), 1)
+        self.assertEqual((s.stats, len(s)), ({"fired": 1, "failed": 1}, 0))
+
+    # Проверяет сохранение: задания переживают перезапуск, пропущенные срабатывают сразу
+    async def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "state.db")
+            clock = FakeClock(100.0)
+            store = ChatStore(path)
+            await store.open()
+            s = Scheduler(AsyncMock(), store=store, clock=clock)
+            await s.open()
+            s.add(1, 150.0, "/coin")
+            s.add(-200, 160.0, "/roll 2d6", every=3600)
+            gone = s.add(1, 170.0, "/coin")
+            s.cancel(1, gone.id)
+            await s.close()
+            await store.close()
+
+            clock.t = 1000.0
+            store = ChatStore(path)
+            await store.open()
+            fire = AsyncMock()
+            s = Scheduler(fire, store=store, clock=clock, owns=lambda chat_id: chat_id % 2 == 0)
+            await s.open()
+            try:
+                self.assertEqual([j.cmd for j in s.jobs(-200)], ["/roll 2d6"])
+                self.assertEqual(s.jobs(1), [])   # чат другого воркера
+                self.assertEqual(await s.tick(), 1)
+                self.assertEqual(s.jobs(-200)[0].due, 3760.0)
+            finally:
+                await s.close()
+                await store.close()
+
+
+class TestScheduleCommands(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.clock = FakeClock()
+        self.sched = Scheduler(clock=self.clock)
+        patcher = patch.object(br, "SCHEDULER", self.sched)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def run_cmd(self, text):
+        ctx = AsyncMock()
+        await br.ROUTER.dispatch(mock_update(text), ctx)
+        return [c.kwargs["text"] for c in ctx.bot.send_message.call_args_list]
+
+    # Проверяет /schedule → /schedules → срабатывание: команда выполняется в чате автора
+    async def test_schedule_fire(self):
+        texts = await self.run_cmd("/schedule in 10m /choose a|b")
+        self.assertRegex(texts[0], r"^Задание [0-9a-f]{6}: /choose a\|b — 2030-01-04 19:00 UTC\n")
+        texts = await self.run_cmd("/schedule daily 09:00 /coin")
+        self.assertIn("cron «0 9 * * *»", texts[0])
+        listing = (await self.run_cmd("/schedules"))[0].split("\n")
+        self.assertEqual(len(listing), 2)
+        ctx = AsyncMock()
+        self.sched.fire = lambda job: br._fire_job(job, ctx)
+        self.clock.t += 600
+        self.assertEqual(await self.sched.tick(), 1)
+        self.assertIn(ctx.bot.send_message.call_args.kwargs["text"], ["a", "b"])
+        self.assertEqual(ctx.bot.send_message.call_args.kwargs["chat_id"], 1)
+        job_id = listing[1].split(":")[0]
+        self.assertIn("удалено", (await self.run_cmd(f"/unschedule {job_id}"))[0])
+        self.assertIn("Заданий нет", (await self.run_cmd("/schedules"))[0])
+
+    # Проверяет подсказки: без аргументов, недопустимая команда, выключенное расписание
+    async def test_errors(self):
+        self.assertIn("Использование: /schedule", (await self.run_cmd("/schedule"))[0])
+        self.assertIn("По расписанию можно", (await self.run_cmd("/schedule in 1m /uuid 5"))[0])
+        self.assertIn("Интервал больше 366 дней", (await self.run_cmd("/schedule in 999999999999d /coin"))[0])
+        self.assertEqual(len(self.sched), 0)
+        self.sched.add(1, 1e20, "/coin")   # сохранённое до ограничения — список всё равно выводится
+        self.assertIn("/coin", (await self.run_cmd("/schedules"))[0])
+        with patch.object(br, "SCHEDULER", None):
+            self.assertIn("SCHEDULE_ENABLED", (await self.run_cmd("/schedules"))[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import os
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from fake_telegram import FakeTelegram, make_update
+from shard import ChatOrderedProcessor, ShardSupervisor, chat_key, shard_for
+
+class TestShardRouting(unittest.TestCase):
+    # Проверяет извлечение ключа шардирования из разных типов апдейтов
+    def test_chat_key(self):
+        self.assertEqual(chat_key(make_update(1, 42, "/coin")), 42)
+        self.assertEqual(chat_key({"update_id": 2, "callback_query": {"from": {"id": 5}, "message": {"chat": {"id": -100}}}}), -100)
+        self.assertEqual(chat_key({"update_id": 3, "inline_query": {"from": {"id": 77}}}), 77)
+        self.assertEqual(chat_key({"update_id": 4}), 4)
+
+    # Проверяет, что апдейты одного чата всегда идут в один шард (в т.ч. отрицательные id групп)
+    def test_shard_for_stable(self):
+        for chat in (1, 2, 999, -1001234567890):
+            shards = {shard_for(make_update(i, chat, "/coin"), 4) for i in range(10)}
+            self.assertEqual(len(shards), 1)
+            self.assertTrue(0 <= shards.pop() < 4)
+
+class TestChatOrderedProcessor(unittest.IsolatedAsyncioTestCase):
+    # Проверяет, что апдейты одного чата обрабатываются по очереди, а разных — параллельно
+    async def test_ordering(self):
+        proc = ChatOrderedProcessor(16)
+        log = []
+        async def job(chat, i, delay):
+            log.append(("start", chat, i)); await asyncio.sleep(delay); log.append(("end", chat, i))
+        upd = lambda chat: SimpleNamespace(effective_chat=SimpleNamespace(id=chat))
+        await asyncio.gather(proc.process_update(upd(1), job(1, 0, 0.02)),
+                             proc.process_update(upd(1), job(1, 1, 0)),
+                             proc.process_update(upd(2), job(2, 0, 0)))
+        chat1 = [e for e in log if e[1] == 1]
+        self.assertEqual(chat1, [("start", 1, 0), ("end", 1, 0), ("start", 1, 1), ("end", 1, 1)])
+        self.assertLess(log.index(("end", 2, 0)), log.index(("end", 1, 0)))
+        self.assertEqual(proc._locks, {})
+
+    # Проверяет, что заспамивший чат занимает не больше одного слота и не задерживает другие чаты
+    async def test_flood_does_not_starve(self):
+        proc = ChatOrderedProcessor(4)
+        release = asyncio.Event()
+        upd = lambda chat: SimpleNamespace(effective_chat=SimpleNamespace(id=chat))
+        flood = [asyncio.create_task(proc.process_update(upd(1), release.wait())) for _ in range(20)]
+        await asyncio.sleep(0)
+        self.assertEqual(proc.current_concurrent_updates, 1)
+        await asyncio.wait_for(proc.process_update(upd(2), asyncio.sleep(0)), timeout=1)
+        release.set()
+        await asyncio.gather(*flood)
+        self.assertEqual(proc._locks, {})
+
+class TestShardSupervisor(unittest.IsolatedAsyncioTestCase):
+    # Проверяет полный путь через процессы-воркеры и перезапуск упавшего воркера
+    async def test_workers_and_restart(self):
+        api = FakeTelegram(); await api.start()
+        env = {"TELEGRAM_BOT_TOKEN": "123:test", "TELEGRAM_BASE_URL": api.base_url, "OUTBOX_ENABLED": "0"}
+        with mock.patch.dict(os.environ, env):
+            sup = ShardSupervisor(2, restart_delay=0.05)
+            await sup.start()
+            try:
+                updates = [make_update(i, 100 + i, "/coin") for i in range(10)]
+                for u in updates:
+                    self.assertTrue(await sup.route(u, json.dumps(u).encode()))
+                await api.wait_for_messages(10, timeout=60)
+                self.assertEqual(sum(sup.routed), 10)
+                self.assertEqual({m["chat"]["id"] for m in api.sent}, set(range(100, 110)))
+
+                sup.procs[0].kill()
+                u = make_update(99, 200, "/coin")  # 200 % 2 == 0 → упавший шард
+                await asyncio.sleep(0.3)
+                self.assertTrue(await sup.route(u, json.dumps(u).encode()))
+                await api.wait_for_messages(11, timeout=60)
+                self.assertEqual(sup.restarts[0], 1)
+                self.assertEqual(api.sent[-1]["chat"]["id"], 200)
+            finally:
+                await sup.stop()
+                await api.stop()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import AsyncMock
+import bot_randomlab as br
+from store import LIST, SETTING, ChatStore
+from test_randomlab_unittest import mock_update
+
+class TestChatStore(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "state.db")
+
+    async def asyncTearDown(self):
+        self.dir.cleanup()
+
+    def rows(self):
+        with sqlite3.connect(self.path) as db:
+            return db.execute("SELECT chat_id, kind, name, value FROM chat_state ORDER BY 1, 2, 3").fetchall()
+
+    # Проверяет отложенную запись: до сброса данных нет в базе, после перезапуска они читаются
+    async def test_write_behind_and_restart(self):
+        store = ChatStore(self.path, flush_interval=60)
+        await store.open()
+        store.put(1, LIST, "team", "a|b|c")
+        store.put(1, SETTING, "dice", "3d6")
+        self.assertEqual(await store.get(1, LIST, "team"), "a|b|c")
+        self.assertEqual(self.rows(), [])
+        await store.close()
+        self.assertEqual(self.rows(), [(1, LIST, "team", "a|b|c"), (1, SETTING, "dice", "3d6")])
+
+        store = ChatStore(self.path)
+        await store.open()
+        self.assertEqual(await store.names(1, LIST), {"team": "a|b|c"})
+        self.assertEqual(store.stats["misses"], 1)
+        store.delete(1, LIST, "team")
+        await store.close()
+        self.assertEqual([r[1] for r in self.rows()], [SETTING])
+
+    # Проверяет, что вытесненный из LRU чат перечитывается вместе с несохранёнными изменениями
+    async def test_lru_overlay(self):
+        store = ChatStore(self.path, cache_size=2, flush_interval=60)
+        await store.open()
+        try:
+            await store.state(1)
+            store.put(1, SETTING, "password", "20")
+            await store.state(2); await store.state(3)  # чат 1 вытеснен
+            self.assertEqual(await store.get(1, SETTING, "password"), "20")
+            self.assertEqual(store.stats["misses"], 4)
+        finally:
+            await store.close()
+
+    # Проверяет, что накопленная пачка сбрасывается в фоне одной транзакцией по batch_size
+    async def test_batch_flush(self):
+        store = ChatStore(self.path, flush_interval=60, batch_size=100)
+        await store.open()
+        try:
+            for i in range(100):
+                store.put(i, SETTING, "dice", "1d6")
+            for _ in range(50):
+                if store.stats["flushes"]:
+                    break
+                await asyncio.sleep(0.01)
+            self.assertEqual((store.stats["flushes"], store.stats["written"]), (1, 100))
+            self.assertEqual(len(self.rows()), 100)
+        finally:
+            await store.close()
+
+
+class TestStoreCommands(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        br.STORE = ChatStore(os.path.join(self.dir.name, "state.db"))
+        await br.STORE.open()
+
+    async def asyncTearDown(self):
+        await br.STORE.close()
+        br.STORE = None
+        self.dir.cleanup()
+
+    async def run_cmd(self, text):
+        ctx = AsyncMock()
+        await br.ROUTER.dispatch(mock_update(text), ctx)
+        return ctx.bot.send_message.call_args.kwargs["text"]
+
+    # Проверяет /save, выбор из сохранённого списка через @имя, /lists и /forget
+    async def test_saved_lists(self):
+        self.assertIn("сохранён", await self.run_cmd("/save Team alice|bob:2|carol"))
+        self.assertIn(await self.run_cmd("/choose @team"), ["alice", "bob", "carol"])
+        self.assertCountEqual((await self.run_cmd("/shuffle @team")).split(" | "), ["alice", "bob", "carol"])
+        self.assertEqual(len((await self.run_cmd("/sample 2 @team")).split(" | ")), 2)
+        self.assertIn("@team — 3", await self.run_cmd("/lists"))
+        self.assertIn("удалён", await self.run_cmd("/forget team"))
+        self.assertIn("Нет сохранённого списка", await self.run_cmd("/choose @team"))
+
+    # Проверяет значения по умолчанию: /roll и /password без аргументов берут их из /set
+    async def test_defaults(self):
+        self.assertIn("Использование: /roll", await self.run_cmd("/roll"))
+        self.assertIn("Неверный формат", await self.run_cmd("/set dice 0d6"))
+        self.assertEqual(await self.run_cmd("/set dice 3D6"), "dice = 3d6")
+        self.assertRegex(await self.run_cmd("/roll"), r"Броски: \[\d+, \d+, \d+\]")
+        await self.run_cmd("/set password 20")
+        self.assertEqual(len(await self.run_cmd("/password")), 20)
+        self.assertEqual(await self.run_cmd("/set"), "dice = 3d6\npassword = 20")
+        await self.run_cmd("/set password -")
+        self.assertIn("Использование: /password", await self.run_cmd("/password"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+from unittest.mock import AsyncMock
+import bot_randomlab as br
+from rng import PythonEngine
+import asyncio
+import time
+from streaming import chunk_text, prepare, send_stream
+from test_randomlab_unittest import mock_update
+
+class TestChunkText(unittest.TestCase):
+    # Проверяет, что куски не длиннее лимита и склеиваются обратно в исходный текст
+    def test_limit_and_roundtrip(self):
+        words = [str(i) for i in range(5000)]
+        chunks = list(chunk_text(iter(words), " ", limit=100))
+        self.assertTrue(all(len(c) <= 100 for c in chunks))
+        self.assertEqual(" ".join(chunks).split(), words)
+
+    # Проверяет, что элемент длиннее лимита режется, а остаток склеивается со следующими
+    def test_long_piece(self):
+        chunks = list(chunk_text(["a", "x" * 250, "b"], " ", limit=100))
+        self.assertEqual(chunks, ["a", "x" * 100, "x" * 100, "x" * 50 + " b"])
+        self.assertEqual(list(chunk_text([], " ")), [])
+
+
+class TestPrepare(unittest.IsolatedAsyncioTestCase):
+    # Проверяет, что короткий ответ остаётся кусками, а длинный уходит во временный файл
+    async def test_chunks_or_file(self):
+        p = await prepare(map(str, range(10)))
+        self.assertEqual(p.chunks, [" ".join(map(str, range(10)))])
+        self.assertIsNone(p.file)
+        p = await prepare(map(str, range(100000)))
+        try:
+            self.assertIsNone(p.chunks)
+            self.assertEqual(p.file.read().split(), [str(i).encode() for i in range(100000)])
+        finally:
+            p.close()
+
+    # Проверяет, что /permute 1000000 не останавливает цикл событий на время генерации
+    async def test_loop_not_blocked(self):
+        gaps = []
+
+        async def ticker():
+            last = time.perf_counter()
+            while True:
+                await asyncio.sleep(0.005)
+                now = time.perf_counter()
+                gaps.append(now - last); last = now
+        ctx = AsyncMock(); ctx.args = ["1000000"]
+        task = asyncio.create_task(ticker())
+        await br.permute(mock_update("/permute 1000000"), ctx)
+        task.cancel()
+        ctx.bot.send_document.assert_awaited_once()
+        self.assertLess(max(gaps), 0.3)
+
+    # Проверяет край: длина элемента кратна лимиту, пустые элементы — без лишних разделителей
+    def test_exact_multiple(self):
+        chunks = list(chunk_text(["x" * 200, "b"], " ", limit=100))
+        self.assertEqual(chunks, ["x" * 100, "x" * 100, "b"])
+        chunks = list(chunk_text(["a", "x" * 100, "", "b"], " | ", limit=100))
+        self.assertEqual(chunks, ["a", "x" * 100, "b"])
+        self.assertEqual(list(chunk_text([""], " ")), [])
+
+
+class TestSendStream(unittest.IsolatedAsyncioTestCase):
+    # Проверяет, что короткий результат уходит обычными сообщениями
+    async def test_messages(self):
+        ctx = AsyncMock()
+        sent = await send_stream(mock_update(), ctx, (str(i) for i in range(2000)))
+        self.assertEqual(sent, 3)
+        self.assertEqual(ctx.bot.send_message.call_count, 3)
+        ctx.bot.send_document.assert_not_called()
+
+    # Проверяет, что длинный результат уходит одним файлом с полным текстом
+    async def test_document(self):
+        ctx = AsyncMock()
+
+        async def capture(chat_id, document):
+            capture.body = document.input_file_content.read()
+        ctx.bot.send_document.side_effect = capture
+        await send_stream(mock_update(), ctx, (str(i) for i in range(10000)), filename="n.txt")
+        ctx.bot.send_message.assert_not_called()
+        self.assertEqual(ctx.bot.send_document.call_args.kwargs["document"].filename, "n.txt")
+        self.assertEqual(capture.body.decode().split(), [str(i) for i in range(10000)])
+
+
+class TestLargeCommands(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._rng = br.RNG
+        br.RNG = PythonEngine(1)
+
+    def tearDown(self):
+        br.RNG = self._rng
+
+    # Проверяет /permute 100000: файл содержит каждое число ровно один раз
+    async def test_permute_large(self):
+        ctx = AsyncMock(); ctx.args = ["100000"]
+
+        async def capture(chat_id, document):
+            capture.body = document.input_file_content.read()
+        ctx.bot.send_document.side_effect = capture
+        await br.permute(mock_update("/permute 100000"), ctx)
+        self.assertCountEqual(map(int, capture.body.split()), range(1, 100001))
+
+    # Проверяет /roll 50d6: броски и сумма согласованы
+    async def test_roll_stream(self):
+        ctx = AsyncMock(); ctx.args = ["50d6"]
+        await br.roll(mock_update("/roll 50d6"), ctx)
+        text = ctx.bot.send_message.call_args.kwargs["text"]
+        head, total = text.split(" | сумма=")
+        rolls = list(map(int, head.split()[1:]))
+        self.assertEqual(len(rolls), 50)
+        self.assertEqual(sum(rolls), int(total))
+
+    # Проверяет /roll NdM sum без материализации бросков и подсказку при слишком большом N
+    async def test_roll_sum(self):
+        ctx = AsyncMock(); ctx.args = ["1000000d6", "sum"]
+        await br.ROUTER.commands["roll"](mock_update("/roll 1000000d6 sum"), ctx)
+        total = int(ctx.bot.send_message.call_args.kwargs["text"].split("=")[1])
+        self.assertTrue(3_300_000 < total < 3_700_000)
+        ctx = AsyncMock(); ctx.args = ["1000000d6"]
+        await br.roll(mock_update("/roll 1000000d6"), ctx)
+        self.assertIn("sum", ctx.bot.send_message.call_args.kwargs["text"])
+
+
+if __name__ == "__main__":
+    unittest.main()
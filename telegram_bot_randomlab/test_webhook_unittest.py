@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+import bot_randomlab as br
+from fake_telegram import FakeTelegram, make_update, post_updates
+from webhook import WebhookServer
+
+def fake_app():
+    return SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+
+class TestWebhook(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.app = fake_app()
+        self.server = WebhookServer(self.app, "127.0.0.1", 0, "hook", "s3cret")
+        await self.server.start()
+        self.url = f"http://127.0.0.1:{self.server.port}/hook"
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    # Проверяет, что апдейт с верным секретом попадает в очередь Application
+    async def test_accepts_update(self):
+        statuses = await post_updates(self.url, [make_update(1, 42, "/coin")], 1, "s3cret")
+        self.assertEqual(statuses, [200])
+        upd = self.app.update_queue.get_nowait()
+        self.assertEqual(upd.effective_chat.id, 42)
+
+    # Проверяет, что запрос без секрета или с неверным секретом отклоняется
+    async def test_rejects_bad_secret(self):
+        statuses = await post_updates(self.url, [make_update(1, 42, "/coin")], 1, "wrong")
+        statuses += await post_updates(self.url, [make_update(2, 42, "/coin")], 1)
+        self.assertEqual(statuses, [403, 403])
+        self.assertTrue(self.app.update_queue.empty())
+        self.assertEqual(self.server.rejected, 2)
+
+    # Проверяет, что корректный JSON, но не объект ([], 1, "x", null), отклоняется с 400, а не 500
+    async def test_rejects_non_object(self):
+        statuses = await post_updates(self.url, [[], 1, "x", None], 1, "s3cret")
+        self.assertEqual(statuses, [400] * 4)
+        self.assertTrue(self.app.update_queue.empty())
+
+    # Проверяет, что после начала остановки новые апдейты получают 503
+    async def test_draining_returns_503(self):
+        await self.server.drain()
+        statuses = await post_updates(self.url, [make_update(1, 42, "/coin")], 1, "s3cret")
+        self.assertEqual(statuses, [503])
+
+class TestWebhookEndToEnd(unittest.IsolatedAsyncioTestCase):
+    # Проверяет полный путь: webhook → Application → фейковый Bot API
+    async def test_roundtrip_through_fake_telegram(self):
+        api = FakeTelegram(); await api.start()
+        app = br.build_application("123:test", base_url=api.base_url, webhook=True, concurrent_updates=8)
+        server = WebhookServer(app, "127.0.0.1", 0, "telegram")
+        async with app:
+            await app.start(); await server.start()
+            url = f"http://127.0.0.1:{server.port}/telegram"
+            await post_updates(url, [make_update(i, 100 + i, "/coin") for i in range(1, 21)], 4)
+            await api.wait_for_messages(20, timeout=10)
+            await server.stop(); await app.stop()
+        await api.stop()
+        self.assertEqual(len(api.sent), 20)
+        self.assertTrue(all(m["text"] in ("Орёл", "Решка") for m in api.sent))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import AsyncMock
+from collections import Counter
+import bot_randomlab as br
+from rng import PythonEngine, make_engine
+from router import ArgError
+from weighted import AliasTable, ListCache, parse_weighted, weighted_sample
+from test_randomlab_unittest import mock_update
+
+class TestWeighted(unittest.TestCase):
+    # Проверяет разбор весов: без весов → None, «http://x» остаётся именем
+    def test_parse(self):
+        self.assertEqual(parse_weighted("a | b"), (["a", "b"], None))
+        self.assertEqual(parse_weighted("a:5|b|c:2.5"), (["a", "b", "c"], [5.0, 1.0, 2.5]))
+        self.assertEqual(parse_weighted("http://x|y:3")[0], ["http://x", "y"])
+        for bad in ("a:0|b", "a:-1", "a:nan"):
+            with self.assertRaises(ArgError):
+                parse_weighted(bad)
+
+    # Проверяет, что время и счёт («10:30», «12:00», «2:1») остаются элементами, а не весами
+    def test_parse_time_like(self):
+        self.assertEqual(parse_weighted("10:30|11:45"), (["10:30", "11:45"], None))
+        self.assertEqual(parse_weighted("10:00|12:00"), (["10:00", "12:00"], None))
+        self.assertEqual(parse_weighted("2:1|0:0|1.5:3"), (["2:1", "0:0", "1.5:3"], None))
+        self.assertEqual(parse_weighted("18:00:3|Team 2:1"), (["18:00:3", "Team 2"], [1.0, 1.0]))
+
+    # Проверяет, что частоты выборов по таблице Vose соответствуют весам
+    def test_alias_distribution(self):
+        for rng in (PythonEngine(3), make_engine(3)):
+            table = AliasTable([5, 1, 2, 0.5])
+            counts = Counter(table.draws(rng, 85000))
+            counts.update(table.draw(rng) for _ in range(1000))
+            for i, w in enumerate([5, 1, 2, 0.5]):
+                self.assertAlmostEqual(counts[i] / 86000, w / 8.5, delta=0.01)
+
+    # Проверяет выборку без повторов: нет дублей, тяжёлый элемент почти всегда попадает
+    def test_weighted_sample(self):
+        rng = PythonEngine(5)
+        items = [str(i) for i in range(100)]
+        weights = [1000.0] + [1.0] * 99
+        hits = 0
+        for _ in range(200):
+            s = weighted_sample(rng, items, weights, 3)
+            self.assertEqual(len(set(s)), 3)
+            hits += "0" in s
+        self.assertGreater(hits, 195)
+
+    # Проверяет LRU: повторный текст берётся из кэша, лишние чаты вытесняются
+    def test_cache(self):
+        cache = ListCache(max_chats=2, per_chat=2)
+        first = cache.get(1, "a:1|b:2")
+        self.assertIs(cache.get(1, "a:1|b:2"), first)
+        cache.get(2, "x"); cache.get(3, "y")
+        self.assertIsNot(cache.get(1, "a:1|b:2"), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+
+
+class TestWeightedCommands(unittest.IsolatedAsyncioTestCase):
+    # Проверяет /choose с весами: элемент с нулевой долей не встречается, ошибка веса понятна
+    async def test_choose_weighted(self):
+        seen = set()
+        for _ in range(50):
+            ctx = AsyncMock(); ctx.args = ["a:1000|b:0.001"]
+            await br.choose(mock_update("/choose a:1000|b:0.001"), ctx)
+            seen.add(ctx.bot.send_message.call_args.kwargs["text"])
+        self.assertEqual(seen, {"a"})
+        ctx = AsyncMock(); ctx.args = ["a:0|b"]
+        await br.choose(mock_update("/choose a:0|b"), ctx)
+        self.assertIn("Вес должен быть", ctx.bot.send_message.call_args.kwargs["text"])
+        ctx = AsyncMock(); ctx.args = ["10:00|12:00"]
+        await br.choose(mock_update("/choose 10:00|12:00"), ctx)
+        self.assertIn(ctx.bot.send_message.call_args.kwargs["text"], ["10:00", "12:00"])
+
+    # Проверяет /sample с весами: k элементов без повторов и без суффиксов весов
+    async def test_sample_weighted(self):
+        ctx = AsyncMock(); ctx.args = ["3", "a:2|b|c|d:5"]
+        await br.sample(mock_update("/sample 3 a:2|b|c|d:5"), ctx)
+        out = ctx.bot.send_message.call_args.kwargs["text"].split(" | ")
+        self.assertEqual(len(set(out)), 3)
+        self.assertTrue(set(out) <= {"a", "b", "c", "d"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+import argparse
+import sys
+from itertools import islice
+from audit import replay, verify
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Проверка журнала розыгрышей (AUDIT_LOG) без бота и без сети")
+    parser.add_argument("log", help="файл журнала")
+    parser.add_argument("--show", type=int, metavar="N", help="показать результат розыгрыша #N заново")
+    parser.add_argument("--limit", type=int, default=50, help="сколько строк результата показывать")
+    args = parser.parse_args(argv)
+
+    bad = 0
+    with open(args.log, "rb") as f:
+        for entry, problems in verify(f):
+            status = "; ".join(problems) if problems else "ok"
+            print(f"#{entry.get('n')} {entry.get('kind')} чат {entry.get('chat')}: {status}")
+            bad += bool(problems)
+            if entry.get("n") == args.show and entry.get("kind") != "commit":
+                for piece in islice(replay(entry), args.limit):
+                    print("   ", piece)
+    print("журнал в порядке" if not bad else f"проблемных записей: {bad}")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
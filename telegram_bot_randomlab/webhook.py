@@ -0,0 +1,131 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from aiohttp import web
+from telegram import Update
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+log = logging.getLogger(__name__)
+
+
+class WebhookServer:
+    # Локальный HTTP-вход для апдейтов от Telegram: проверяет секрет,
+    # превращает JSON в Update и кладёт его в очередь Application.
+    # Вместо очереди можно передать sink(data, body) — например, маршрутизатор
+    # по процессам-воркерам (shard.py); если sink вернул False, ответ 503.
+    def __init__(self, app, listen="0.0.0.0", port=8443, url_path="telegram", secret_token=None, sink=None):
+        self.app = app
+        self.sink = sink or self.enqueue
+        self.listen = listen
+        self.port = port
+        self.url_path = "/" + url_path.strip("/")
+        self.secret_token = secret_token
+        self.received = 0
+        self.rejected = 0
+        self._draining = False
+        self._inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._runner = None
+
+    def make_web_app(self):
+        web_app = web.Application()
+        web_app.router.add_post(self.url_path, self.handle)
+        return web_app
+
+    def _check_secret(self, request) -> bool:
+        if not self.secret_token:
+            return True
+        got = request.headers.get(SECRET_HEADER, "")
+        return hmac.compare_digest(got.encode(), self.secret_token.encode())
+
+    async def handle(self, request):
+        if not self._check_secret(request):
+            self.rejected += 1
+            return web.Response(status=403)
+        if self._draining:
+            return web.Response(status=503)
+        self._inflight += 1
+        self._idle.clear()
+        try:
+            body = await request.read()
+            try:
+                data = json.loads(body)
+            except ValueError:
+                return web.Response(status=400)
+            if not isinstance(data, dict):   # апдейт — всегда JSON-объект
+                return web.Response(status=400)
+            if await self.sink(data, body) is False:
+                return web.Response(status=503)
+            self.received += 1
+            return web.Response()
+        finally:
+            self._inflight -= 1
+            if self._inflight == 0:
+                self._idle.set()
+
+    async def enqueue(self, data, body):
+        await self.app.update_queue.put(Update.de_json(data, self.app.bot))
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_web_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+        log.info("Webhook слушает %s:%s%s", self.listen, self.port, self.url_path)
+
+    async def drain(self, timeout=10.0):
+        # Новые запросы получают 503, уже принятые дописываются в очередь.
+        self._draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("Webhook: %s запросов не завершились за %.1f с", self._inflight, timeout)
+
+    async def stop(self, timeout=10.0):
+        await self.drain(timeout)
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def serve(app, listen="0.0.0.0", port=8443, url_path="telegram", secret_token=None,
+                webhook_url=None, drain_timeout=10.0, stop_event=None):
+    # Полный цикл жизни бота в режиме webhook: старт, регистрация URL,
+    # ожидание сигнала и мягкая остановка (сначала HTTP, потом очередь апдейтов).
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    server = WebhookServer(app, listen, port, url_path, secret_token)
+    async with app:
+        # post_init/post_stop/post_shutdown вызываются так же, как в run_polling
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        await server.start()
+        if webhook_url:
+            await app.bot.set_webhook(url=webhook_url, secret_token=secret_token,
+                                      allowed_updates=Update.ALL_TYPES)
+        try:
+            await stop_event.wait()
+        finally:
+            await server.stop(drain_timeout)
+            await app.stop()
+            if app.post_stop:
+                await app.post_stop(app)
+    if app.post_shutdown:
+        await app.post_shutdown(app)
+    return server
+
+
+def run(app, **kwargs):
+    asyncio.run(serve(app, **kwargs))
@@ -0,0 +1,133 @@
+import heapq
+import math
+import re
+from collections import OrderedDict
+from router import ArgError, parse_list
+
+SCALE_BITS = 53                  # точность порогов таблицы и равномерных u ∈ (0, 1)
+SCALE = 1 << SCALE_BITS
+_NUMERIC = re.compile(r"[\d\s:.,-]+")   # имя из одних цифр и разделителей
+
+
+def parse_weighted(text: str):
+    # «a:5|b|c:2.5» → (["a", "b", "c"], [5.0, 1.0, 2.5]). Если ни у одного
+    # элемента нет веса, weights = None. Двоеточие без числа после него
+    # (например, «http://x») считается частью имени, как и любое двоеточие
+    # после одних цифр: «10:30», «12:00», «1:2» — время и счёт, а не вес.
+    items, weights = [], []
+    weighted = False
+    for raw in parse_list(text):
+        name, sep, w = raw.rpartition(":")
+        weight = None
+        if sep and name.strip() and not _NUMERIC.fullmatch(name):
+            try:
+                weight = float(w)
+            except ValueError:
+                pass
+        if weight is None:
+            items.append(raw)
+            weights.append(1.0)
+            continue
+        if not (weight > 0 and math.isfinite(weight)):
+            raise ArgError(f"Вес должен быть положительным числом: {raw}")
+        items.append(name.strip())
+        weights.append(weight)
+        weighted = True
+    return items, (weights if weighted else None)
+
+
+class AliasTable:
+    # Таблица Vose (alias method): построение O(n), один выбор — O(1)
+    # (два целых из генератора: номер ячейки и порог).
+    def __init__(self, weights):
+        n = len(weights)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        self.threshold = [SCALE] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            g = large[-1]
+            self.threshold[s] = int(scaled[s] * SCALE)
+            self.alias[s] = g
+            scaled[g] -= 1.0 - scaled[s]
+            if scaled[g] < 1.0:
+                small.append(large.pop())
+        # остатки из-за округления float получают вероятность 1
+        self.n = n
+
+    def draw(self, rng) -> int:
+        i = rng.randbelow(self.n)
+        return i if rng.randbelow(SCALE) < self.threshold[i] else self.alias[i]
+
+    def draws(self, rng, count: int) -> list:
+        cells = rng.randbelow_many(self.n, count)
+        us = rng.randbelow_many(SCALE, count)
+        t, a = self.threshold, self.alias
+        return [i if u < t[i] else a[i] for i, u in zip(cells, us)]
+
+
+def weighted_sample(rng, items, weights, k: int) -> list:
+    # Выборка без повторов по Эфраимидису–Спиракису: ключ log(u)/w,
+    # берутся k наибольших (в порядке убывания ключа).
+    us = rng.randbelow_many(SCALE, len(items))
+    keys = ((math.log((u + 1) / SCALE) / w, i) for i, (u, w) in enumerate(zip(us, weights)))
+    return [items[i] for _, i in heapq.nlargest(k, keys)]
+
+
+class WeightedList:
+    __slots__ = ("items", "weights", "_table")
+
+    def __init__(self, items, weights):
+        self.items = items
+        self.weights = weights
+        self._table = None
+
+    @property
+    def table(self) -> AliasTable:
+        if self._table is None:
+            self._table = AliasTable(self.weights)
+        return self._table
+
+    def choice(self, rng):
+        if self.weights is None:
+            return rng.choice(self.items)
+        return self.items[self.table.draw(rng)]
+
+    def sample(self, rng, k: int) -> list:
+        if self.weights is None:
+            return rng.sample(self.items, k)
+        return weighted_sample(rng, self.items, self.weights, k)
+
+
+class ListCache:
+    # Разобранные списки (и их таблицы) по чатам: LRU по чатам и LRU
+    # текстов внутри чата. Повторный /choose по тому же длинному списку
+    # не разбирает текст и не строит таблицу заново.
+    def __init__(self, max_chats=1024, per_chat=8):
+        self.max_chats = max_chats
+        self.per_chat = per_chat
+        self._chats = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chat_id, text: str) -> WeightedList:
+        lists = self._chats.get(chat_id)
+        if lists is None:
+            lists = self._chats[chat_id] = OrderedDict()
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        wl = lists.get(text)
+        if wl is not None:
+            lists.move_to_end(text)
+            self.hits += 1
+            return wl
+        self.misses += 1
+        wl = lists[text] = WeightedList(*parse_weighted(text))
+        if len(lists) > self.per_chat:
+            lists.popitem(last=False)
+        return wl